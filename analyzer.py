@@ -0,0 +1,176 @@
+import heapq
+
+from nbtlib.tag import Byte, Short, Int, Long, Float, Double, String, Compound, List, ByteArray, IntArray, LongArray
+
+import region
+import stream
+import world
+
+SCALAR_SIZES = {Byte: 1, Short: 2, Int: 4, Long: 8, Float: 4, Double: 8}
+ARRAY_ITEM_SIZES = {ByteArray: 1, IntArray: 4, LongArray: 8}
+CHECK_INTERVAL = 1024
+
+
+class Stats:
+    __slots__ = ("size", "count", "depth", "children")
+
+    def __init__(self, children):
+        self.size = 0
+        self.count = 1
+        self.depth = 1
+        self.children = children
+
+    def child(self, key):
+        if isinstance(self.children, list):
+            return self.children[key] if 0 <= key < len(self.children) else None
+        return self.children.get(key)
+
+    def containers(self):
+        values = self.children if isinstance(self.children, list) else self.children.values()
+        return (stats for stats in values if stats is not None)
+
+
+def leaf_size(tag):
+    cls = type(tag)
+    if cls in SCALAR_SIZES:
+        return SCALAR_SIZES[cls]
+    if cls is String:
+        return 2 + len(tag.encode("utf-8"))
+    if cls in ARRAY_ITEM_SIZES:
+        return 4 + len(tag) * ARRAY_ITEM_SIZES[cls]
+    return 0
+
+
+def entry_size(key, size):
+    if isinstance(key, str):
+        return 3 + len(key.encode("utf-8")) + size
+    return size
+
+
+def container_items(tag):
+    if isinstance(tag, (Compound, stream.LazyCompound)):
+        return {}, tag.items(), 1
+    if isinstance(tag, (List, stream.LazyList)):
+        return [], enumerate(tag), 5
+    if isinstance(tag, region.RegionFile):
+        return {}, ((i, tag.peek) for i in tag.chunk_indices()), 0
+    if isinstance(tag, world.WorldFolder):
+        return {}, tag.loaded_items(), 0
+    return None
+
+
+def measure(root, task=None):
+    items = container_items(root)
+    if items is None:
+        return None
+    top = Stats(items[0])
+    top.size = items[2]
+    stack = [(top, iter(items[1]), None)]
+    visited = 0
+    while stack:
+        stats, children, key = stack[-1]
+        for child_key, child in children:
+            if callable(child):
+                child = child(child_key)
+            items = container_items(child)
+            if items is None:
+                stats.size += entry_size(child_key, leaf_size(child))
+                stats.count += 1
+                if isinstance(stats.children, list):
+                    stats.children.append(None)
+                continue
+            child_stats = Stats(items[0])
+            child_stats.size = items[2]
+            if isinstance(stats.children, list):
+                stats.children.append(child_stats)
+            else:
+                stats.children[child_key] = child_stats
+            stack.append((child_stats, iter(items[1]), child_key))
+            break
+        else:
+            stack.pop()
+            visited += 1
+            if task is not None and visited % CHECK_INTERVAL == 0:
+                task.check()
+            if stack:
+                parent = stack[-1][0]
+                parent.size += entry_size(key, stats.size)
+                parent.count += stats.count
+                parent.depth = max(parent.depth, stats.depth + 1)
+    return top
+
+
+def describe(tag):
+    if tag is None:
+        return None, 0, 0, 0
+    stats = measure(tag)
+    if stats is None:
+        return None, leaf_size(tag), 1, 0
+    return stats, stats.size, stats.count, stats.depth
+
+
+def lookup(root, path):
+    stats = root
+    for key in path:
+        if stats is None:
+            return None
+        stats = stats.child(key)
+    return stats
+
+
+def update(root, path, old, new):
+    chain = [root]
+    for key in path[:-1]:
+        stats = chain[-1].child(key)
+        if stats is None:
+            return False
+        chain.append(stats)
+    key = path[-1]
+    parent = chain[-1]
+    old_stats, old_size, old_count, old_depth = describe(old)
+    new_stats, new_size, new_count, new_depth = describe(new)
+
+    if isinstance(parent.children, list):
+        if new is None:
+            del parent.children[key]
+        elif old is None:
+            parent.children.insert(key, new_stats)
+        else:
+            parent.children[key] = new_stats
+    elif new_stats is None:
+        parent.children.pop(key, None)
+    else:
+        parent.children[key] = new_stats
+
+    size = (entry_size(key, new_size) if new is not None else 0) - (entry_size(key, old_size) if old is not None else 0)
+    for stats in chain:
+        stats.size += size
+        stats.count += new_count - old_count
+    for stats in reversed(chain):
+        depth = 1 + max((child.depth for child in stats.containers()), default=0)
+        if depth == stats.depth:
+            break
+        stats.depth = depth
+    return True
+
+
+def top(root, count=100, key="size"):
+    def walk():
+        stack = [(root, [])]
+        while stack:
+            stats, path = stack.pop()
+            yield stats, path
+            children = enumerate(stats.children) if isinstance(stats.children, list) else stats.children.items()
+            for child_key, child in children:
+                if child is not None:
+                    stack.append((child, path + [child_key]))
+
+    return heapq.nlargest(count, walk(), key=lambda item: getattr(item[0], key))
+
+
+def format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
@@ -0,0 +1,335 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+import nbtlib
+import numpy as np
+from nbtlib.tag import Byte, Int, Long, Float, Double, String, List, Compound, ByteArray, IntArray, LongArray
+
+import blocks
+import core
+import maps
+import region
+import search
+
+SCALES = {"small": 1, "medium": 10, "large": 100}
+SEED = 20240101
+
+
+def random_leaf(rng, i):
+    kind = i % 6
+    if kind == 0:
+        return Byte(rng.randint(-128, 127))
+    if kind == 1:
+        return Int(rng.randint(-2 ** 31, 2 ** 31 - 1))
+    if kind == 2:
+        return Long(rng.getrandbits(63))
+    if kind == 3:
+        return Float(rng.random())
+    if kind == 4:
+        return Double(rng.random() * 1e6)
+    return String(f"minecraft:item_{rng.randint(0, 10000)}")
+
+
+def make_wide(rng, scale):
+    return Compound({f"key_{i}": random_leaf(rng, i) for i in range(2000 * scale)})
+
+
+def make_deep(rng, scale):
+    root = Compound()
+    current = root
+    for depth in range(50 * scale):
+        child = Compound({"id": String(f"level_{depth}"), "value": Int(depth), "flag": Byte(depth & 1)})
+        current["child"] = child
+        current = child
+    return root
+
+
+def make_list(rng, scale):
+    items = [Compound({
+        "id": String(f"minecraft:entity_{i % 50}"),
+        "Pos": List[Double]([Double(rng.random() * 1000) for _ in range(3)]),
+        "Health": Float(rng.random() * 20),
+        "UUID": IntArray([rng.getrandbits(31) for _ in range(4)]),
+    }) for i in range(1000 * scale)]
+    return Compound({"Entities": List[Compound](items), "Numbers": List[Int](range(5000 * scale))})
+
+
+def make_arrays(rng, scale):
+    return Compound({
+        "Longs": LongArray(np.arange(100000 * scale, dtype=np.int64)),
+        "Bytes": ByteArray(np.zeros(100000 * scale, dtype=np.int8)),
+    })
+
+
+def make_chunk(rng, x, z):
+    sections = []
+    for y in range(-4, 20):
+        sections.append(Compound({
+            "Y": Byte(y),
+            "block_states": Compound({
+                "palette": List[Compound]([Compound({"Name": String(f"minecraft:block_{i}")}) for i in range(8)]),
+                "data": LongArray([rng.getrandbits(63) for _ in range(256)]),
+            }),
+            "biomes": Compound({"palette": List[String]([String("minecraft:plains")])}),
+        }))
+    return nbtlib.File({
+        "xPos": Int(x),
+        "zPos": Int(z),
+        "Status": String("minecraft:full"),
+        "sections": List[Compound](sections),
+        "block_entities": List[Compound]([Compound({"id": String("minecraft:chest"), "x": Int(x * 16)})]),
+    })
+
+
+def write_region(path, rng, count):
+    with open(path, "wb") as f:
+        f.write(bytes(2 * region.SECTOR_SIZE))
+        header = []
+        offset = 2
+        for index in range(count):
+            buffer = io.BytesIO()
+            make_chunk(rng, index % 32, index // 32).write(buffer)
+            data = zlib.compress(buffer.getvalue())
+            payload = struct.pack(">iB", len(data) + 1, region.ZLIB) + data
+            sectors = (len(payload) + region.SECTOR_SIZE - 1) // region.SECTOR_SIZE
+            f.write(payload.ljust(sectors * region.SECTOR_SIZE, b"\0"))
+            header.append((offset << 8) | sectors)
+            offset += sectors
+        f.seek(0)
+        f.write(struct.pack(f">{len(header)}I", *header))
+
+
+CASES = {
+    "wide": make_wide,
+    "deep": make_deep,
+    "list": make_list,
+    "arrays": make_arrays,
+}
+
+
+def generate(directory, scale):
+    rng = random.Random(SEED)
+    files = {}
+    for name, factory in CASES.items():
+        path = os.path.join(directory, f"{name}.dat")
+        nbtlib.File(factory(rng, scale), gzipped=True).save(path)
+        files[name] = path
+    path = os.path.join(directory, "r.0.0.mca")
+    write_region(path, rng, min(32 * scale, region.CHUNK_COUNT))
+    files["region"] = path
+    return files
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": statistics.median(times), "min": min(times), "peak_bytes": peak}
+
+
+def first_leaf(root):
+    index = search.SearchIndex(root, core.value_string)
+    for i in index.entries():
+        if index.values[i]:
+            return index.path(i)
+    return None
+
+
+def render_all(root):
+    index = search.SearchIndex(root, core.display_string)
+    return sum(1 for entry in index.entries())
+
+
+def headless_steps(name, path):
+    level = core.load(path)
+    leaf = first_leaf(level)
+    steps = {}
+    if name != "region":
+        steps["nbtlib.load"] = lambda: nbtlib.load(path)
+    steps["core.load"] = lambda: close(core.load(path))
+    steps["core.load(lazy)"] = lambda: close(core.load(path, lazy=True))
+    steps["render"] = lambda: render_all(level)
+    steps["search"] = lambda: sum(1 for match in core.find(level, "minecraft:block_7"))
+    if leaf is not None:
+        steps["set_value"] = lambda: core.set_value(level, leaf, core.resolve(level, leaf))
+    out = os.path.join(os.path.dirname(path), "out_" + os.path.basename(path))
+    if name == "region":
+        steps["decode_blocks"] = lambda: blocks.decode_region(level)
+        steps["render_map"] = lambda: maps.render_region(path)
+        steps["save(1 chunk)"] = lambda: (level.dirty.add(level.chunk_indices()[0]), core.save(level, out))
+    else:
+        steps["save"] = lambda: core.save(level, out)
+    return steps
+
+
+def close(level):
+    if hasattr(level, "close"):
+        level.close()
+
+
+def gui_steps(app, name, path):
+    level = core.load(path)
+
+    def update_tree():
+        app.level = level
+        app.file_path = path
+        app.update_tree()
+
+    def expand_all():
+        update_tree()
+        pending = list(app.tree.get_children(""))
+        while pending:
+            item = pending.pop()
+            app.expand_node(item)
+            pending.extend(app.tree.get_children(item))
+
+    def search_nodes():
+        app.invalidate_search()
+        app.search_entry.delete(0, "end")
+        app.search_entry.insert(0, "minecraft:block_7")
+        app.search_nodes()
+        while app.task:
+            app.root.update()
+            time.sleep(0.001)
+
+    def update_value():
+        for item, node in list(app.nodes.items()):
+            if app.get_leaf_value(item) is not None:
+                app.update_nbt_value(item, node.tag)
+                return
+
+    def save_file():
+        app.level = level
+        app.file_path = os.path.join(os.path.dirname(path), "gui_" + os.path.basename(path))
+        app.modified = True
+        app.save_file()
+        while app.task:
+            app.root.update()
+            time.sleep(0.001)
+        if app.modified:
+            raise RuntimeError(app.status_var.get())
+
+    steps = {"update_tree": update_tree, "expand_all": expand_all, "update_nbt_value": update_value,
+             "save_file": save_file}
+    if name != "region":
+        steps["search_nodes"] = search_nodes
+    return steps
+
+
+def create_app():
+    try:
+        import main
+        app = main.NBTExplorer()
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+    app.root.withdraw()
+    main.messagebox.showwarning = lambda *args, **kwargs: None
+    main.messagebox.showinfo = lambda *args, **kwargs: None
+    main.messagebox.showerror = lambda title, message, **kwargs: app.update_status(message)
+    return app, None
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale, repeat, gui=True, cases=None):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        files = generate(directory, SCALES[scale])
+        app, gui_error = create_app() if gui else (None, "已禁用")
+        for name, path in files.items():
+            if cases and name not in cases:
+                continue
+            size = os.path.getsize(path)
+            steps = headless_steps(name, path)
+            if app is not None:
+                steps.update({f"gui.{step}": func for step, func in gui_steps(app, name, path).items()})
+            for step, func in steps.items():
+                result = {"case": name, "step": step, "file_bytes": size}
+                try:
+                    result.update(measure(func, repeat))
+                except Exception as e:
+                    result["error"] = f"{type(e).__name__}: {e}"
+                results.append(result)
+                print(format_result(result), flush=True)
+        if app is not None:
+            app.root.destroy()
+    return {
+        "version": git_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "nbtlib": getattr(nbtlib, "__version__", None),
+        "scale": scale,
+        "repeat": repeat,
+        "gui": gui_error or "ok",
+        "results": results,
+    }
+
+
+def format_result(result):
+    label = f"{result['case']:>8} {result['step']:<22}"
+    if "error" in result:
+        return f"{label} 错误: {result['error']}"
+    return f"{label} {result['seconds'] * 1000:10.2f} ms  峰值 {result['peak_bytes'] / 1048576:8.2f} MiB"
+
+
+def compare(report, baseline):
+    old = {(r["case"], r["step"]): r for r in baseline["results"] if "seconds" in r}
+    for result in report["results"]:
+        before = old.get((result["case"], result["step"]))
+        if before is None or "seconds" not in result:
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        memory = result["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else float("inf")
+        print(f"{result['case']:>8} {result['step']:<22} 时间 x{ratio:5.2f}  内存 x{memory:5.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PyNBTExplorer 性能基准测试")
+    parser.add_argument("-s", "--scale", choices=sorted(SCALES, key=SCALES.get), default="small")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="每个步骤的计时次数")
+    parser.add_argument("-o", "--output", help="把结果写入JSON文件")
+    parser.add_argument("-c", "--compare", help="与之前保存的JSON结果比较")
+    parser.add_argument("--case", action="append", choices=sorted(list(CASES) + ["region"]), help="只运行指定用例")
+    parser.add_argument("--no-gui", action="store_true", help="跳过需要Tk的步骤")
+    args = parser.parse_args(argv)
+
+    report = run(args.scale, args.repeat, not args.no_gui, args.case)
+    if report["gui"] != "ok":
+        print(f"跳过界面步骤: {report['gui']}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
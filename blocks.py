@@ -0,0 +1,156 @@
+import collections
+
+import numpy as np
+
+SECTION_SIZE = 16
+SECTION_VOLUME = SECTION_SIZE ** 3
+MIN_BITS = 4
+BATCH_SIZE = 32
+SYMBOLS = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+class BlockError(Exception):
+    pass
+
+
+def get(tag, key, default=None):
+    if isinstance(tag, dict):
+        return dict.get(tag, key, default)
+    return tag[key] if key in tag else default
+
+
+def bits_for(palette_size, minimum=MIN_BITS):
+    return max(minimum, (palette_size - 1).bit_length())
+
+
+def layout(length, palette_size, count=SECTION_VOLUME):
+    bits = bits_for(palette_size)
+    if length == -(-count // (64 // bits)):
+        return bits, True
+    if length * 64 % count == 0 and length * 64 // count >= bits:
+        return length * 64 // count, False
+    raise BlockError(f"方块数据长度 {length} 与调色板大小 {palette_size} 不匹配")
+
+
+def unpack(data, bits, padded=True, count=SECTION_VOLUME):
+    longs = np.atleast_2d(np.asarray(data).astype(np.int64, copy=False).view(np.uint64))
+    mask = np.uint64((1 << bits) - 1)
+    if padded:
+        per_long = 64 // bits
+        shifts = np.arange(per_long, dtype=np.uint64) * np.uint64(bits)
+        values = (longs[:, :, None] >> shifts) & mask
+        return values.astype(np.uint16).reshape(len(longs), -1)[:, :count]
+    offsets = np.arange(count, dtype=np.uint64) * np.uint64(bits)
+    index = (offsets >> np.uint64(6)).astype(np.intp)
+    shift = offsets & np.uint64(63)
+    padded_longs = np.concatenate([longs, np.zeros((len(longs), 1), np.uint64)], axis=1)
+    low = padded_longs[:, index] >> shift
+    high = np.where(shift + np.uint64(bits) > 64, padded_longs[:, index + 1] << (np.uint64(64) - shift), 0)
+    return ((low | high) & mask).astype(np.uint16)
+
+
+def section_states(section):
+    states = get(section, "block_states")
+    if states is not None:
+        return get(states, "palette"), get(states, "data")
+    return get(section, "Palette"), get(section, "BlockStates")
+
+
+def chunk_sections(chunk):
+    if "sections" in chunk:
+        return list(chunk["sections"])
+    level = get(chunk, "Level")
+    if level is not None and "Sections" in level:
+        return list(level["Sections"])
+    return []
+
+
+def state_label(state):
+    name = str(get(state, "Name", "?"))
+    properties = get(state, "Properties")
+    if properties:
+        name += "[" + ",".join(f"{key}={value}" for key, value in sorted(properties.items())) + "]"
+    return name
+
+
+class Section:
+    __slots__ = ("y", "palette", "indices")
+
+    def __init__(self, y, palette, indices):
+        self.y = y
+        self.palette = palette
+        self.indices = indices
+
+    def labels(self):
+        return [state_label(state) for state in self.palette]
+
+    def counts(self):
+        labels = self.labels()
+        totals = collections.Counter()
+        for i, count in enumerate(np.bincount(self.indices, minlength=len(labels)).tolist()):
+            if count and i < len(labels):
+                totals[labels[i]] += count
+        return totals
+
+    def layer(self, y):
+        return self.indices.reshape(SECTION_SIZE, SECTION_SIZE, SECTION_SIZE)[y]
+
+    def block(self, x, y, z):
+        index = int(self.indices[(y * SECTION_SIZE + z) * SECTION_SIZE + x])
+        if index >= len(self.palette):
+            raise BlockError(f"调色板中没有索引 {index}")
+        return self.palette[index]
+
+
+def decode_sections(sections):
+    decoded = []
+    groups = collections.defaultdict(list)
+    for section in sections:
+        palette, data = section_states(section)
+        if not palette:
+            decoded.append(None)
+            continue
+        y = int(get(section, "Y", 0))
+        palette = list(palette)
+        if data is None or not len(data):
+            decoded.append(Section(y, palette, np.zeros(SECTION_VOLUME, np.uint16)))
+            continue
+        bits, padded = layout(len(data), len(palette))
+        section = Section(y, palette, None)
+        groups[bits, padded, len(data)].append((section, data))
+        decoded.append(section)
+    for (bits, padded, length), items in groups.items():
+        for start in range(0, len(items), BATCH_SIZE):
+            batch = items[start:start + BATCH_SIZE]
+            stacked = np.stack([np.asarray(data) for section, data in batch])
+            for (section, data), indices in zip(batch, unpack(stacked, bits, padded)):
+                section.indices = indices
+    return decoded
+
+
+def decode_chunk(chunk):
+    return sorted(filter(None, decode_sections(chunk_sections(chunk))), key=lambda section: section.y)
+
+
+def decode_region(region_file, chunks=None, task=None):
+    indices = list(chunks) if chunks is not None else region_file.chunk_indices()
+    owners = []
+    sections = []
+    for index in indices:
+        if task is not None:
+            task.check()
+        chunk = chunks[index] if chunks is not None else region_file.peek(index)
+        for section in chunk_sections(chunk):
+            owners.append(index)
+            sections.append(section)
+    result = {index: [] for index in indices}
+    for index, section in zip(owners, decode_sections(sections)):
+        if section is not None:
+            result[index].append(section)
+    for decoded in result.values():
+        decoded.sort(key=lambda section: section.y)
+    return result
+
+
+def symbol(index):
+    return SYMBOLS[index] if index < len(SYMBOLS) else "#"
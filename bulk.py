@@ -0,0 +1,82 @@
+import concurrent.futures
+import functools
+import os
+import re
+
+from nbtlib.tag import String
+
+import core
+import world
+
+
+def collect_files(paths, extensions=None):
+    extensions = extensions or world.NBT_EXTENSIONS + world.REGION_EXTENSIONS
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(extensions):
+                    files.append(os.path.join(dirpath, name))
+    return files
+
+
+def compile_replacer(pattern, replacement, case_sensitive=False, use_regex=False):
+    regex = re.compile(pattern if use_regex else re.escape(pattern), 0 if case_sensitive else re.IGNORECASE)
+    if use_regex:
+        return functools.partial(regex.sub, replacement)
+    return functools.partial(regex.sub, lambda match: replacement)
+
+
+def search_level(level, pattern, case_sensitive=False, use_regex=False, replacement=None, dry_run=True):
+    replacer = None
+    if replacement is not None:
+        replacer = compile_replacer(pattern, replacement, case_sensitive, use_regex)
+    hits = []
+    changed = False
+    for path, tag in core.find(level, pattern, case_sensitive, use_regex):
+        if replacer is None:
+            hits.append((core.format_path(path), core.value_string(tag), None))
+            continue
+        if not isinstance(tag, String):
+            continue
+        new_value = String(replacer(str(tag)))
+        if new_value == tag:
+            continue
+        hits.append((core.format_path(path), core.value_string(tag), core.value_string(new_value)))
+        if not dry_run:
+            core.set_value(level, path, new_value)
+            changed = True
+    return hits, changed
+
+
+def process_file(file_path, pattern, case_sensitive=False, use_regex=False, replacement=None, dry_run=True):
+    try:
+        level = core.load(file_path, lazy=replacement is None or dry_run)
+        try:
+            hits, changed = search_level(level, pattern, case_sensitive, use_regex, replacement, dry_run)
+            if changed:
+                core.save(level, file_path)
+            return file_path, hits, None
+        finally:
+            if hasattr(level, "close"):
+                level.close()
+    except Exception as e:
+        return file_path, [], f"{type(e).__name__}: {e}"
+
+
+def run(files, task=None, workers=None, **options):
+    func = functools.partial(process_file, **options)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(func, file_path) for file_path in files]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                if task is not None:
+                    task.check()
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
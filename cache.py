@@ -0,0 +1,103 @@
+import collections
+import os
+import threading
+
+import nbtlib
+
+import stream
+
+DEFAULT_BUDGET = 256 << 20
+MEMORY_FACTOR = 4
+
+
+def user_directory(*parts):
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "PyNBTExplorer", *parts)
+
+
+def file_key(path):
+    info = os.stat(path)
+    return info.st_mtime_ns, info.st_size
+
+
+def cacheable(level):
+    return isinstance(level, (nbtlib.File, stream.LazyCompound))
+
+
+def estimate(level):
+    if isinstance(level, stream.LazyCompound):
+        return len(level.reader.data)
+    size = getattr(level, "data_size", None)
+    return None if size is None else size * MEMORY_FACTOR
+
+
+class ParseCache:
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        try:
+            key = file_key(path)
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None:
+                return None
+            if entry[0] != key:
+                self.evict(path)
+                return None
+            self.entries.move_to_end(path)
+            return entry[1]
+
+    def put(self, path, level, key=None):
+        if not cacheable(level):
+            return
+        path = os.path.abspath(path)
+        if key is None:
+            key = file_key(path)
+        size = estimate(level)
+        with self.lock:
+            self.evict(path)
+            if size is None or size > self.budget:
+                return
+            self.entries[path] = (key, level, size)
+            self.size += size
+            while self.size > self.budget:
+                self.evict(next(iter(self.entries)))
+
+    def load(self, path, loader):
+        level = self.get(path)
+        if level is not None:
+            return level
+        key = None if os.path.isdir(path) else file_key(path)
+        level = loader(path)
+        self.put(path, level, key)
+        return level
+
+    def discard(self, path):
+        with self.lock:
+            self.evict(os.path.abspath(path))
+
+    def evict(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def resize(self, budget):
+        with self.lock:
+            self.budget = budget
+            while self.size > self.budget:
+                self.evict(next(iter(self.entries)))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
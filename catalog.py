@@ -0,0 +1,311 @@
+import collections
+import concurrent.futures
+import os
+import sqlite3
+
+from nbtlib.tag import Compound, List, String
+
+import bulk
+import cache
+import core
+import region
+import world
+
+FILE_UNIT = -1
+ENTITY = "entity"
+BLOCK_ENTITY = "block_entity"
+ITEM = "item"
+KEY_PATH = "path"
+KIND_LABELS = {ITEM: "物品", ENTITY: "实体", BLOCK_ENTITY: "方块实体", KEY_PATH: "键路径"}
+ENTITY_LISTS = {"Entities", "entities", "Passengers"}
+BLOCK_ENTITY_LISTS = {"block_entities", "TileEntities"}
+ITEM_KEYS = {"Items", "Inventory", "EnderItems", "HandItems", "ArmorItems", "Item", "item", "SaddleItem", "ArmorItem"}
+QUERY_LIMIT = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+    chunk INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    location INTEGER NOT NULL,
+    UNIQUE (file_id, chunk)
+);
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    type TEXT NOT NULL,
+    UNIQUE (path, type)
+);
+CREATE TABLE IF NOT EXISTS unit_paths (
+    path_id INTEGER NOT NULL,
+    unit_id INTEGER NOT NULL REFERENCES units (id) ON DELETE CASCADE,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (path_id, unit_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS records (
+    unit_id INTEGER NOT NULL REFERENCES units (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    path TEXT NOT NULL,
+    owner INTEGER,
+    x REAL,
+    y REAL,
+    z REAL,
+    PRIMARY KEY (unit_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS unit_paths_unit ON unit_paths (unit_id);
+CREATE INDEX IF NOT EXISTS records_value ON records (kind, value);
+"""
+
+
+def default_path():
+    return cache.user_directory("index.sqlite")
+
+
+def classify(tag, parent_key):
+    value = dict.get(tag, "id") if isinstance(tag, dict) else None
+    if not isinstance(value, String):
+        return None
+    if parent_key in ENTITY_LISTS:
+        position = dict.get(tag, "Pos")
+        if isinstance(position, List) and len(position) == 3:
+            return ENTITY, str(value), tuple(float(v) for v in position)
+        return ENTITY, str(value), (None, None, None)
+    if parent_key in BLOCK_ENTITY_LISTS:
+        return BLOCK_ENTITY, str(value), tuple(int(tag[k]) if k in tag else None for k in "xyz")
+    if parent_key in ITEM_KEYS or "Count" in tag or "count" in tag:
+        return ITEM, str(value), (None, None, None)
+    return None
+
+
+def extract(root):
+    paths = collections.Counter()
+    records = []
+    stack = [(root, (), "", None, None)]
+    while stack:
+        tag, keys, generic, owner, parent_key = stack.pop()
+        if isinstance(tag, Compound):
+            record = classify(tag, parent_key)
+            if record is not None:
+                kind, value, position = record
+                records.append((len(records), kind, value, core.format_path(keys), owner) + position)
+                if kind != ITEM:
+                    owner = len(records) - 1
+            for key, value in tag.items():
+                name = core.format_path([key])
+                child = f"{generic}.{name}" if generic else name
+                paths[child, core.type_name(value)] += 1
+                if isinstance(value, (Compound, List)):
+                    stack.append((value, keys + (key,), child, owner, key))
+        elif isinstance(tag, List) and len(tag) and issubclass(tag.subtype, (Compound, List)):
+            child = generic + "[*]"
+            paths[child, tag.subtype.__name__] += len(tag)
+            for i in range(len(tag) - 1, -1, -1):
+                stack.append((tag[i], keys + (i,), child, owner, parent_key))
+    return sorted(paths.items()), records
+
+
+def scan_file(path, known):
+    try:
+        units = []
+        removed = []
+        failed = 0
+        if path.lower().endswith(world.REGION_EXTENSIONS):
+            with region.RegionFile(path) as region_file:
+                present = set()
+                for index in region_file.chunk_indices():
+                    present.add(index)
+                    stamp = (region_file.chunk_timestamp(index),
+                             int(region_file.offsets[index]) << 8 | int(region_file.sectors[index]))
+                    if known.get(index) == stamp:
+                        continue
+                    try:
+                        units.append((index,) + stamp + extract(region_file.peek(index)))
+                    except Exception:
+                        failed += 1
+                removed = [index for index in known if index not in present]
+        else:
+            level = core.load(path, lazy=False)
+            units.append((FILE_UNIT, 0, 0) + extract(level))
+        return path, units, removed, failed, None
+    except Exception as e:
+        return path, [], [], 0, f"{type(e).__name__}: {e}"
+
+
+def under(path, roots):
+    return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in roots)
+
+
+def escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def pattern_clause(column, value):
+    if "*" in value or "?" in value:
+        return f"{column} LIKE ? ESCAPE '\\'", escape_like(value).replace("*", "%").replace("?", "_")
+    return f"{column} = ?", value
+
+
+class Catalog:
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(SCHEMA)
+        self.path_ids = None
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def pending(self, files):
+        rows = {path: (file_id, mtime_ns, size)
+                for file_id, path, mtime_ns, size in self.db.execute("SELECT id, path, mtime_ns, size FROM files")}
+        for path in files:
+            row = rows.get(path)
+            info = os.stat(path)
+            if row is not None and row[1:] == (info.st_mtime_ns, info.st_size):
+                continue
+            known = {}
+            if row is not None:
+                known = {chunk: (timestamp, location) for chunk, timestamp, location in self.db.execute(
+                    "SELECT chunk, timestamp, location FROM units WHERE file_id = ?", (row[0],))}
+            yield path, known, (info.st_mtime_ns, info.st_size)
+
+    def prune(self, roots, files):
+        present = set(files)
+        stale = [(file_id,) for file_id, path in self.db.execute("SELECT id, path FROM files")
+                 if under(path, roots) and path not in present]
+        with self.db:
+            self.db.executemany("DELETE FROM files WHERE id = ?", stale)
+        return len(stale)
+
+    def intern_paths(self, entries):
+        if self.path_ids is None:
+            self.path_ids = {(path, type_): path_id for path_id, path, type_ in
+                             self.db.execute("SELECT id, path, type FROM paths")}
+        ids = []
+        for (path, type_), count in entries:
+            path_id = self.path_ids.get((path, type_))
+            if path_id is None:
+                path_id = self.db.execute("INSERT INTO paths (path, type) VALUES (?, ?)", (path, type_)).lastrowid
+                self.path_ids[path, type_] = path_id
+            ids.append((path_id, count))
+        return ids
+
+    def store(self, path, key, units, removed):
+        try:
+            self.write(path, key, units, removed)
+        except BaseException:
+            self.path_ids = None
+            raise
+
+    def write(self, path, key, units, removed):
+        with self.db:
+            self.db.execute("INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?) ON CONFLICT (path) "
+                            "DO UPDATE SET mtime_ns = excluded.mtime_ns, size = excluded.size", (path,) + key)
+            file_id = self.db.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()[0]
+            self.db.executemany("DELETE FROM units WHERE file_id = ? AND chunk = ?",
+                                [(file_id, chunk) for chunk in removed + [unit[0] for unit in units]])
+            for chunk, timestamp, location, paths, records in units:
+                unit_id = self.db.execute("INSERT INTO units (file_id, chunk, timestamp, location) VALUES (?, ?, ?, ?)",
+                                          (file_id, chunk, timestamp, location)).lastrowid
+                self.db.executemany("INSERT INTO unit_paths (path_id, unit_id, count) VALUES (?, ?, ?)",
+                                    [(path_id, unit_id, count) for path_id, count in self.intern_paths(paths)])
+                self.db.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    [(unit_id,) + record for record in records])
+
+    def update(self, roots, task=None, workers=None):
+        roots = [os.path.abspath(root) for root in roots]
+        files = [os.path.abspath(path) for path in bulk.collect_files(roots)]
+        self.prune(roots, files)
+        jobs = list(self.pending(files))
+        if not jobs:
+            return
+        keys = {path: key for path, known, key in jobs}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(scan_file, path, known) for path, known, key in jobs]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    if task is not None:
+                        task.check()
+                    path, units, removed, failed, error = future.result()
+                    if error is None:
+                        self.store(path, keys[path], units, removed)
+                    yield path, len(units), failed, error
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def find(self, kind=None, value=None, container=None, roots=None, limit=QUERY_LIMIT):
+        clauses = []
+        params = []
+        if kind:
+            clauses.append("r.kind = ?")
+            params.append(kind)
+        for column, pattern in (("r.value", value), ("o.value", container)):
+            if pattern:
+                clause, param = pattern_clause(column, pattern)
+                clauses.append(clause)
+                params.append(param)
+        return self.select(
+            "SELECT f.path, u.chunk, r.path, r.kind, r.value, o.value, "
+            "coalesce(r.x, o.x), coalesce(r.y, o.y), coalesce(r.z, o.z) "
+            "FROM records r JOIN units u ON u.id = r.unit_id JOIN files f ON f.id = u.file_id "
+            "LEFT JOIN records o ON o.unit_id = r.unit_id AND o.seq = r.owner",
+            clauses, params, roots, "f.path, u.chunk, r.seq", limit)
+
+    def find_paths(self, pattern, roots=None, limit=QUERY_LIMIT):
+        clause, param = pattern_clause("p.path", pattern)
+        return self.select(
+            "SELECT f.path, u.chunk, p.path, p.type, up.count FROM paths p "
+            "JOIN unit_paths up ON up.path_id = p.id JOIN units u ON u.id = up.unit_id "
+            "JOIN files f ON f.id = u.file_id", [clause], [param], roots, "f.path, u.chunk, p.path", limit)
+
+    def select(self, query, clauses, params, roots, order, limit):
+        if roots:
+            roots = [os.path.abspath(root) for root in roots]
+            clauses = clauses + ["(" + " OR ".join(["f.path = ? OR f.path LIKE ? ESCAPE '\\'"] * len(roots)) + ")"]
+            for root in roots:
+                params = params + [root, escape_like(root.rstrip(os.sep) + os.sep) + "%"]
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        return self.db.execute(f"{query} ORDER BY {order} LIMIT ?", params + [limit]).fetchall()
+
+    def stats(self):
+        return {table: self.db.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                for table in ("files", "units", "records", "paths")}
+
+
+def chunk_label(file_path, chunk):
+    if chunk == FILE_UNIT:
+        return ""
+    region_x, region_z = region.parse_region_name(file_path)
+    return f"区块 [{region_x * 32 + chunk % 32}, {region_z * 32 + chunk // 32}]"
+
+
+def format_position(x, y, z):
+    if x is None:
+        return ""
+    return f"({x:g}, {y:g}, {z:g})" if y is not None and z is not None else f"({x:g})"
+
+
+def location_path(chunk, path):
+    keys = core.parse_path(path) if path else []
+    return keys if chunk == FILE_UNIT else [chunk] + keys
@@ -0,0 +1,307 @@
+import argparse
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import sys
+
+import nbtlib
+
+import bulk
+import catalog
+import compression
+import convert
+import core
+import diff
+import query
+import region
+import stream
+import world
+
+
+def render(tag):
+    if isinstance(tag, nbtlib.tag.Base):
+        return tag.snbt()
+    return core.value_string(tag)
+
+
+def run_get(level, args):
+    return [render(stream.materialize(core.resolve(level, core.parse_path(args.path))))]
+
+
+def run_set(level, args):
+    path = core.parse_path(args.path)
+    if args.snbt:
+        value = nbtlib.parse_nbt(args.value)
+    else:
+        type_str = args.type or core.type_name(core.resolve(level, path))
+        value = core.create_value(type_str, args.value)
+    core.set_value(level, path, value)
+    core.save(level, args.file_path)
+    return [f"{core.format_path(path)} = {render(value)}"]
+
+
+def run_delete(level, args):
+    path = core.parse_path(args.path)
+    core.delete_value(level, path)
+    core.save(level, args.file_path)
+    return [f"已删除 {core.format_path(path)}"]
+
+
+def run_find(level, args):
+    return [f"{core.format_path(path)} = {core.value_string(tag)}"
+            for path, tag in core.find(level, args.pattern, args.case_sensitive, args.regex)]
+
+
+def render_selected(value):
+    if isinstance(value, dict) and not isinstance(value, nbtlib.tag.Base):
+        return ", ".join(f"{name} = {'-' if found is None else render(stream.materialize(found))}"
+                         for name, found in value.items())
+    return render(stream.materialize(value))
+
+
+def run_select(level, args):
+    return [f"{core.format_path(path) or '(根)'} = {render_selected(value)}"
+            for path, value in query.compile(args.expr).select(level)]
+
+
+def run_replace(level, args):
+    hits, changed = bulk.search_level(level, args.pattern, args.case_sensitive, args.regex,
+                                      args.replacement, args.dry_run)
+    if changed:
+        core.save(level, args.file_path)
+    return [f"{path} = {old} -> {new}" for path, old, new in hits]
+
+
+def run_dump(level, args):
+    tag = stream.materialize(core.resolve(level, core.parse_path(args.path or "")))
+    if not isinstance(tag, nbtlib.tag.Base):
+        raise TypeError("只能导出NBT标签")
+    return [tag.snbt(indent=args.indent)]
+
+
+def output_path(file_path, extension, directory=None):
+    return os.path.join(directory or os.path.dirname(file_path), os.path.basename(file_path) + extension)
+
+
+def run_export(args):
+    fmt = args.format or convert.SNBT
+    target = output_path(args.file_path, "." + fmt, args.output)
+    if args.path or args.file_path.lower().endswith(world.REGION_EXTENSIONS):
+        level = core.load(args.file_path, lazy=True)
+        try:
+            tag = core.resolve(level, core.parse_path(args.path or ""))
+            if isinstance(tag, (region.RegionFile, world.WorldFolder)):
+                raise TypeError("区域文件需要用 -p 指定要导出的区块")
+            convert.export_tag(tag, target, fmt, args.indent)
+        finally:
+            if hasattr(level, "close"):
+                level.close()
+    else:
+        convert.export_file(args.file_path, target, fmt, args.indent)
+    return [f"已导出到 {target}"]
+
+
+def import_target(file_path, directory=None):
+    name, extension = os.path.splitext(os.path.basename(file_path))
+    if extension.lower() not in convert.EXTENSIONS:
+        name += extension
+    if not name.lower().endswith(world.NBT_EXTENSIONS):
+        name += ".dat"
+    return os.path.join(directory or os.path.dirname(file_path), name)
+
+
+def run_import(args):
+    target = import_target(args.file_path, args.output)
+    if not args.force and os.path.exists(target):
+        raise FileExistsError(f"{target} 已存在，使用 --force 覆盖")
+    tag = convert.import_tag(args.file_path, args.format)
+    if not isinstance(tag, nbtlib.tag.Compound):
+        raise TypeError("根标签必须是Compound")
+    core.save(nbtlib.File(tag), target, kind=args.compression)
+    return [f"已导入到 {target}"]
+
+
+def run_diff(level, args):
+    base = core.load(args.base, lazy=True)
+    try:
+        return [f"{diff.LABELS[d.status]} {core.format_path(d.path) or '(根)'}: "
+                f"{diff.render(d.old)} -> {diff.render(d.new)}" for d in diff.compare(base, level)]
+    finally:
+        if hasattr(base, "close"):
+            base.close()
+
+
+def run_index(args):
+    failed = False
+    with catalog.Catalog(args.db) as index:
+        for file_path, count, errors, error in index.update(args.files, workers=args.jobs):
+            if error:
+                failed = True
+                print(f"{file_path}: {error}", file=sys.stderr)
+                continue
+            message = f"{file_path}: 已更新 {count} 项"
+            if errors:
+                message += f"，{errors} 个区块无法读取"
+            print(message)
+            sys.stdout.flush()
+        stats = index.stats()
+    print(f"索引中共有 {stats['files']} 个文件，{stats['units']} 个区块或文件，{stats['records']} 条记录")
+    return 1 if failed else 0
+
+
+def run_query(args):
+    with catalog.Catalog(args.db) as index:
+        if args.kind == catalog.KEY_PATH:
+            for file_path, chunk, path, type_, count in index.find_paths(args.value, args.files, args.limit):
+                print(f"{file_path} {catalog.chunk_label(file_path, chunk)}: {path} ({type_}, {count} 个)")
+            return 0
+        for file_path, chunk, path, kind, value, owner, x, y, z in index.find(
+                args.kind, args.value, args.container, args.files, args.limit):
+            line = f"{file_path} {catalog.chunk_label(file_path, chunk)}: {path} = {value}"
+            if owner:
+                line += f" 位于 {owner}"
+            print(f"{line} {catalog.format_position(x, y, z)}".rstrip())
+    return 0
+
+
+COMMANDS = {
+    "get": run_get,
+    "set": run_set,
+    "delete": run_delete,
+    "find": run_find,
+    "select": run_select,
+    "replace": run_replace,
+    "dump": run_dump,
+    "diff": run_diff,
+}
+
+READ_ONLY_COMMANDS = {"get", "find", "select", "dump", "diff"}
+CATALOG_COMMANDS = {"index": run_index, "query": run_query}
+TEXT_COMMANDS = {"export": run_export, "import": run_import}
+
+
+def run_file(args, file_path):
+    try:
+        args = argparse.Namespace(**vars(args), file_path=file_path)
+        if args.command in TEXT_COMMANDS:
+            return file_path, TEXT_COMMANDS[args.command](args), None
+        level = core.load(file_path, lazy=args.command in READ_ONLY_COMMANDS)
+        try:
+            return file_path, COMMANDS[args.command](level, args), None
+        finally:
+            if hasattr(level, "close"):
+                level.close()
+    except Exception as e:
+        return file_path, [], f"{type(e).__name__}: {e}"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pynbt", description="PyNBTExplorer 命令行工具")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="并行处理的进程数")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    get_parser = subparsers.add_parser("get", help="读取路径上的值")
+    get_parser.add_argument("path")
+
+    set_parser = subparsers.add_parser("set", help="修改路径上的值")
+    set_parser.add_argument("path")
+    set_parser.add_argument("value")
+    set_parser.add_argument("-t", "--type", choices=sorted(core.TAG_TYPES), help="值的类型，默认沿用原类型")
+    set_parser.add_argument("--snbt", action="store_true", help="把值按SNBT解析")
+
+    delete_parser = subparsers.add_parser("delete", help="删除路径上的节点")
+    delete_parser.add_argument("path")
+
+    find_parser = subparsers.add_parser("find", help="按名称或值查找节点")
+    find_parser.add_argument("pattern")
+    find_parser.add_argument("-c", "--case-sensitive", action="store_true")
+    find_parser.add_argument("-r", "--regex", action="store_true")
+
+    select_parser = subparsers.add_parser("select", help="用路径查询表达式选取节点")
+    select_parser.add_argument("expr")
+
+    replace_parser = subparsers.add_parser("replace", help="替换字符串值中匹配的内容")
+    replace_parser.add_argument("pattern")
+    replace_parser.add_argument("replacement")
+    replace_parser.add_argument("-c", "--case-sensitive", action="store_true")
+    replace_parser.add_argument("-r", "--regex", action="store_true")
+    replace_parser.add_argument("-n", "--dry-run", action="store_true", help="只显示将要替换的内容，不写入文件")
+
+    dump_parser = subparsers.add_parser("dump", help="以SNBT格式输出")
+    dump_parser.add_argument("-p", "--path", default="")
+    dump_parser.add_argument("--indent", type=int, default=4)
+
+    export_parser = subparsers.add_parser("export", help="逐个导出为SNBT或JSON文本文件，文件名后加上扩展名")
+    export_parser.add_argument("-f", "--format", choices=convert.FORMATS, help="默认为snbt")
+    export_parser.add_argument("-p", "--path", default="", help="只导出该路径下的子树")
+    export_parser.add_argument("--indent", type=int, help="缩进空格数，默认不换行")
+    export_parser.add_argument("-o", "--output", help="输出文件夹，默认与源文件相同")
+
+    import_parser = subparsers.add_parser("import", help="把SNBT或JSON文本文件导入为NBT文件")
+    import_parser.add_argument("-f", "--format", choices=convert.FORMATS, help="默认按扩展名判断")
+    import_parser.add_argument("-z", "--compression", choices=sorted(compression.LABELS), default=compression.GZIP)
+    import_parser.add_argument("-o", "--output", help="输出文件夹，默认与源文件相同")
+    import_parser.add_argument("--force", action="store_true", help="覆盖已存在的文件")
+
+    diff_parser = subparsers.add_parser("diff", help="与基准文件比较，列出新增、删除和修改的标签")
+    diff_parser.add_argument("base")
+
+    index_parser = subparsers.add_parser("index", help="建立或增量更新世界索引")
+    index_parser.add_argument("--db", help="索引数据库路径")
+
+    query_parser = subparsers.add_parser("query", help="在世界索引中查询，可选地只查询指定的文件或文件夹")
+    query_parser.add_argument("value", help="ID或键路径，可以使用*和?通配符")
+    query_parser.add_argument("-k", "--kind", choices=sorted(catalog.KIND_LABELS), help="记录类型，默认不限")
+    query_parser.add_argument("--in", dest="container", help="只查找该实体或方块实体中的物品")
+    query_parser.add_argument("-l", "--limit", type=int, default=catalog.QUERY_LIMIT)
+    query_parser.add_argument("--db", help="索引数据库路径")
+
+    for name, subparser in subparsers.choices.items():
+        subparser.add_argument("files", nargs="*" if name == "query" else "+")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command in CATALOG_COMMANDS:
+        return CATALOG_COMMANDS[args.command](args)
+    files = bulk.collect_files(args.files, tuple(convert.EXTENSIONS) if args.command == "import" else None)
+    if args.command == "import":
+        targets = {}
+        for file_path in files:
+            targets.setdefault(os.path.abspath(import_target(file_path, args.output)), []).append(file_path)
+        duplicates = [sources for sources in targets.values() if len(sources) > 1]
+        for sources in duplicates:
+            print(f"{', '.join(sources)}: 会写入同一个文件 {import_target(sources[0], args.output)}", file=sys.stderr)
+        if duplicates:
+            return 1
+    options = argparse.Namespace(**{k: v for k, v in vars(args).items() if k not in ("files", "jobs")})
+    func = functools.partial(run_file, options)
+
+    if args.jobs > 1 and len(files) > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs)
+        results = executor.map(func, files, chunksize=max(1, len(files) // (args.jobs * 8)))
+    else:
+        executor = None
+        results = map(func, files)
+
+    failed = False
+    try:
+        for file_path, lines, error in results:
+            prefix = f"{file_path}: " if len(files) > 1 else ""
+            for line in lines:
+                print(prefix + line)
+            if error:
+                failed = True
+                print(f"{file_path}: {error}", file=sys.stderr)
+            sys.stdout.flush()
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
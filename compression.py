@@ -0,0 +1,217 @@
+import io
+import struct
+import zlib
+
+try:
+    import lz4.block
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+GZIP = "gzip"
+ZLIB = "zlib"
+RAW = "raw"
+LZ4 = "lz4"
+
+LABELS = {GZIP: "gzip", ZLIB: "zlib", RAW: "无压缩", LZ4: "LZ4"}
+LEVELS = {GZIP: (0, 9, 9), ZLIB: (0, 9, 6), RAW: (0, 0, 0), LZ4: (0, 16, 0)}
+FAST_SAVE = (GZIP, 1)
+
+GZIP_MAGIC = b"\x1f\x8b"
+LZ4_FRAME_MAGIC = b"\x04\x22\x4d\x18"
+LZ4_BLOCK_MAGIC = b"LZ4Block"
+LZ4_BLOCK_HEADER = struct.Struct("<Biii")
+READ_CHUNK_SIZE = 1 << 16
+BUFFER_SIZE = 1 << 16
+
+
+class CompressionError(Exception):
+    pass
+
+
+def require_lz4():
+    if lz4 is None:
+        raise CompressionError("LZ4 压缩需要安装 lz4: pip install lz4")
+
+
+def detect(head):
+    if head[:2] == GZIP_MAGIC:
+        return GZIP
+    if head[:4] == LZ4_FRAME_MAGIC or head[:8] == LZ4_BLOCK_MAGIC:
+        return LZ4
+    if len(head) >= 2 and head[0] & 0x0F == 8 and (head[0] << 8 | head[1]) % 31 == 0:
+        return ZLIB
+    return RAW
+
+
+class LZ4BlockDecompressor:
+    def __init__(self):
+        require_lz4()
+        self.pending = b""
+        self.eof = False
+        self.unused_data = b""
+
+    def decompress(self, data):
+        data = self.pending + data
+        out = []
+        pos = 0
+        header_size = len(LZ4_BLOCK_MAGIC) + LZ4_BLOCK_HEADER.size
+        while not self.eof and len(data) - pos >= header_size:
+            if data[pos:pos + len(LZ4_BLOCK_MAGIC)] != LZ4_BLOCK_MAGIC:
+                raise CompressionError("LZ4 数据块头无效")
+            token, compressed_len, original_len, checksum = LZ4_BLOCK_HEADER.unpack_from(
+                data, pos + len(LZ4_BLOCK_MAGIC))
+            if original_len == 0:
+                self.eof = True
+                pos += header_size
+                break
+            end = pos + header_size + compressed_len
+            if end > len(data):
+                break
+            block = data[pos + header_size:end]
+            if token & 0xF0 == 0x10:
+                out.append(block)
+            else:
+                out.append(lz4.block.decompress(block, uncompressed_size=original_len))
+            pos = end
+        if self.eof:
+            self.unused_data = data[pos:]
+            self.pending = b""
+        else:
+            self.pending = data[pos:]
+        return b"".join(out)
+
+
+def decompress_lz4_blocks(data):
+    return LZ4BlockDecompressor().decompress(bytes(data))
+
+
+def decompressor(kind, head=b""):
+    if kind == GZIP:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if kind == ZLIB:
+        return zlib.decompressobj()
+    if kind == LZ4:
+        require_lz4()
+        if head[:len(LZ4_BLOCK_MAGIC)] == LZ4_BLOCK_MAGIC:
+            return LZ4BlockDecompressor()
+        return lz4.frame.LZ4FrameDecompressor()
+    raise CompressionError(f"未知的压缩格式: {kind}")
+
+
+def compressor(kind, level=None):
+    if level is None:
+        level = LEVELS[kind][2]
+    if kind == GZIP:
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if kind == ZLIB:
+        return zlib.compressobj(level)
+    if kind == LZ4:
+        require_lz4()
+        return lz4.frame.LZ4FrameCompressor(compression_level=level)
+    raise CompressionError(f"未知的压缩格式: {kind}")
+
+
+class DecompressReader(io.RawIOBase):
+    def __init__(self, raw, kind, head):
+        self.raw = raw
+        self.kind = kind
+        self.head = head
+        self.decompressor = decompressor(kind, head)
+        self.input = b""
+        self.pending = memoryview(b"")
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        while not self.pending:
+            if self.decompressor.eof:
+                self.input = self.decompressor.unused_data or self.input
+                if not self.input and not self.raw.peek(1):
+                    return 0
+                self.decompressor = decompressor(self.kind, self.head)
+            if not self.input:
+                self.input = self.raw.read(READ_CHUNK_SIZE)
+                if not self.input:
+                    return 0
+            if hasattr(self.decompressor, "unconsumed_tail"):
+                data = self.decompressor.decompress(self.input, READ_CHUNK_SIZE)
+                self.input = self.decompressor.unconsumed_tail
+            else:
+                data = self.decompressor.decompress(self.input)
+                self.input = b""
+            self.pending = memoryview(data)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        self.position += size
+        return size
+
+
+class CompressWriter(io.RawIOBase):
+    def __init__(self, raw, compressor):
+        self.raw = raw
+        self.compressor = compressor
+        self.position = 0
+        if hasattr(compressor, "begin"):
+            self.raw.write(compressor.begin())
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def write(self, data):
+        self.raw.write(self.compressor.compress(bytes(data)))
+        self.position += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.raw.write(self.compressor.flush())
+        super().close()
+
+
+class PassthroughWriter(io.RawIOBase):
+    def __init__(self, raw):
+        self.raw = raw
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def write(self, data):
+        n = self.raw.write(data)
+        self.position += n
+        return n
+
+
+def open_reader(fileobj, kind=None):
+    head = fileobj.peek(len(LZ4_BLOCK_MAGIC))[:len(LZ4_BLOCK_MAGIC)]
+    if kind is None:
+        kind = detect(head)
+    if kind == RAW:
+        return fileobj
+    return io.BufferedReader(DecompressReader(fileobj, kind, head), BUFFER_SIZE)
+
+
+def open_writer(fileobj, kind, level=None):
+    if kind == RAW:
+        return io.BufferedWriter(PassthroughWriter(fileobj), BUFFER_SIZE)
+    return io.BufferedWriter(CompressWriter(fileobj, compressor(kind, level)), BUFFER_SIZE)
+
+
+def compress(data, kind, level=None):
+    if kind == RAW:
+        return bytes(data)
+    engine = compressor(kind, level)
+    return b"".join((engine.begin() if hasattr(engine, "begin") else b"", engine.compress(data), engine.flush()))
@@ -1 +1,2 @@
-theme = "yeti"
\ No newline at end of file
+theme = "yeti"
+cache_budget = 256
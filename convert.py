@@ -0,0 +1,547 @@
+import base64
+import io
+import json
+import os
+import re
+
+import numpy as np
+from nbtlib.literal.parser import TOKENS, NUMBER_SUFFIXES, LITERAL_ALIASES
+from nbtlib.literal.serializer import Serializer
+from nbtlib.tag import (Base, Byte, Short, Int, Long, Float, Double, ByteArray, String, List, Compound, IntArray,
+                        LongArray, OutOfRange)
+
+import stream
+import worker
+from stream import START_COMPOUND, END_COMPOUND, START_LIST, END_LIST, VALUE
+
+SNBT = "snbt"
+JSON = "json"
+FORMATS = (SNBT, JSON)
+EXTENSIONS = {".snbt": SNBT, ".json": JSON}
+READ_BLOCK_SIZE = 1 << 20
+FLUSH_PARTS = 4096
+ARRAY_SLICE = 3 << 12
+LOOKAHEAD = 16
+WORD_LIMIT = 256
+COMPOUND_TYPES = (Compound, stream.LazyCompound)
+LIST_TYPES = (List, stream.LazyList)
+ARRAY_TYPES = (ByteArray, IntArray, LongArray)
+EXPANDED_TYPES = {7, 9, 10, 11, 12}
+ARRAY_PREFIXES = {ByteArray: "B", IntArray: "I", LongArray: "L"}
+ARRAY_SUFFIXES = {ByteArray: "B", IntArray: "", LongArray: "L"}
+ARRAY_DTYPES = {ByteArray: np.dtype(">i1"), IntArray: np.dtype(">i4"), LongArray: np.dtype(">i8")}
+SCALAR_MARKERS = {Byte: "$b", Short: "$s", Long: "$l", Float: "$f"}
+ARRAY_MARKERS = {ByteArray: "$B", IntArray: "$I", LongArray: "$L"}
+LIST_MARKER = "$list"
+MARKER_TYPES = {marker: cls for cls, marker in {**SCALAR_MARKERS, **ARRAY_MARKERS}.items()}
+TAG_NAMES = {cls.__name__: tag_id for tag_id, cls in Base.all_tags.items()}
+SPECIAL_FLOATS = {"inf": "Infinity", "-inf": "-Infinity", "nan": "NaN"}
+SPECIAL_SCALARS = {text + suffix: cls(float(text)) for text in SPECIAL_FLOATS.values()
+                   for cls, suffixes in ((Float, "fF"), (Double, "dD")) for suffix in suffixes}
+
+TOKEN = re.compile(r'\s*(?:([{}\[\]:,;])|([^\s{}\[\]:,;"\']+)|"([^"\\]*(?:\\.[^"\\]*)*)"|\'([^\'\\]*(?:\\.[^\'\\]*)*)\'|(["\']))')
+WORD_TAIL = re.compile(r'[^\s{}\[\]:,;"\']*\Z')
+SPACE = re.compile(r"\s*")
+NUMBER = re.compile(TOKENS["NUMBER"])
+ARRAY_PREFIX = re.compile(r"\s*([BIL])\s*;")
+ESCAPE = re.compile(r"\\(.)", re.S)
+
+serializer = Serializer()
+
+
+class FormatError(ValueError):
+    pass
+
+
+def format_of(file_path, default=SNBT):
+    name = file_path.lower()
+    for extension, fmt in EXTENSIONS.items():
+        if name.endswith(extension):
+            return fmt
+    return default
+
+
+def subtype_id(tag):
+    if isinstance(tag, stream.LazyList):
+        return tag.subtype_id
+    return tag.subtype.tag_id
+
+
+def tag_events(tag, key=None):
+    stack = []
+    items = iter(((key, tag),))
+    while True:
+        item = next(items, None)
+        if item is None:
+            if not stack:
+                return
+            items, end = stack.pop()
+            yield end, None, None
+            continue
+        key, value = item
+        if isinstance(value, COMPOUND_TYPES):
+            yield START_COMPOUND, key, None
+            stack.append((items, END_COMPOUND))
+            items = iter(value.items())
+        elif isinstance(value, LIST_TYPES):
+            yield START_LIST, key, (subtype_id(value), len(value))
+            stack.append((items, END_LIST))
+            items = enumerate(value)
+        elif isinstance(value, Base):
+            yield VALUE, key, value
+        else:
+            raise TypeError("只能导出NBT标签")
+
+
+def float_text(value):
+    return str(np.float32(value)) if isinstance(value, Float) else float.__repr__(value)
+
+
+def snbt_value(tag):
+    if isinstance(tag, String):
+        yield serializer.escape_string(tag)
+    elif isinstance(tag, ARRAY_TYPES):
+        cls = type(tag)
+        yield f"[{ARRAY_PREFIXES[cls]};"
+        suffix = ARRAY_SUFFIXES[cls]
+        separator = suffix + ","
+        for start in range(0, len(tag), ARRAY_SLICE):
+            text = separator.join(map(str, tag[start:start + ARRAY_SLICE].tolist())) + suffix
+            yield text if not start else "," + text
+        yield "]"
+    elif isinstance(tag, float):
+        text = float_text(tag)
+        yield SPECIAL_FLOATS.get(text, text) + tag.suffix
+    else:
+        yield int.__repr__(tag) + tag.suffix
+
+
+def json_value(tag):
+    cls = type(tag)
+    if cls is String:
+        yield json.dumps(tag, ensure_ascii=False)
+    elif cls is Int:
+        yield int.__repr__(tag)
+    elif cls is Double:
+        text = float.__repr__(tag)
+        yield SPECIAL_FLOATS.get(text, text)
+    elif cls in ARRAY_MARKERS:
+        yield f'{{"{ARRAY_MARKERS[cls]}":"'
+        data = np.asarray(tag).astype(ARRAY_DTYPES[cls], copy=False)
+        for start in range(0, len(data), ARRAY_SLICE):
+            yield base64.b64encode(data[start:start + ARRAY_SLICE].tobytes()).decode("ascii")
+        yield '"}'
+    elif cls is Float:
+        text = float_text(tag)
+        yield f'{{"$f":{SPECIAL_FLOATS.get(text, text)}}}'
+    else:
+        yield f'{{"{SCALAR_MARKERS[cls]}":{int.__repr__(tag)}}}'
+
+
+def snbt_key(key):
+    return serializer.stringify_compound_key(key)
+
+
+def json_key(key):
+    return json.dumps("$" + key if key.startswith("$") else key, ensure_ascii=False)
+
+
+def encode(events, fmt=SNBT, indent=None):
+    json_mode = fmt == JSON
+    write_value = json_value if json_mode else snbt_value
+    write_key = json_key if json_mode else snbt_key
+    colon = ": " if indent is not None else ":"
+    pad = " " * indent if indent is not None else None
+    parts = []
+    stack = []
+    for kind, key, value in events:
+        if kind is END_COMPOUND or kind is END_LIST:
+            closing, count, expand = stack.pop()
+            if expand and count:
+                parts.append("\n" + pad * len(stack))
+            parts.append(closing)
+        else:
+            if stack:
+                frame = stack[-1]
+                if frame[1]:
+                    parts.append("," if frame[2] or pad is None else ", ")
+                frame[1] += 1
+                if frame[2]:
+                    parts.append("\n" + pad * len(stack))
+                if frame[0] == "}":
+                    parts.append(write_key(key) + colon)
+            if kind is VALUE:
+                for text in write_value(value):
+                    parts.append(text)
+                    if len(parts) >= FLUSH_PARTS:
+                        yield "".join(parts)
+                        parts = []
+            elif kind is START_COMPOUND:
+                parts.append("{")
+                stack.append(["}", 0, pad is not None])
+            elif json_mode and value is not None and value[0] and not value[1]:
+                parts.append(f'{{"{LIST_MARKER}":"{Base.get_tag(value[0]).__name__}"}}')
+                stack.append(["", 0, False])
+            else:
+                parts.append("[")
+                stack.append(["]", 0, pad is not None and value is not None and value[0] in EXPANDED_TYPES])
+        if len(parts) >= FLUSH_PARTS:
+            yield "".join(parts)
+            parts = []
+    if parts:
+        yield "".join(parts)
+
+
+class TextReader:
+    def __init__(self, f, block_size=READ_BLOCK_SIZE):
+        self.f = f
+        self.block_size = block_size
+        self.buffer = ""
+        self.pos = 0
+        self.offset = 0
+        self.eof = False
+        self.end = 0
+        self.next = self.tokens().__next__
+
+    def error(self, message):
+        return FormatError(f"{message} (位置 {self.offset + self.pos})")
+
+    def fill(self):
+        data = self.f.read(max(self.block_size, len(self.buffer) - self.pos))
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        if not data:
+            self.eof = True
+        self.end = self.limit()
+
+    def closing(self, start, quote):
+        end = self.buffer.find(quote, start)
+        while end >= 0:
+            back = end
+            while back > start and self.buffer[back - 1] == "\\":
+                back -= 1
+            if not (end - back) % 2:
+                return end
+            end = self.buffer.find(quote, end + 1)
+        return -1
+
+    def limit(self):
+        if self.eof:
+            return len(self.buffer)
+        start = max(0, len(self.buffer) - WORD_LIMIT)
+        end = WORD_TAIL.search(self.buffer, start).start()
+        return 0 if end == start and start else end
+
+    def tokens(self):
+        while True:
+            buffer = self.buffer
+            moved = False
+            for match in TOKEN.finditer(buffer, self.pos, self.end):
+                index = match.lastindex
+                if index == 5:
+                    break
+                pos = self.pos = match.end()
+                if index == 1:
+                    yield match.group(1), None
+                elif index == 2:
+                    yield "word", match.group(2)
+                else:
+                    yield "string", match.group(index)
+                if self.pos != pos or self.buffer is not buffer:
+                    moved = True
+                    break
+            if moved:
+                continue
+            self.pos = SPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) and self.buffer[self.pos] in "\"'":
+                quote = self.buffer[self.pos]
+                end = self.closing(self.pos + 1, quote)
+                while end < 0:
+                    if self.eof:
+                        raise self.error("字符串没有结束")
+                    self.fill()
+                    end = self.closing(self.pos + 1, quote)
+                text = self.buffer[self.pos + 1:end]
+                self.pos = end + 1
+                yield "string", text
+                continue
+            if self.eof:
+                if self.pos < len(self.buffer):
+                    raise self.error("无法识别的字符")
+                raise self.error("意外的文件结尾")
+            self.fill()
+
+    def expect(self, kind):
+        token = self.next()
+        if token[0] != kind:
+            raise self.error(f"缺少 {kind}")
+
+    def match(self, pattern):
+        while len(self.buffer) - self.pos < LOOKAHEAD and not self.eof:
+            self.fill()
+        match = pattern.match(self.buffer, self.pos)
+        if match:
+            self.pos = match.end()
+        return match
+
+    def until(self, char):
+        start = self.pos
+        while True:
+            end = self.buffer.find(char, start)
+            if end >= 0:
+                text = self.buffer[self.pos:end]
+                self.pos = end + 1
+                return text
+            if self.eof:
+                raise self.error(f"缺少 {char}")
+            start = len(self.buffer) - self.pos
+            self.fill()
+            start += self.pos
+
+    def finish(self):
+        while True:
+            self.pos = SPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                raise self.error("文档结尾有多余的内容")
+            if self.eof:
+                return
+            self.fill()
+
+
+def make_float(text):
+    return Float(float(np.float32(text)))
+
+
+def snbt_scalar(text):
+    if NUMBER.fullmatch(text):
+        suffix = text[-1].lower()
+        try:
+            if suffix == "f":
+                return make_float(text[:-1])
+            if suffix in NUMBER_SUFFIXES:
+                return NUMBER_SUFFIXES[suffix](text[:-1])
+            return Double(text) if "." in text or "e" in text.lower() else Int(text)
+        except (OutOfRange, ValueError):
+            return String(text)
+    if text in SPECIAL_SCALARS:
+        return SPECIAL_SCALARS[text]
+    alias = LITERAL_ALIASES.get(text.lower())
+    return alias if alias is not None else String(text)
+
+
+def json_scalar(text, reader):
+    if text in ("true", "false"):
+        return Byte(text == "true")
+    try:
+        value = int(text)
+    except ValueError:
+        try:
+            return Double(float(text))
+        except ValueError:
+            raise reader.error(f"无效的值 {text}") from None
+    try:
+        return Int(value)
+    except OutOfRange:
+        return Long(value)
+
+
+def snbt_string(text):
+    return ESCAPE.sub(r"\1", text) if "\\" in text else text
+
+
+def json_string(text, reader):
+    if "\\" not in text:
+        return text
+    try:
+        return json.loads(f'"{text}"')
+    except ValueError as e:
+        raise reader.error(f"无效的字符串: {e}") from None
+
+
+def parse_array(cls, body, reader):
+    suffix = ARRAY_SUFFIXES[cls]
+    if suffix:
+        body = body.replace(suffix, "").replace(suffix.lower(), "")
+    if not body.strip():
+        return cls()
+    try:
+        values = np.fromstring(body, np.int64, sep=",")
+    except ValueError as e:
+        raise reader.error(f"无效的数组: {e}") from None
+    dtype = ARRAY_DTYPES[cls]
+    limits = np.iinfo(dtype)
+    if values.min() < limits.min or values.max() > limits.max:
+        raise reader.error(f"{cls.__name__} 中的值超出范围")
+    return cls(values.astype(dtype))
+
+
+def read_marker(marker, reader):
+    reader.expect(":")
+    kind, text = reader.next()
+    cls = MARKER_TYPES.get(marker)
+    try:
+        if marker == LIST_MARKER and kind == "string" and text in TAG_NAMES:
+            return START_LIST, TAG_NAMES[text]
+        if cls in ARRAY_MARKERS and kind == "string":
+            return VALUE, cls(np.frombuffer(base64.b64decode(text, validate=True), ARRAY_DTYPES[cls]))
+        if cls in SCALAR_MARKERS and kind == "word":
+            return VALUE, make_float(text) if cls is Float else cls(int(text))
+    except (ValueError, OutOfRange) as e:
+        raise reader.error(f"{marker} 的值无效: {e}") from None
+    raise reader.error(f"无效的标记 {marker}")
+
+
+def text_events(f, fmt=SNBT):
+    reader = TextReader(f)
+    json_mode = fmt == JSON
+    stack = []
+    key = None
+    kind, text = reader.next()
+    while True:
+        if kind == "{":
+            kind, text = reader.next()
+            if json_mode and kind == "string" and text.startswith("$") and not text.startswith("$$"):
+                event, value = read_marker(json_string(text, reader), reader)
+                reader.expect("}")
+                if event is START_LIST:
+                    yield START_LIST, key, (value, 0)
+                    yield END_LIST, None, None
+                else:
+                    yield VALUE, key, value
+            else:
+                yield START_COMPOUND, key, None
+                if kind == "}":
+                    yield END_COMPOUND, None, None
+                else:
+                    stack.append(True)
+                    key = read_key(kind, text, reader, json_mode)
+                    kind, text = reader.next()
+                    continue
+        elif kind == "[":
+            prefix = None if json_mode else reader.match(ARRAY_PREFIX)
+            if prefix:
+                cls = {"B": ByteArray, "I": IntArray, "L": LongArray}[prefix.group(1)]
+                yield VALUE, key, parse_array(cls, reader.until("]"), reader)
+            else:
+                yield START_LIST, key, None
+                kind, text = reader.next()
+                if kind == "]":
+                    yield END_LIST, None, None
+                else:
+                    stack.append(0)
+                    key = 0
+                    continue
+        elif kind == "string":
+            yield VALUE, key, String(json_string(text, reader) if json_mode else snbt_string(text))
+        elif kind == "word":
+            yield VALUE, key, json_scalar(text, reader) if json_mode else snbt_scalar(text)
+        else:
+            raise reader.error(f"意外的 {kind}")
+
+        while stack:
+            kind, text = reader.next()
+            frame = stack[-1]
+            if kind == ",":
+                if frame is True:
+                    kind, text = reader.next()
+                    key = read_key(kind, text, reader, json_mode)
+                else:
+                    stack[-1] = key = frame + 1
+                kind, text = reader.next()
+                break
+            if kind != ("}" if frame is True else "]"):
+                raise reader.error("缺少 , 或结束括号")
+            stack.pop()
+            yield (END_COMPOUND if frame is True else END_LIST), None, None
+        else:
+            reader.finish()
+            return
+
+
+def read_key(kind, text, reader, json_mode):
+    if json_mode:
+        if kind != "string":
+            raise reader.error("缺少键名")
+        text = json_string(text, reader)
+        if text.startswith("$"):
+            if not text.startswith("$$"):
+                raise reader.error(f"键名 {text} 只能作为标记")
+            text = text[1:]
+    elif kind == "string":
+        text = snbt_string(text)
+    elif kind != "word":
+        raise reader.error("缺少键名")
+    reader.expect(":")
+    return text
+
+
+def make_list(items, subtype=None):
+    if items:
+        cls = type(items[0])
+        base = List if issubclass(cls, List) else cls
+        if not all(isinstance(item, base) for item in items):
+            raise FormatError(f"列表中的元素类型不一致: {base.__name__}")
+        tag = List[base]()
+    else:
+        tag = List[Base.get_tag(subtype or 0)]()
+    list.extend(tag, items)
+    return tag
+
+
+def build(events, task=None):
+    stack = []
+    root = None
+    count = 0
+    for kind, key, value in events:
+        if kind is START_COMPOUND:
+            stack.append((Compound(), key, None))
+            continue
+        if kind is START_LIST:
+            stack.append(([], key, value))
+            continue
+        if kind is END_COMPOUND:
+            value, key, info = stack.pop()
+        elif kind is END_LIST:
+            items, key, info = stack.pop()
+            value = make_list(items, info[0] if info else None)
+        if not stack:
+            root = value
+            continue
+        parent = stack[-1][0]
+        if type(parent) is list:
+            parent.append(value)
+        else:
+            dict.__setitem__(parent, key, value)
+        count += 1
+        if task is not None and not count & 0xFFFF:
+            task.check()
+    if root is None:
+        raise FormatError("文档为空")
+    return root
+
+
+def export_events(events, file_path, fmt=None, indent=None, task=None):
+    fmt = fmt or format_of(file_path)
+    with worker.replace_file(file_path) as raw:
+        writer = io.TextIOWrapper(io.BufferedWriter(worker.ProgressWriter(raw, task), 1 << 16),
+                                  encoding="utf-8", newline="\n")
+        for text in encode(events, fmt, indent):
+            writer.write(text)
+        writer.flush()
+        writer.detach()
+
+
+def export_tag(tag, file_path, fmt=None, indent=None, task=None):
+    export_events(tag_events(tag), file_path, fmt, indent, task)
+
+
+def export_file(file_path, target, fmt=None, indent=None, task=None):
+    export_events(stream.EventReader(stream.read_buffer(file_path, task)), target, fmt, indent, task)
+
+
+def import_tag(file_path, fmt=None, task=None):
+    fmt = fmt or format_of(file_path)
+    with open(file_path, "rb", buffering=0) as raw:
+        reader = io.BufferedReader(worker.ProgressReader(raw, task, os.path.getsize(file_path)), 1 << 16)
+        return build(text_events(io.TextIOWrapper(reader, encoding="utf-8-sig"), fmt), task)
@@ -0,0 +1,252 @@
+import os
+import re
+
+import nbtlib
+import numpy as np
+from nbtlib.tag import Int, String, Float, Compound, List, Byte, Short, Long, Double, ByteArray, IntArray, LongArray
+
+import region
+import search
+import stream
+import world
+import worker
+
+PATH_TOKEN = re.compile(r'\[(-?\d+)\]|"((?:[^"\\]|\\.)*)"|([^.\[\]"]+)')
+BARE_KEY = re.compile(r'[^.\[\]"\s]+')
+STREAM_THRESHOLD = 64 << 20
+DISPLAY_LIMIT = 200
+
+TAG_TYPES = {
+    "Byte": Byte,
+    "Short": Short,
+    "Int": Int,
+    "Long": Long,
+    "Float": Float,
+    "Double": Double,
+    "String": String,
+    "Compound": Compound,
+}
+
+
+def parse_path(expr):
+    keys = []
+    expr = expr.strip()
+    pos = 0
+    while pos < len(expr):
+        match = PATH_TOKEN.match(expr, pos)
+        if not match:
+            raise ValueError(f"无效的路径: {expr}")
+        index, quoted, name = match.groups()
+        if index is not None:
+            keys.append(int(index))
+        elif quoted is not None:
+            keys.append(re.sub(r"\\(.)", r"\1", quoted))
+        else:
+            keys.append(name)
+        pos = match.end()
+        if pos < len(expr) and expr[pos] == ".":
+            pos += 1
+    return keys
+
+
+def format_path(keys):
+    parts = []
+    for key in keys:
+        if isinstance(key, int):
+            parts.append(f"[{key}]")
+            continue
+        if not BARE_KEY.fullmatch(key):
+            key = '"' + key.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        parts.append("." + key if parts else key)
+    return "".join(parts)
+
+
+def integer_renderer(name):
+    return lambda tag: f"{name}({int.__repr__(tag)})"
+
+
+def array_renderer(name):
+    return lambda tag: f"{name}[{len(tag)}]"
+
+
+TYPE_NAMES = {cls: cls.__name__ for cls in (Byte, Short, Int, Long, Float, Double, String,
+                                            ByteArray, IntArray, LongArray)}
+
+VALUE_RENDERERS = {
+    Byte: integer_renderer("Byte"),
+    Short: integer_renderer("Short"),
+    Int: integer_renderer("Int"),
+    Long: integer_renderer("Long"),
+    Float: lambda tag: str(np.float32(tag)),
+    Double: float.__repr__,
+    String: lambda tag: f'"{tag}"',
+    ByteArray: array_renderer("ByteArray"),
+    IntArray: array_renderer("IntArray"),
+    LongArray: array_renderer("LongArray"),
+}
+
+
+def type_name(tag):
+    return TYPE_NAMES.get(type(tag)) or type(tag).__name__
+
+
+def value_string(tag):
+    render = VALUE_RENDERERS.get(type(tag))
+    return render(tag) if render else str(tag)
+
+
+def display_string(tag, limit=DISPLAY_LIMIT):
+    if type(tag) is String and len(tag) > limit:
+        return f'"{tag[:limit]}..."'
+    text = value_string(tag)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def convert_value(type_str, value_str):
+    if type_str == "Int":
+        return Int(int(value_str.split("(")[-1].split(")")[0]))
+    elif type_str == "Float":
+        return Float(float(value_str.split("(")[-1].split(")")[0]))
+    elif type_str == "Double":
+        return Double(float(value_str.split("(")[-1].split(")")[0]))
+    elif type_str == "Byte":
+        return Byte(int(value_str.split("(")[-1].split(")")[0]))
+    elif type_str == "Short":
+        return Short(int(value_str.split("(")[-1].split(")")[0]))
+    elif type_str == "Long":
+        return Long(int(value_str.split("(")[-1].split(")")[0]))
+    elif type_str == "String":
+
+        if value_str.startswith('"') and value_str.endswith('"'):
+            value_str = value_str[1:-1]
+        return String(value_str.split("(")[-1].split(")")[0])
+    return value_str.split("(")[-1].split(")")[0]
+
+
+def create_value(type_str, value_str):
+    if type_str not in TAG_TYPES:
+        raise ValueError(f"不支持的类型: {type_str}")
+    if type_str == "Compound":
+        return Compound()
+    if type_str == "String":
+        return String(value_str)
+    if type_str in ("Float", "Double"):
+        return TAG_TYPES[type_str](float(value_str))
+    return TAG_TYPES[type_str](int(value_str))
+
+
+class Node:
+    __slots__ = ("parent", "key", "tag", "container", "rendered")
+
+    def __init__(self, parent, key, tag, container=None):
+        self.parent = parent
+        self.key = key
+        self.tag = tag
+        self.container = container
+        self.rendered = None
+
+    def display(self):
+        if self.rendered is None:
+            self.rendered = display_string(self.tag)
+        return self.rendered
+
+    def path(self):
+        keys = []
+        node = self
+        while node.parent is not None:
+            keys.append(node.key)
+            node = node.parent
+        keys.reverse()
+        return keys
+
+
+def resolve(root, path):
+    current = root
+    for key in path:
+        current = current[key]
+    return current
+
+
+def set_child(parent, key, value):
+    if not isinstance(parent, (Compound, List)):
+        raise TypeError("该节点不能修改")
+    parent[key] = value
+
+
+def add_child(parent, key, value):
+    if not isinstance(parent, Compound):
+        raise TypeError("只能在Compound节点下添加新节点")
+    parent[key] = value
+
+
+def insert_child(parent, key, value, index=None):
+    if isinstance(parent, List):
+        parent.insert(key, value)
+        return
+    add_child(parent, key, value)
+    if index is not None:
+        for name in list(parent)[index:-1]:
+            parent[name] = parent.pop(name)
+
+
+def child_index(parent, key):
+    if isinstance(key, int):
+        return key
+    return list(parent).index(key)
+
+
+def delete_child(parent, key):
+    if not isinstance(parent, (Compound, List)):
+        raise TypeError("该节点不能删除")
+    del parent[key]
+
+
+def mark_dirty(root, path):
+    if isinstance(root, (region.RegionFile, world.WorldFolder)):
+        root.mark_dirty(path)
+
+
+def set_value(root, path, value):
+    set_child(resolve(root, path[:-1]), path[-1], value)
+    mark_dirty(root, path)
+
+
+def add_value(root, parent_path, key, value):
+    add_child(resolve(root, parent_path), key, value)
+    mark_dirty(root, parent_path + [key])
+
+
+def delete_value(root, path):
+    delete_child(resolve(root, path[:-1]), path[-1])
+    mark_dirty(root, path)
+
+
+def load(file_path, task=None, lazy=None):
+    if os.path.isdir(file_path):
+        return world.WorldFolder(file_path)
+    if file_path.lower().endswith(world.REGION_EXTENSIONS):
+        return region.RegionFile(file_path)
+    if lazy is None:
+        lazy = os.path.getsize(file_path) >= STREAM_THRESHOLD
+    if lazy:
+        return stream.open_lazy(file_path, task=task)
+    return worker.load_nbt(file_path, task)
+
+
+def save(level, file_path, task=None, kind=None, compresslevel=None):
+    if isinstance(level, region.RegionFile):
+        return level.save(file_path, task, kind, compresslevel)
+    if isinstance(level, world.WorldFolder):
+        if os.path.abspath(file_path) != os.path.abspath(level.path):
+            raise TypeError("世界文件夹不支持另存为")
+        return level.save(task, kind, compresslevel)
+    if not isinstance(level, nbtlib.File):
+        raise TypeError("当前文档不支持保存")
+    return worker.save_nbt(level, file_path, task, kind, compresslevel)
+
+
+def find(root, pattern, case_sensitive=False, use_regex=False):
+    matcher = search.compile_matcher(pattern, case_sensitive, use_regex)
+    index = search.SearchIndex(root, value_string)
+    for path in index.search(matcher):
+        yield path, resolve(root, path)
@@ -0,0 +1,237 @@
+import hashlib
+import io
+
+import numpy as np
+from nbtlib.tag import Byte, Short, Int, Long, Float, Double, String, Compound, List, ByteArray, IntArray, LongArray
+
+import core
+import region
+import stream
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+LABELS = {ADDED: "新增", REMOVED: "删除", CHANGED: "修改"}
+
+ELEMENT_LIMIT = 1000
+CHECK_INTERVAL = 256
+SCALAR_DTYPES = {Byte: ">i1", Short: ">i2", Int: ">i4", Long: ">i8", Float: ">f4", Double: ">f8"}
+ARRAY_TYPES = (ByteArray, IntArray, LongArray)
+
+
+class Difference:
+    __slots__ = ("path", "status", "old", "new", "count")
+
+    def __init__(self, path, status, old, new, count=1):
+        self.path = path
+        self.status = status
+        self.old = old
+        self.new = new
+        self.count = count
+
+
+def kind(tag):
+    if isinstance(tag, (Compound, stream.LazyCompound)):
+        return "Compound"
+    if isinstance(tag, (List, stream.LazyList)):
+        return "List"
+    if isinstance(tag, region.RegionFile):
+        return "Region"
+    if isinstance(tag, ARRAY_TYPES):
+        return "Array"
+    return None
+
+
+def digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def chunk_digest(region_file, index):
+    if index in region_file.chunks:
+        buffer = io.BytesIO()
+        region_file.chunks[index].write(buffer)
+        return digest(buffer.getbuffer())
+    return digest(region_file.read_chunk_data(index))
+
+
+def same_leaf(a, b):
+    return type(a) is type(b) and (a == b or (a != a and b != b))
+
+
+def entries(tag):
+    if isinstance(tag, region.RegionFile):
+        return tag.chunk_indices(), tag.peek
+    return list(tag.keys()), tag.__getitem__
+
+
+def subtype(tag):
+    return tag.subtype if len(tag) or isinstance(tag, stream.LazyList) else None
+
+
+def sequence_array(tag):
+    if isinstance(tag, ARRAY_TYPES):
+        return np.asarray(tag)
+    if isinstance(tag, stream.LazyList) and tag.subtype_id in tag.reader.scalars:
+        return np.frombuffer(tag.reader.data, SCALAR_DTYPES[tag.subtype], tag.length, tag.start)
+    item_type = subtype(tag)
+    if item_type in SCALAR_DTYPES:
+        return np.fromiter(tag, SCALAR_DTYPES[item_type], len(tag))
+    if item_type is String:
+        return np.array(list(tag), dtype=object)
+    return None
+
+
+class Digests:
+    def __init__(self):
+        self.memo = {}
+
+    def key(self, tag):
+        if isinstance(tag, stream.LazyCompound):
+            return id(tag.reader), tag.pos
+        if isinstance(tag, stream.LazyList):
+            return id(tag.reader), tag.start
+        return id(tag)
+
+    def __call__(self, tag):
+        key = self.key(tag)
+        entry = self.memo.get(key)
+        if entry is not None:
+            return entry[1]
+        h = hashlib.blake2b(digest_size=16)
+        if kind(tag) == "Compound":
+            h.update(b"C")
+            for name, value in tag.items():
+                self.update_bytes(h, name.encode("utf-8", "surrogatepass"))
+                self.update(h, value)
+        else:
+            h.update(b"L" + len(tag).to_bytes(4, "big"))
+            if len(tag):
+                h.update(subtype(tag).__name__.encode())
+            array = sequence_array(tag)
+            if array is None:
+                for item in tag:
+                    self.update(h, item)
+            elif array.dtype == object:
+                for item in array:
+                    self.update_bytes(h, item.encode("utf-8", "surrogatepass"))
+            else:
+                h.update(array.tobytes())
+        value = h.digest()
+        self.memo[key] = (tag, value)
+        return value
+
+    def update(self, h, tag):
+        tag_kind = kind(tag)
+        if tag_kind in ("Compound", "List"):
+            h.update(self(tag))
+        elif tag_kind == "Array":
+            h.update(type(tag).__name__.encode())
+            self.update_bytes(h, np.asarray(tag).tobytes())
+        else:
+            self.update_bytes(h, repr(tag).encode("utf-8", "surrogatepass"))
+
+    def update_bytes(self, h, data):
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+
+    def same(self, a, b):
+        return self(a) == self(b)
+
+
+def compare_sequence(path, a, b, left, right):
+    common = min(len(left), len(right))
+    changed = left[:common] != right[:common]
+    if left.dtype.kind == "f":
+        changed &= ~(np.isnan(left[:common]) & np.isnan(right[:common]))
+    indices = np.flatnonzero(changed)
+    total = len(indices) + abs(len(left) - len(right))
+    if not total:
+        return
+    yield Difference(path, CHANGED, a, b, total)
+    for i in indices[:ELEMENT_LIMIT].tolist():
+        yield Difference(path + [i], CHANGED, a[i], b[i])
+    limit = max(ELEMENT_LIMIT - len(indices), 0)
+    for i in range(common, min(len(left), common + limit)):
+        yield Difference(path + [i], REMOVED, a[i], None)
+    for i in range(common, min(len(right), common + limit)):
+        yield Difference(path + [i], ADDED, None, b[i])
+
+
+def compare_pair(path, a, b, pending, digests):
+    kind_a, kind_b = kind(a), kind(b)
+    if kind_a != kind_b:
+        yield Difference(path, CHANGED, a, b)
+    elif kind_a is None:
+        if not same_leaf(a, b):
+            yield Difference(path, CHANGED, a, b)
+    elif kind_a == "Array":
+        if type(a) is not type(b):
+            yield Difference(path, CHANGED, a, b)
+        else:
+            yield from compare_sequence(path, a, b, np.asarray(a), np.asarray(b))
+    elif kind_a == "Region" or not digests.same(a, b):
+        pending.append((path, a, b))
+
+
+def compare_children(path, a, b, pending, digests):
+    if kind(a) == "List":
+        if len(a) and len(b) and subtype(a) is not subtype(b):
+            yield Difference(path, CHANGED, a, b)
+            return
+        left, right = sequence_array(a), sequence_array(b)
+        if left is not None and right is not None:
+            yield from compare_sequence(path, a, b, left, right)
+            return
+        common = min(len(a), len(b))
+        for i in range(common):
+            yield from compare_pair(path + [i], a[i], b[i], pending, digests)
+        for i in range(common, len(a)):
+            yield Difference(path + [i], REMOVED, a[i], None)
+        for i in range(common, len(b)):
+            yield Difference(path + [i], ADDED, None, b[i])
+        return
+
+    keys_a, get_a = entries(a)
+    keys_b, get_b = entries(b)
+    right_keys = set(keys_b)
+    left_keys = set(keys_a)
+    for key in keys_a:
+        if key not in right_keys:
+            yield Difference(path + [key], REMOVED, get_a(key), None)
+        elif kind(a) == "Region":
+            if chunk_digest(a, key) != chunk_digest(b, key):
+                pending.append((path + [key], get_a(key), get_b(key)))
+        else:
+            yield from compare_pair(path + [key], get_a(key), get_b(key), pending, digests)
+    for key in keys_b:
+        if key not in left_keys:
+            yield Difference(path + [key], ADDED, None, get_b(key))
+
+
+def compare(left, right, task=None):
+    pending = []
+    digests = Digests()
+    yield from compare_pair([], left, right, pending, digests)
+    visited = 0
+    while pending:
+        path, a, b = pending.pop()
+        children = []
+        yield from compare_children(path, a, b, children, digests)
+        pending.extend(reversed(children))
+        visited += 1
+        if task is not None and visited % CHECK_INTERVAL == 0:
+            task.check()
+
+
+def render(value):
+    if value is None:
+        return ""
+    if isinstance(value, np.generic):
+        return str(value.item())
+    if isinstance(value, region.RegionFile):
+        return f"Region ({len(value)} 个区块)"
+    if isinstance(value, (stream.LazyCompound, stream.LazyList)):
+        return f"{kind(value)} ({len(value)} 项)"
+    if kind(value) in ("Compound", "List"):
+        return f"{core.type_name(value)} ({len(value)} 项)"
+    return core.display_string(value)
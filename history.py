@@ -0,0 +1,58 @@
+import collections
+
+import core
+
+HISTORY_LIMIT = 100
+
+
+class Change:
+    __slots__ = ("path", "old", "new", "index")
+
+    def __init__(self, path, old, new, index=None):
+        self.path = path
+        self.old = old
+        self.new = new
+        self.index = index
+
+    def inverse(self):
+        return Change(self.path, self.new, self.old, self.index)
+
+
+def apply(root, change):
+    parent = core.resolve(root, change.path[:-1])
+    key = change.path[-1]
+    if change.new is None:
+        core.delete_child(parent, key)
+    elif change.old is None:
+        core.insert_child(parent, key, change.new, change.index)
+    else:
+        core.set_child(parent, key, change.new)
+    core.mark_dirty(root, change.path)
+
+
+class History:
+    def __init__(self, limit=HISTORY_LIMIT):
+        self.undo_stack = collections.deque(maxlen=limit)
+        self.redo_stack = []
+
+    def record(self, change):
+        self.undo_stack.append(change)
+        self.redo_stack.clear()
+
+    def undo(self):
+        if not self.undo_stack:
+            return None
+        change = self.undo_stack.pop()
+        self.redo_stack.append(change)
+        return change.inverse()
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        change = self.redo_stack.pop()
+        self.undo_stack.append(change)
+        return change
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
@@ -1,15 +1,99 @@
 import ttkbootstrap as ttk
 from tkinter import filedialog, messagebox, simpledialog
 import nbtlib
-from nbtlib.tag import Int, String, Float, Compound, List, Byte, Short, Long, Double, ByteArray, IntArray, LongArray
+from nbtlib.tag import Compound, List, ByteArray, IntArray, LongArray
 import platform
+import functools
 import subprocess
+import sys
 import os
 import config
 import re
+import worker
+import search
+import history
+import compression
+import profiler
+import analyzer
+import cache
+import diff
+import blocks
+import catalog
+import convert
+import maps
+import query
+import core
+import stream
+import bulk
+import region
+import world
+import time
+import multiprocessing
+
+LIST_PAGE_SIZE = 1000
+ARRAY_PAGE_SIZE = 512
+ARRAY_COLUMNS = 16
+DIFF_LIMIT = 10000
+DIFF_OPEN_LIMIT = 200
+BLOCK_SUMMARY_SIZE = 10
+MAP_SCALES = {"1:1": 1, "1:2": 2, "1:4": 4, "1:8": 8}
+COMPOUND_TYPES = (Compound, stream.LazyCompound)
+LIST_TYPES = (List, stream.LazyList)
+STATS_COLUMNS = {"size": "大小", "count": "标签数", "depth": "深度"}
+
+
+class Document:
+    def __init__(self, frame, tree):
+        self.frame = frame
+        self.tree = tree
+        self.level = None
+        self.file_path = ""
+        self.modified = False
+        self.revision = 0
+        self.nodes = {}
+        self.lazy_nodes = {}
+        self.group_nodes = {}
+        self.history = history.History()
+        self.analysis = None
+        self.stats_sort = None
+        self.region_rows = {}
+        self.array_page = 0
+        self.array_item = None
+        self.search_index = None
+        self.search_results = []
+        self.search_iter = None
+        self.search_done = False
+        self.current_search_index = -1
+        self.last_search = None
+
+
+def document_attribute(name):
+    return property(lambda self: getattr(self.document, name),
+                    lambda self, value: setattr(self.document, name, value))
 
 
 class NBTExplorer:
+    tree = document_attribute("tree")
+    level = document_attribute("level")
+    file_path = document_attribute("file_path")
+    modified = document_attribute("modified")
+    revision = document_attribute("revision")
+    nodes = document_attribute("nodes")
+    lazy_nodes = document_attribute("lazy_nodes")
+    group_nodes = document_attribute("group_nodes")
+    history = document_attribute("history")
+    analysis = document_attribute("analysis")
+    stats_sort = document_attribute("stats_sort")
+    region_rows = document_attribute("region_rows")
+    array_page = document_attribute("array_page")
+    array_item = document_attribute("array_item")
+    search_index = document_attribute("search_index")
+    search_results = document_attribute("search_results")
+    search_iter = document_attribute("search_iter")
+    search_done = document_attribute("search_done")
+    current_search_index = document_attribute("current_search_index")
+    last_search = document_attribute("last_search")
+
     def __init__(self, filepath=""):
         self.root = ttk.Window(themename=config.theme)
         self.root.title("PyNBTExplorer")
@@ -21,19 +105,27 @@ class NBTExplorer:
         except:
             pass
 
-        self.node_paths = {}
-        self.node_values = {}
-
-        self.search_results = []
-        self.current_search_index = -1
+        self.document = None
+        self.documents = {}
+        self.parse_cache = cache.ParseCache(getattr(config, "cache_budget", cache.DEFAULT_BUDGET >> 20) << 20)
 
         self.create_menu()
 
         self.create_toolbar()
 
+        self.task = None
+        self.index_task = None
+        self.region_info = {}
+
+        self.status_frame = ttk.Frame(self.root)
+        self.status_frame.pack(side="bottom", fill="x")
+
         self.status_var = ttk.StringVar()
-        self.status_bar = ttk.Label(self.root, textvariable=self.status_var, relief="sunken", anchor="w")
-        self.status_bar.pack(side="bottom", fill="x")
+        self.status_bar = ttk.Label(self.status_frame, textvariable=self.status_var, relief="sunken", anchor="w")
+        self.status_bar.pack(side="left", fill="x", expand=True)
+
+        self.cancel_btn = ttk.Button(self.status_frame, text="取消", command=self.cancel_task)
+        self.progress_bar = ttk.Progressbar(self.status_frame, length=200, maximum=100)
 
         self.search_frame = ttk.Frame(self.root, relief="raised")
         self.search_frame.pack(side="top", fill="x", padx=2, pady=2)
@@ -62,24 +154,16 @@ class NBTExplorer:
         self.regex_chk = ttk.Checkbutton(self.search_frame, text="正则表达式", variable=self.regex_var)
         self.regex_chk.pack(side="left", padx=2)
 
+        self.query_var = ttk.BooleanVar()
+        self.query_chk = ttk.Checkbutton(self.search_frame, text="路径查询", variable=self.query_var)
+        self.query_chk.pack(side="left", padx=2)
+
         self.paned_window = ttk.PanedWindow(self.root, orient="horizontal")
         self.paned_window.pack(fill="both", expand=True)
 
-        self.tree_frame = ttk.Frame(self.paned_window)
-        self.tree_scrollbar = ttk.Scrollbar(self.tree_frame)
-        self.tree_scrollbar.pack(side="right", fill="y")
-
-        self.tree = ttk.Treeview(self.tree_frame, columns=("type", "value"),
-                                 yscrollcommand=self.tree_scrollbar.set,
-                                 selectmode="browse")
-        self.tree_scrollbar.config(command=self.tree.yview)
-        self.tree.pack(fill="both", expand=True)
-
-        self.tree.heading("#0", text="名称")
-        self.tree.heading("type", text="类型")
-        self.tree.heading("value", text="值")
-        self.tree.column("type", width=100, minwidth=80)
-        self.tree.column("value", width=150, minwidth=100)
+        self.notebook = ttk.Notebook(self.paned_window)
+        self.notebook.enable_traversal()
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
 
         self.detail_frame = ttk.Frame(self.paned_window)
         self.detail_label = ttk.Label(self.detail_frame, text="详细信息", font=("Arial", 10, "bold"))
@@ -89,24 +173,118 @@ class NBTExplorer:
         self.detail_scrollbar = ttk.Scrollbar(self.detail_frame, command=self.detail_text.yview)
         self.detail_text.config(yscrollcommand=self.detail_scrollbar.set)
 
+        self.array_frame = ttk.Frame(self.detail_frame)
+        ttk.Button(self.array_frame, text="上一页", command=lambda: self.change_array_page(-1)).pack(side="left", padx=2)
+        ttk.Button(self.array_frame, text="下一页", command=lambda: self.change_array_page(1)).pack(side="left", padx=2)
+        self.array_page_var = ttk.StringVar()
+        ttk.Label(self.array_frame, textvariable=self.array_page_var).pack(side="left", padx=5)
+        self.array_hex_var = ttk.BooleanVar()
+        ttk.Checkbutton(self.array_frame, text="十六进制", variable=self.array_hex_var,
+                        command=lambda: self.change_array_page(0)).pack(side="right", padx=2)
+
         self.detail_scrollbar.pack(side="right", fill="y")
         self.detail_text.pack(fill="both", expand=True)
 
-        self.paned_window.add(self.tree_frame)
+        self.paned_window.add(self.notebook)
         self.paned_window.add(self.detail_frame)
 
-        self.file_path = ""
-        self.level = None
-
-        self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
-        self.tree.bind("<Double-1>", self.on_tree_double_click)
+        self.save_options = (None, None)
+        self.new_document()
 
         if filepath and os.path.exists(filepath):
             self.open_file(filepath)
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def mainloop(self):
         self.root.mainloop()
 
+    def create_tree(self, parent):
+        scrollbar = ttk.Scrollbar(parent)
+        scrollbar.pack(side="right", fill="y")
+
+        tree = ttk.Treeview(parent, columns=("type", "value") + tuple(STATS_COLUMNS),
+                            displaycolumns=("type", "value"),
+                            yscrollcommand=scrollbar.set,
+                            selectmode="browse")
+        scrollbar.config(command=tree.yview)
+        tree.pack(fill="both", expand=True)
+        profiler.instrument(tree, "insert", "tk.insert")
+
+        tree.heading("#0", text="名称")
+        tree.heading("type", text="类型")
+        tree.heading("value", text="值")
+        tree.column("type", width=100, minwidth=80)
+        tree.column("value", width=150, minwidth=100)
+        for column, label in STATS_COLUMNS.items():
+            tree.heading(column, text=label, command=lambda column=column: self.sort_by_stats(column))
+            tree.column(column, width=80, minwidth=60, anchor="e")
+
+        tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+        tree.bind("<<TreeviewOpen>>", self.on_tree_open)
+        tree.bind("<Double-1>", self.on_tree_double_click)
+        tree.bind("<Button-2>" if platform.system() == "Darwin" else "<Button-3>", self.show_tree_menu)
+        return tree
+
+    def new_document(self):
+        frame = ttk.Frame(self.notebook)
+        document = Document(frame, self.create_tree(frame))
+        self.documents[str(frame)] = document
+        self.notebook.add(frame, text="未命名")
+        self.show_document(document)
+        return document
+
+    def show_document(self, document):
+        self.notebook.select(document.frame)
+        if document is self.document:
+            return
+        self.document = document
+        self.update_history_controls()
+        self.enable_edit_controls(self.level is not None)
+        self.clear_details()
+
+    def on_tab_changed(self, event):
+        document = self.documents.get(self.notebook.select())
+        if document is not None:
+            self.show_document(document)
+
+    def find_document(self, file_path):
+        file_path = os.path.abspath(file_path)
+        for document in self.documents.values():
+            if document.file_path and os.path.abspath(document.file_path) == file_path:
+                return document
+
+    def update_tab_title(self, document=None):
+        document = document or self.document
+        title = os.path.basename(document.file_path.rstrip("/\\")) if document.file_path else "未命名"
+        self.notebook.tab(document.frame, text=title + (" *" if document.modified else ""))
+
+    def close_document(self):
+        if self.task:
+            self.update_status("正在处理其他文件，请稍候")
+            return
+        document = self.document
+        if document.modified and not messagebox.askyesno("关闭", "文档有未保存的修改，确定要关闭吗？"):
+            return
+        if isinstance(document.level, world.WorldFolder) and self.index_task:
+            self.index_task.cancel()
+        if isinstance(document.level, (region.RegionFile, world.WorldFolder)):
+            document.level.close()
+        profiler.forget(document.tree)
+        del self.documents[str(document.frame)]
+        self.notebook.forget(document.frame)
+        document.frame.destroy()
+        if self.documents:
+            self.show_document(self.documents[self.notebook.select()])
+        else:
+            self.new_document()
+
+    def clear_details(self):
+        self.detail_text.config(state="normal")
+        self.detail_text.delete(1.0, ttk.END)
+        self.detail_text.config(state="disabled")
+        self.array_frame.pack_forget()
+
     def create_menu(self):
         self.menu = ttk.Menu(self.root)
         self.root.config(menu=self.menu)
@@ -115,9 +293,12 @@ class NBTExplorer:
         self.menu.add_cascade(label="文件(F)", menu=self.menu_file)
 
         self.menu_file.add_command(label="打开(O)", command=self.open_file_dialog, accelerator="Ctrl+O")
+        self.menu_file.add_command(label="打开世界(W)", command=self.open_world_dialog)
         self.menu_file.add_command(label="保存(S)", command=self.save_file, accelerator="Ctrl+S", state="disabled")
         self.menu_file.add_command(label="另存为(A)", command=self.save_file_as, accelerator="Ctrl+Shift+S",
                                    state="disabled")
+        self.menu_file.add_command(label="关闭(C)", command=self.close_document, accelerator="Ctrl+W")
+        self.menu_file.add_command(label="保存选项(P)", command=self.open_save_options)
         self.menu_file.add_command(label="设置",command=lambda:os.system("python3 setting.py"))
         self.menu_file.add_separator()
         self.menu_file.add_command(label="退出(X)", command=self.on_closing, accelerator="Alt+F4")
@@ -125,20 +306,47 @@ class NBTExplorer:
         self.menu_edit = ttk.Menu(self.menu, tearoff=0)
         self.menu.add_cascade(label="编辑(E)", menu=self.menu_edit)
 
+        self.menu_edit.add_command(label="撤销(U)", command=self.undo, accelerator="Ctrl+Z", state="disabled")
+        self.menu_edit.add_command(label="重做(R)", command=self.redo, accelerator="Ctrl+Y", state="disabled")
+        self.menu_edit.add_separator()
         self.menu_edit.add_command(label="编辑节点(E)", command=self.edit_node, accelerator="Enter", state="disabled")
         self.menu_edit.add_command(label="添加节点(A)", command=self.add_node, accelerator="Ctrl+N", state="disabled")
         self.menu_edit.add_command(label="删除节点(D)", command=self.delete_node, accelerator="Delete",
                                    state="disabled")
+        self.menu_edit.add_separator()
+        self.menu_edit.add_command(label="导出为SNBT/JSON(X)...", command=self.export_node, state="disabled")
+        self.menu_edit.add_command(label="从SNBT/JSON导入(I)...", command=self.import_node, state="disabled")
+
+        self.tree_menu = ttk.Menu(self.root, tearoff=0)
+        self.tree_menu.add_command(label="编辑节点", command=self.edit_node)
+        self.tree_menu.add_command(label="添加节点", command=self.add_node)
+        self.tree_menu.add_command(label="删除节点", command=self.delete_node)
+        self.tree_menu.add_separator()
+        self.tree_menu.add_command(label="导出为SNBT/JSON...", command=self.export_node)
+        self.tree_menu.add_command(label="从SNBT/JSON导入...", command=self.import_node)
 
         self.menu_view = ttk.Menu(self.menu, tearoff=0)
         self.menu.add_cascade(label="视图(V)", menu=self.menu_view)
 
         self.menu_view.add_command(label="刷新(R)", command=self.refresh_view, accelerator="F5")
+        self.menu_view.add_separator()
+        self.menu_view.add_command(label="分析子树(Z)", command=self.analyze_tree)
+        self.menu_view.add_command(label="最大的子树(T)", command=self.open_top_subtrees)
+        self.menu_view.add_command(label="地图预览(M)", command=self.open_map)
 
         self.menu_tools = ttk.Menu(self.menu, tearoff=0)
         self.menu.add_cascade(label="工具(T)", menu=self.menu_tools)
 
         self.menu_tools.add_command(label="查找(F)", command=self.focus_search, accelerator="Ctrl+F")
+        self.menu_tools.add_command(label="在文件中查找/替换(H)", command=self.open_bulk_search,
+                                    accelerator="Ctrl+Shift+F")
+        self.menu_tools.add_command(label="比较文件(D)", command=self.open_compare)
+        self.menu_tools.add_command(label="区段检查器(B)", command=self.open_section_inspector)
+        self.menu_tools.add_command(label="世界索引(I)", command=self.open_catalog)
+        self.menu_tools.add_separator()
+        self.profile_var = ttk.BooleanVar(value=profiler.enabled)
+        self.menu_tools.add_checkbutton(label="启用性能分析", variable=self.profile_var, command=self.toggle_profiling)
+        self.menu_tools.add_command(label="性能面板(P)", command=self.open_performance_panel)
 
         self.menu_help = ttk.Menu(self.menu, tearoff=0)
         self.menu.add_cascade(label="帮助(H)", menu=self.menu_help)
@@ -148,10 +356,14 @@ class NBTExplorer:
         self.root.bind("<Control-o>", lambda e: self.open_file_dialog())
         self.root.bind("<Control-s>", lambda e: self.save_file())
         self.root.bind("<Control-Shift-S>", lambda e: self.save_file_as())
+        self.root.bind("<Control-w>", lambda e: self.close_document())
         self.root.bind("<F5>", lambda e: self.refresh_view())
+        self.root.bind("<Control-z>", lambda e: self.undo())
+        self.root.bind("<Control-y>", lambda e: self.redo())
         self.root.bind("<Return>", lambda e: self.edit_node())
         self.root.bind("<Delete>", lambda e: self.delete_node())
         self.root.bind("<Control-f>", lambda e: self.focus_search())
+        self.root.bind("<Control-Shift-F>", lambda e: self.open_bulk_search())
 
     def create_toolbar(self):
         self.toolbar = ttk.Frame(self.root, relief="ridge")
@@ -188,143 +400,527 @@ class NBTExplorer:
 
     def open_file_dialog(self):
         file_path = filedialog.askopenfilename(
-            filetypes=[("NBT Files", "*.nbt"), ("DAT Files", "*.dat"), ("All Files", "*.*")]
+            filetypes=[("NBT Files", "*.nbt"), ("DAT Files", "*.dat"), ("Region Files", "*.mca *.mcr"),
+                       ("All Files", "*.*")]
         )
         if file_path:
             self.open_file(file_path)
 
-    def open_file(self, file_path):
-        try:
-            self.level = nbtlib.load(file_path)
+    def open_world_dialog(self):
+        folder_path = filedialog.askdirectory()
+        if folder_path:
+            self.open_file(folder_path)
+
+    def open_file(self, file_path, status=None, on_open=None):
+        if self.task:
+            self.update_status("正在处理其他文件，请稍候")
+            return
+        document = self.document
+        if status is None:
+            existing = self.find_document(file_path)
+            if existing is not None:
+                self.show_document(existing)
+                document = existing
+                if (existing.modified or not cache.cacheable(existing.level)
+                        or self.parse_cache.get(file_path) is existing.level):
+                    self.update_status(f"已切换到: {file_path}")
+                    if on_open:
+                        on_open()
+                    return
+            elif self.level is not None:
+                document = None
+        started = time.perf_counter()
+
+        def on_done(level):
+            self.show_document(document or self.new_document())
+            if self.level is not level and isinstance(self.level, (region.RegionFile, world.WorldFolder)):
+                self.level.close()
+            self.level = level
             self.file_path = file_path
+            self.modified = False
+            self.region_rows = {}
             self.update_tree()
-            self.update_status(f"已打开: {file_path}")
+            self.update_tab_title()
+            if isinstance(level, stream.LazyCompound):
+                message = status or f"已打开(只读): {file_path}"
+            else:
+                message = status or f"已打开: {file_path}"
+            self.update_status(self.timed_message("open_file", message, started))
             self.enable_edit_controls(True)
-        except Exception as e:
-            messagebox.showerror("打开文件错误", f"无法打开文件: {str(e)}")
+            if isinstance(level, world.WorldFolder):
+                self.start_region_index(level)
+            if on_open:
+                on_open()
+
+        def on_error(e):
+            if isinstance(e, worker.Cancelled):
+                self.update_status("已取消打开")
+            else:
+                messagebox.showerror("打开文件错误", f"无法打开文件: {str(e)}")
+
+        self.run_task(f"正在打开: {file_path}",
+                      lambda task: self.parse_cache.load(file_path, functools.partial(core.load, task=task)),
+                      on_done, on_error)
 
     def save_file(self):
+        if not isinstance(self.level, (nbtlib.File, region.RegionFile, world.WorldFolder)):
+            messagebox.showwarning("保存文件", "当前文档不支持保存")
+            return
         if not self.file_path:
             self.save_file_as()
             return
+        if self.task:
+            self.update_status("正在处理其他文件，请稍候")
+            return
 
-        try:
-            self.level.save(self.file_path)
-            self.update_status(f"已保存: {self.file_path}")
+        document = self.document
+        level = self.level
+        file_path = self.file_path
+        revision = self.revision
+        started = time.perf_counter()
+
+        def run(task):
+            core.save(level, file_path, task, *self.save_options)
+
+        def on_done(result):
+            self.enable_edit_controls(True)
+            if document.revision == revision:
+                self.parse_cache.put(file_path, level)
+                document.modified = False
+            self.update_tab_title(document)
+            self.update_status(self.timed_message("save_file", f"已保存: {file_path}", started))
             messagebox.showinfo("保存成功", "文件保存成功！")
-        except Exception as e:
-            messagebox.showerror("保存文件错误", f"无法保存文件: {str(e)}")
+
+        def on_error(e):
+            self.enable_edit_controls(True)
+            if isinstance(e, worker.Cancelled):
+                self.update_status("已取消保存")
+            else:
+                messagebox.showerror("保存文件错误", f"无法保存文件: {str(e)}")
+
+        self.enable_edit_controls(False)
+        self.run_task(f"正在保存: {file_path}", run, on_done, on_error)
+
+    def busy(self):
+        if self.task:
+            self.update_status("正在处理其他文件，请稍候")
+            return True
+        return False
+
+    def read_only_document(self):
+        return self.document is not None and isinstance(self.level, stream.LazyCompound)
+
+    def read_only(self):
+        if self.read_only_document():
+            self.update_status("只读打开的文档不能修改")
+            return True
+        return False
+
+    def timed_message(self, name, message, started):
+        elapsed = time.perf_counter() - started
+        profiler.record(name, elapsed)
+        if profiler.enabled:
+            return f"{message} ({elapsed:.2f} 秒)"
+        return message
+
+    def open_save_options(self):
+        options_win = ttk.Toplevel(self.root)
+        options_win.title("保存选项")
+        options_win.geometry("360x200")
+        options_win.transient(self.root)
+        options_win.grab_set()
+
+        kinds = [None] + list(compression.LABELS)
+        labels = ["保持原格式"] + list(compression.LABELS.values())
+        kind, level = self.save_options
+
+        kind_frame = ttk.Frame(options_win)
+        kind_frame.pack(fill="x", padx=10, pady=10)
+        ttk.Label(kind_frame, text="压缩格式:").pack(side="left")
+        kind_var = ttk.StringVar(value=labels[kinds.index(kind)])
+        kind_menu = ttk.Combobox(kind_frame, textvariable=kind_var, values=labels, state="readonly")
+        kind_menu.pack(side="left", fill="x", expand=True, padx=5)
+
+        level_frame = ttk.Frame(options_win)
+        level_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Label(level_frame, text="压缩级别:").pack(side="left")
+        level_var = ttk.IntVar(value=compression.LEVELS[kind or compression.GZIP][2] if level is None else level)
+        level_spin = ttk.Spinbox(level_frame, textvariable=level_var, from_=0, to=9)
+        level_spin.pack(side="left", fill="x", expand=True, padx=5)
+
+        fast_var = ttk.BooleanVar(value=self.save_options == compression.FAST_SAVE)
+        ttk.Checkbutton(options_win, text="快速保存 (gzip 级别 1)", variable=fast_var).pack(anchor="w", padx=10, pady=5)
+
+        def update_state(*args):
+            selected = kinds[labels.index(kind_var.get())]
+            kind_menu.config(state="disabled" if fast_var.get() else "readonly")
+            if fast_var.get() or selected in (None, compression.RAW):
+                level_spin.config(state="disabled")
+            else:
+                low, high, default = compression.LEVELS[selected]
+                level_spin.config(state="normal", from_=low, to=high)
+
+        def apply():
+            selected = kinds[labels.index(kind_var.get())]
+            if fast_var.get():
+                self.save_options = compression.FAST_SAVE
+            elif selected in (None, compression.RAW):
+                self.save_options = (selected, None)
+            else:
+                try:
+                    level = level_var.get()
+                except Exception:
+                    messagebox.showerror("保存选项", "压缩级别必须是整数", parent=options_win)
+                    return
+                low, high, default = compression.LEVELS[selected]
+                self.save_options = (selected, min(max(level, low), high))
+            options_win.destroy()
+            self.update_status(f"保存格式: {labels[kinds.index(self.save_options[0])]}")
+
+        kind_var.trace("w", update_state)
+        fast_var.trace("w", update_state)
+        update_state()
+
+        button_frame = ttk.Frame(options_win)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="确定", command=apply, width=10).pack(side="left", padx=10)
+        ttk.Button(button_frame, text="取消", command=options_win.destroy, width=10).pack(side="left", padx=10)
+
+    def start_region_index(self, folder):
+        if self.index_task:
+            self.index_task.cancel()
+        document = self.document
+        done = [0]
+
+        def run(task):
+            for batch in world.index_regions(folder.region_paths(), task):
+                task.emit(batch)
+
+        def on_item(batch):
+            for path, info in batch:
+                self.region_info[path] = info
+                item = document.region_rows.get(path)
+                if item and document.tree.exists(item):
+                    document.tree.set(item, "value", self.format_region_info(info))
+            done[0] += len(batch)
+            self.update_status(f"正在索引区域文件: 已完成 {done[0]} 个")
+
+        def on_done(result):
+            self.index_task = None
+            self.update_status(f"已索引 {done[0]} 个区域文件")
+
+        def on_error(e):
+            self.index_task = None
+            if not isinstance(e, worker.Cancelled):
+                self.update_status(f"索引区域文件失败: {str(e)}")
+
+        self.index_task = worker.BackgroundTask(self.root, run, on_done, on_error, on_item=on_item).start()
+
+    def format_region_info(self, info):
+        if info is None:
+            return "索引中..."
+        timestamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(info["timestamp"])) if info["timestamp"] else "-"
+        return f"{info['count']} 个区块, {info['size'] // 1024} KiB, {timestamp}"
+
+    def run_task(self, message, func, on_done, on_error, interval=100):
+        def finish(callback):
+            def wrapper(result):
+                self.task = None
+                self.progress_bar.stop()
+                self.progress_bar.pack_forget()
+                self.cancel_btn.pack_forget()
+                callback(result)
+            return wrapper
+
+        self.update_status(message)
+        self.progress_bar.config(mode="indeterminate", value=0)
+        self.progress_bar.start()
+        self.cancel_btn.pack(side="right", padx=2)
+        self.progress_bar.pack(side="right", padx=2)
+        self.task = worker.BackgroundTask(self.root, func, finish(on_done), finish(on_error),
+                                          self.update_progress, interval=interval).start()
+
+    def update_progress(self, progress):
+        if progress is None:
+            return
+        if str(self.progress_bar.cget("mode")) != "determinate":
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate")
+        self.progress_bar.config(value=progress * 100)
+
+    def cancel_task(self):
+        if self.task:
+            self.task.cancel()
 
     def save_file_as(self):
-        if not self.level:
+        if self.level is None:
+            return
+        if isinstance(self.level, world.WorldFolder):
+            messagebox.showwarning("另存为", "世界文件夹不支持另存为")
             return
 
-        file_path = filedialog.asksaveasfilename(
-            defaultextension=".dat",
-            filetypes=[("NBT Files", "*.nbt"), ("DAT Files", "*.dat"), ("All Files", "*.*")]
-        )
+        if isinstance(self.level, region.RegionFile):
+            file_path = filedialog.asksaveasfilename(
+                defaultextension=".mca",
+                filetypes=[("Region Files", "*.mca *.mcr"), ("All Files", "*.*")]
+            )
+        else:
+            file_path = filedialog.asksaveasfilename(
+                defaultextension=".dat",
+                filetypes=[("NBT Files", "*.nbt"), ("DAT Files", "*.dat"), ("All Files", "*.*")]
+            )
         if file_path:
+            self.parse_cache.discard(self.file_path)
             self.file_path = file_path
+            self.update_tab_title()
             self.save_file()
 
+    def export_node(self):
+        if self.busy():
+            return
+        selected_item = self.tree.focus()
+        if not selected_item or selected_item not in self.nodes:
+            messagebox.showwarning("导出", "请先选择要导出的节点")
+            return
+        tag = self.node_tag(selected_item)
+        if isinstance(tag, (region.RegionFile, world.WorldFolder)):
+            messagebox.showwarning("导出", "请选择区域文件中的一个区块导出")
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".snbt",
+            initialfile=f"{self.tree.item(selected_item, 'text')}.snbt",
+            filetypes=[("SNBT Files", "*.snbt"), ("JSON Files", "*.json"), ("All Files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        def on_done(result):
+            self.update_status(f"已导出到 {file_path}")
+
+        def on_error(e):
+            if isinstance(e, worker.Cancelled):
+                self.update_status("导出已取消")
+            else:
+                messagebox.showerror("导出错误", f"无法导出节点: {str(e)}")
+                self.update_status("导出失败")
+
+        self.run_task(f"正在导出: {file_path}",
+                      lambda task: convert.export_tag(tag, file_path, convert.format_of(file_path), 4, task),
+                      on_done, on_error)
+
+    def import_node(self):
+        if self.busy() or self.read_only():
+            return
+        selected_item = self.tree.focus()
+        node = self.nodes.get(selected_item)
+        if not selected_item or node is None or node.parent is None:
+            messagebox.showwarning("导入", "请先选择要替换的节点")
+            return
+        if isinstance(node.container, (region.RegionFile, world.WorldFolder)):
+            messagebox.showwarning("导入", "不能替换整个区块或文件")
+            return
+
+        file_path = filedialog.askopenfilename(
+            filetypes=[("SNBT/JSON Files", "*.snbt *.json"), ("All Files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        def on_done(new_value):
+            item = selected_item
+            if item not in self.nodes:
+                return
+            try:
+                old_value = self.node_tag(item)
+                change = history.Change(node.path(), old_value, new_value)
+                self.update_nbt_value(item, new_value)
+            except Exception as e:
+                messagebox.showerror("导入错误", f"无法替换节点: {str(e)}")
+                return
+            item = self.replace_tree_node(item, new_value)
+            self.record_change(change)
+            self.refresh_stats(item)
+            self.invalidate_search()
+            self.tree.selection_set(item)
+            self.tree.focus(item)
+            self.tree.see(item)
+            self.update_status(f"已从 {file_path} 导入")
+
+        def on_error(e):
+            if isinstance(e, worker.Cancelled):
+                self.update_status("导入已取消")
+            else:
+                messagebox.showerror("导入错误", f"无法读取文件: {str(e)}")
+                self.update_status("导入失败")
+
+        self.run_task(f"正在导入: {file_path}", lambda task: convert.import_tag(file_path, task=task),
+                      on_done, on_error)
+
+    def show_tree_menu(self, event):
+        item = self.tree.identify_row(event.y)
+        if not item:
+            return
+        self.tree.selection_set(item)
+        self.tree.focus(item)
+        self.tree_menu.tk_popup(event.x_root, event.y_root)
+
+    @profiler.timed("update_tree")
     def update_tree(self):
         for item in self.tree.get_children():
             self.tree.delete(item)
 
-        self.node_paths = {}
-        self.node_values = {}
-
-        if self.level:
-            root_tag = self.level.root if hasattr(self.level, 'root') else self.level
+        self.nodes = {}
+        self.lazy_nodes = {}
+        self.group_nodes = {}
+        self.invalidate_search()
+        self.history.clear()
+        self.analysis = None
+        self.stats_sort = None
+        self.tree.config(displaycolumns=("type", "value"))
+        for column, label in STATS_COLUMNS.items():
+            self.tree.heading(column, text=label)
+        self.update_history_controls()
+
+        if self.level is not None:
+            root_tag = self.root_tag()
             root_name = os.path.basename(self.file_path) if self.file_path else "Untitled"
-            root_id = self.tree.insert("", "end", text=root_name, values=("Compound", ""), open=True)
-            self.node_paths[root_id] = []
+            if isinstance(root_tag, region.RegionFile):
+                root_values = ("Region", f"{len(root_tag)} 个区块")
+            elif isinstance(root_tag, world.WorldFolder):
+                root_values = ("World", f"{len(root_tag)} 项")
+            else:
+                root_values = ("Compound", "")
+            root_id = self.tree.insert("", "end", text=root_name, values=root_values, open=True)
+            self.nodes[root_id] = core.Node(None, None, root_tag)
             self.populate_tree(root_id, root_tag)
 
+    @profiler.timed("populate_tree")
     def populate_tree(self, parent_id, tag):
-        if isinstance(tag, Compound):
+        if isinstance(tag, COMPOUND_TYPES):
             for key, value in tag.items():
-                if isinstance(value, Compound):
-                    count = len(value)
-                    child_id = self.tree.insert(parent_id, "end", text=key, values=("Compound", f"{count} 项"))
-                    self.node_paths[child_id] = self.node_paths[parent_id] + [key]
-                    self.populate_tree(child_id, value)
-                elif isinstance(value, List):
-                    list_type = value.subtype.__name__ if value.subtype else "Unknown"
-                    child_id = self.tree.insert(parent_id, "end", text=key,
-                                                values=(f"List[{list_type}]", f"{len(value)} 项"))
-                    self.node_paths[child_id] = self.node_paths[parent_id] + [key]
-                    for i, item in enumerate(value):
-                        self.populate_list(child_id, i, item)
-                else:
-                    value_str = self.get_value_string(value)
-                    child_id = self.tree.insert(parent_id, "end", text=key,
-                                                values=(self.get_type_name(value), value_str))
-                    self.node_paths[child_id] = self.node_paths[parent_id] + [key]
-                    self.node_values[child_id] = value
-
-        elif isinstance(tag, List):
-            for i, item in enumerate(tag):
-                self.populate_list(parent_id, i, item)
+                self.insert_node(parent_id, key, key, value)
+
+        elif isinstance(tag, LIST_TYPES):
+            self.populate_range(parent_id, tag, 0, len(tag))
+
+        elif isinstance(tag, region.RegionFile):
+            for index in tag.chunk_indices():
+                self.insert_chunk(parent_id, tag, index)
+
+        elif isinstance(tag, world.WorldFolder):
+            for name in tag.names():
+                self.insert_entry(parent_id, tag, name)
+
+    def insert_entry(self, parent_id, folder, name):
+        kind = folder.kind(name)
+        if kind == "Region":
+            path = folder.entry_path(name)
+            value = self.format_region_info(self.region_info.get(path))
+        else:
+            value = ""
+        node = core.Node(self.nodes[parent_id], name, None, folder)
+        child_id = self.tree.insert(parent_id, "end", text=name, values=(kind, value) + self.stats_values(node))
+        if kind == "Region":
+            self.region_rows[path] = child_id
+        self.nodes[child_id] = node
+        self.tree.insert(child_id, "end")
+        self.lazy_nodes[child_id] = functools.partial(folder.__getitem__, name)
+        return child_id
+
+    def insert_chunk(self, parent_id, region_file, index):
+        timestamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(region_file.chunk_timestamp(index)))
+        node = core.Node(self.nodes[parent_id], index, None, region_file)
+        child_id = self.tree.insert(parent_id, "end", text=region_file.chunk_label(index),
+                                    values=("Chunk", f"{region_file.chunk_size(index) // 1024} KiB, {timestamp}")
+                                    + self.stats_values(node))
+        self.nodes[child_id] = node
+        self.tree.insert(child_id, "end")
+        self.lazy_nodes[child_id] = functools.partial(region_file.__getitem__, index)
+        return child_id
+
+    def populate_range(self, parent_id, tag, start, stop):
+        step = 1
+        while stop - start > step * LIST_PAGE_SIZE:
+            step *= LIST_PAGE_SIZE
+        if step == 1:
+            for i in range(start, stop):
+                self.populate_list(parent_id, i, tag[i])
+        else:
+            for lo in range(start, stop, step):
+                self.insert_group(parent_id, tag, lo, min(lo + step, stop))
+
+    def insert_group(self, parent_id, tag, start, stop):
+        group_id = self.tree.insert(parent_id, "end", text=f"[{start}..{stop - 1}]",
+                                    values=("", f"{stop - start} 项"))
+        self.nodes[group_id] = self.nodes[parent_id]
+        self.group_nodes[group_id] = (tag, start, stop)
+        self.tree.insert(group_id, "end")
+        self.lazy_nodes[group_id] = tag
+        return group_id
 
     def populate_list(self, parent_id, index, item):
-        if isinstance(item, Compound):
-            count = len(item)
-            child_id = self.tree.insert(parent_id, "end", text=f"[{index}]", values=("Compound", f"{count} 项"))
-            self.node_paths[child_id] = self.node_paths[parent_id] + [index]
-            self.populate_tree(child_id, item)
-        elif isinstance(item, List):
-            list_type = item.subtype.__name__ if item.subtype else "Unknown"
-            child_id = self.tree.insert(parent_id, "end", text=f"[{index}]",
-                                        values=(f"List[{list_type}]", f"{len(item)} 项"))
-            self.node_paths[child_id] = self.node_paths[parent_id] + [index]
-            for j, subitem in enumerate(item):
-                self.populate_list(child_id, j, subitem)
+        return self.insert_node(parent_id, f"[{index}]", index, item)
+
+    def insert_node(self, parent_id, text, key, tag, index="end"):
+        parent = self.nodes[parent_id]
+        node = core.Node(parent, key, tag, parent.tag)
+        if type(tag) in core.VALUE_RENDERERS:
+            child_id = self.tree.insert(parent_id, index, text=text,
+                                        values=(core.TYPE_NAMES[type(tag)], node.display()) + self.stats_values(node))
+            self.nodes[child_id] = node
+            return child_id
+        if isinstance(tag, COMPOUND_TYPES):
+            values = ("Compound", f"{len(tag)} 项")
+        elif isinstance(tag, LIST_TYPES):
+            list_type = tag.subtype.__name__ if tag.subtype else "Unknown"
+            values = (f"List[{list_type}]", f"{len(tag)} 项")
+        else:
+            values = (self.get_type_name(tag), node.display())
+        child_id = self.tree.insert(parent_id, index, text=text, values=values + self.stats_values(node))
+        self.nodes[child_id] = node
+
+        if isinstance(tag, COMPOUND_TYPES + LIST_TYPES) and len(tag):
+            self.tree.insert(child_id, "end")
+            self.lazy_nodes[child_id] = tag
+        return child_id
+
+    def on_tree_open(self, event):
+        self.expand_node(self.tree.focus())
+
+    def expand_node(self, item):
+        tag = self.lazy_nodes.pop(item, None)
+        if tag is None:
+            return
+        profiler.count("expand_node")
+        if callable(tag):
+            try:
+                tag = tag()
+            except Exception as e:
+                self.lazy_nodes[item] = tag
+                messagebox.showerror("读取区块错误", f"无法读取区块: {str(e)}")
+                return
+            self.nodes[item].tag = tag
+        self.tree.delete(*self.tree.get_children(item))
+        if item in self.group_nodes:
+            self.populate_range(item, *self.group_nodes[item])
         else:
-            value_str = self.get_value_string(item)
-            child_id = self.tree.insert(parent_id, "end", text=f"[{index}]",
-                                        values=(self.get_type_name(item), value_str))
-            self.node_paths[child_id] = self.node_paths[parent_id] + [index]
-            self.node_values[child_id] = item
+            self.populate_tree(item, tag)
+
+    def reload_node(self, item):
+        for child in self.tree.get_children(item):
+            self.forget_subtree(child)
+        self.tree.delete(*self.tree.get_children(item))
+        self.lazy_nodes.pop(item, None)
+        self.refresh_count(item)
 
     def get_type_name(self, tag):
-        if isinstance(tag, Int):
-            return "Int"
-        elif isinstance(tag, String):
-            return "String"
-        elif isinstance(tag, Float):
-            return "Float"
-        elif isinstance(tag, Double):
-            return "Double"
-        elif isinstance(tag, Byte):
-            return "Byte"
-        elif isinstance(tag, Short):
-            return "Short"
-        elif isinstance(tag, Long):
-            return "Long"
-        elif isinstance(tag, ByteArray):
-            return "ByteArray"
-        elif isinstance(tag, IntArray):
-            return "IntArray"
-        elif isinstance(tag, LongArray):
-            return "LongArray"
-        return type(tag).__name__
+        return core.type_name(tag)
 
     def get_value_string(self, tag):
-        if isinstance(tag, (Int, Byte, Short, Long)):
-            return str(tag)
-        elif isinstance(tag, (Float, Double)):
-            return f"{tag:.6f}"
-        elif isinstance(tag, String):
-            return f'"{tag}"'
-        elif isinstance(tag, ByteArray):
-            return f"ByteArray[{len(tag)}]"
-        elif isinstance(tag, IntArray):
-            return f"IntArray[{len(tag)}]"
-        elif isinstance(tag, LongArray):
-            return f"LongArray[{len(tag)}]"
-        return str(tag)
+        return core.value_string(tag)
 
+    @profiler.timed("on_tree_select")
     def on_tree_select(self, event):
         selected_item = self.tree.focus()
         if not selected_item:
@@ -338,40 +934,111 @@ class NBTExplorer:
         self.detail_text.insert(ttk.END, f"名称: {item_text}\n")
         self.detail_text.insert(ttk.END, f"类型: {item_values[0]}\n")
 
-        if len(item_values) > 1 and item_values[1]:
+        value = self.get_leaf_value(selected_item)
+        if value is not None:
+            self.detail_text.insert(ttk.END, f"值: {self.get_value_string(value)}\n")
+        elif len(item_values) > 1 and item_values[1]:
             self.detail_text.insert(ttk.END, f"值: {item_values[1]}\n")
 
         self.detail_text.insert(ttk.END, "\n路径: " + self.get_item_path(selected_item))
 
-        if selected_item in self.node_values:
-            value = self.node_values[selected_item]
-            self.detail_text.insert(ttk.END, f"\n原始值: {value!r}")
+        section = self.section_of(self.nodes.get(selected_item))
+        if section is not None:
+            self.detail_text.insert(ttk.END, "\n\n" + self.format_block_summary(section))
+
+        if isinstance(value, (ByteArray, IntArray, LongArray)):
+            if selected_item != self.array_item:
+                self.array_item = selected_item
+                self.array_page = 0
+            self.detail_text.insert(ttk.END, "\n\n" + self.format_array_page(value, self.array_page))
+            self.array_frame.pack(side="top", fill="x", before=self.detail_scrollbar)
+        else:
+            self.array_item = None
+            self.array_frame.pack_forget()
+            if value is not None:
+                self.detail_text.insert(ttk.END, f"\n原始值: {value!r}")
 
         self.detail_text.config(state="disabled")
 
         self.enable_edit_controls(True)
 
+    def format_array_page(self, value, page):
+        pages = max((len(value) + ARRAY_PAGE_SIZE - 1) // ARRAY_PAGE_SIZE, 1)
+        self.array_page_var.set(f"第 {page + 1}/{pages} 页")
+        start = page * ARRAY_PAGE_SIZE
+        values = value[start:start + ARRAY_PAGE_SIZE].tolist()
+        if self.array_hex_var.get():
+            bits = value.dtype.itemsize * 8
+            mask = (1 << bits) - 1
+            cells = [f"{v & mask:0{bits // 4}x}" for v in values]
+        else:
+            width = max(map(len, map(str, values)), default=0)
+            cells = [f"{v:>{width}}" for v in values]
+        columns = ARRAY_COLUMNS // max(value.dtype.itemsize // 2, 1)
+        offset_width = len(str(len(value)))
+        lines = []
+        for i in range(0, len(cells), columns):
+            lines.append(f"{start + i:>{offset_width}}: " + " ".join(cells[i:i + columns]))
+        return "\n".join(lines)
+
+    def change_array_page(self, delta):
+        if not self.array_item:
+            return
+        value = self.nodes[self.array_item].tag
+        pages = max((len(value) + ARRAY_PAGE_SIZE - 1) // ARRAY_PAGE_SIZE, 1)
+        self.array_page = min(max(self.array_page + delta, 0), pages - 1)
+        self.on_tree_select(None)
+
+    def section_of(self, node):
+        for _ in range(3):
+            if node is None:
+                return None
+            if isinstance(node.tag, COMPOUND_TYPES) and blocks.section_states(node.tag)[0] is not None:
+                return node.tag
+            node = node.parent
+        return None
+
+    def format_block_summary(self, section):
+        try:
+            decoded = blocks.decode_sections([section])[0]
+        except blocks.BlockError as e:
+            return f"方块数据: {str(e)}"
+        lines = [f"方块统计 (Y={decoded.y}, 调色板 {len(decoded.palette)} 项):"]
+        for label, count in decoded.counts().most_common(BLOCK_SUMMARY_SIZE):
+            lines.append(f"  {label}: {count}")
+        return "\n".join(lines)
+
     def get_item_path(self, item):
-        path = []
-        while item:
-            item_text = self.tree.item(item, "text")
-            path.insert(0, item_text)
-            item = self.tree.parent(item)
-        return "/".join(path)
+        return core.format_path(self.nodes[item].path())
+
+    def get_leaf_value(self, item):
+        node = self.nodes.get(item)
+        tag = node.tag if node else None
+        if isinstance(tag, nbtlib.tag.Base) and not isinstance(tag, (Compound, List)):
+            return tag
+        return None
+
+    def node_tag(self, item):
+        node = self.nodes[item]
+        if node.tag is None:
+            node.tag = node.container[node.key]
+        return node.tag
 
     def on_tree_double_click(self, event):
         self.edit_node()
 
     def edit_node(self):
+        if self.busy() or self.read_only():
+            return
         selected_item = self.tree.focus()
-        if not selected_item or selected_item not in self.node_values:
+        if not selected_item or self.get_leaf_value(selected_item) is None:
             return
 
         item_text = self.tree.item(selected_item, "text")
         item_values = self.tree.item(selected_item, "values")
         item_type = item_values[0] if item_values else ""
 
-        original_value = self.node_values[selected_item]
+        original_value = self.nodes[selected_item].tag
         original_value_str = self.get_value_string(original_value)
 
         edit_win = ttk.Toplevel(self.root)
@@ -419,11 +1086,14 @@ class NBTExplorer:
 
                 new_value = self.convert_value(item_type, new_value_str)
 
-                self.tree.item(selected_item, values=(item_type, self.get_value_string(new_value)))
-
-                self.node_values[selected_item] = new_value
-
+                node = self.nodes[selected_item]
+                change = history.Change(node.path(), original_value, new_value)
                 self.update_nbt_value(selected_item, new_value)
+                self.record_change(change)
+
+                self.tree.set(selected_item, "value", node.display())
+                self.refresh_stats(selected_item)
+                self.invalidate_search()
 
                 edit_win.destroy()
                 self.update_status(f"已更新: {item_text} = {new_value_str}")
@@ -434,50 +1104,24 @@ class NBTExplorer:
         ttk.Button(button_frame, text="取消", command=edit_win.destroy, width=10).pack(side="left", padx=10)
 
     def update_nbt_value(self, item_id, new_value):
-
-        path = self.node_paths[item_id]
-
-        current = self.level
-        for key in path[:-1]:
-            if isinstance(current, Compound):
-                current = current[key]
-            elif isinstance(current, List) and isinstance(key, int):
-                current = current[key]
-
-        last_key = path[-1]
-        if isinstance(current, Compound):
-            current[last_key] = new_value
-        elif isinstance(current, List) and isinstance(last_key, int):
-            current[last_key] = new_value
+        node = self.nodes[item_id]
+        core.set_child(node.container, node.key, new_value)
+        node.tag = new_value
+        node.rendered = None
 
     def convert_value(self, type_str, value_str):
-        if type_str == "Int":
-            return Int(int(value_str.split("(")[-1].split(")")[0]))
-        elif type_str == "Float":
-            return Float(float(value_str.split("(")[-1].split(")")[0]))
-        elif type_str == "Double":
-            return Double(float(value_str.split("(")[-1].split(")")[0]))
-        elif type_str == "Byte":
-            return Byte(int(value_str.split("(")[-1].split(")")[0]))
-        elif type_str == "Short":
-            return Short(int(value_str.split("(")[-1].split(")")[0]))
-        elif type_str == "Long":
-            return Long(int(value_str.split("(")[-1].split(")")[0]))
-        elif type_str == "String":
-
-            if value_str.startswith('"') and value_str.endswith('"'):
-                value_str = value_str[1:-1]
-            return String(value_str.split("(")[-1].split(")")[0])
-        return value_str.split("(")[-1].split(")")[0]
+        return core.convert_value(type_str, value_str)
 
     def add_node(self):
+        if self.busy() or self.read_only():
+            return
         selected_item = self.tree.focus()
         if not selected_item:
             messagebox.showwarning("添加节点", "请先选择一个父节点")
             return
 
         item_values = self.tree.item(selected_item, "values")
-        if not item_values or "Compound" not in item_values[0]:
+        if not item_values or item_values[0] not in ("Compound", "Chunk", "File"):
             messagebox.showwarning("添加节点", "只能在Compound节点下添加新节点")
             return
 
@@ -536,27 +1180,14 @@ class NBTExplorer:
                 node_type = type_var.get()
                 value_str = value_var.get().strip()
 
-                if node_type == "String":
-                    new_value = String(value_str)
-                elif node_type == "Int":
-                    new_value = Int(int(value_str))
-                elif node_type == "Float":
-                    new_value = Float(float(value_str))
-                elif node_type == "Double":
-                    new_value = Double(float(value_str))
-                elif node_type == "Byte":
-                    new_value = Byte(int(value_str))
-                elif node_type == "Short":
-                    new_value = Short(int(value_str))
-                elif node_type == "Long":
-                    new_value = Long(int(value_str))
-                elif node_type == "Compound":
-                    new_value = Compound()
-                else:
-                    messagebox.showwarning("添加节点", f"不支持的类型: {node_type}")
-                    return
+                new_value = core.create_value(node_type, value_str)
+                tag = self.node_tag(selected_item)
+                old_value = tag[key] if key in tag else None
                 self.add_to_nbt(selected_item, key, new_value)
-                self.update_tree()
+                self.record_change(history.Change(self.nodes[selected_item].path() + [key], old_value, new_value))
+                self.add_tree_node(selected_item, key, new_value)
+                self.refresh_stats(selected_item)
+                self.invalidate_search()
 
                 add_win.destroy()
                 self.update_status(f"已添加新节点: {key}")
@@ -567,49 +1198,165 @@ class NBTExplorer:
         ttk.Button(button_frame, text="取消", command=add_win.destroy, width=10).pack(side="left", padx=10)
 
     def add_to_nbt(self, parent_id, key, value):
-        parent_path = self.node_paths[parent_id]
+        core.add_child(self.node_tag(parent_id), key, value)
 
-        current = self.level
-        for key in parent_path:
-            if isinstance(current, Compound):
-                current = current[key]
-            elif isinstance(current, List) and isinstance(key, int):
-                current = current[key]
-
-        if isinstance(current, Compound):
-            current[key] = value
+    def add_tree_node(self, parent_id, key, value, index="end"):
+        if parent_id in self.lazy_nodes or not self.tree.get_children(parent_id):
+            self.refresh_count(parent_id)
+            return
+        self.refresh_count(parent_id)
+
+        child = self.find_child(parent_id, key)
+        if child:
+            return self.replace_tree_node(child, value)
+        return self.insert_node(parent_id, key, key, value, index)
+
+    def replace_tree_node(self, item, value):
+        parent_id = self.tree.parent(item)
+        index = self.tree.index(item)
+        text = self.tree.item(item, "text")
+        key = self.nodes[item].key
+        self.forget_subtree(item)
+        self.tree.delete(item)
+        return self.insert_node(parent_id, text, key, value, index)
+
+    def refresh_count(self, item):
+        tag = self.node_tag(item)
+        if not len(tag):
+            self.lazy_nodes.pop(item, None)
+            self.tree.delete(*self.tree.get_children(item))
+        elif not self.tree.get_children(item):
+            self.tree.insert(item, "end")
+            self.lazy_nodes[item] = tag
+            if self.tree.item(item, "open"):
+                self.expand_node(item)
+        self.tree.set(item, "value", f"{len(tag)} 项")
+
+    def forget_subtree(self, item):
+        for child in self.tree.get_children(item):
+            self.forget_subtree(child)
+        self.nodes.pop(item, None)
+        self.lazy_nodes.pop(item, None)
+        self.group_nodes.pop(item, None)
 
     def delete_node(self):
+        if self.busy() or self.read_only():
+            return
         selected_item = self.tree.focus()
-        if not selected_item:
+        node = self.nodes.get(selected_item)
+        if not selected_item or selected_item in self.group_nodes or node is None or node.parent is None:
+            return
+
+        if isinstance(node.container, (region.RegionFile, world.WorldFolder)):
+            messagebox.showwarning("删除节点", "不能删除区块或文件")
             return
 
         if not messagebox.askyesno("删除节点", "确定要删除选中的节点吗？"):
             return
-        self.delete_from_nbt(selected_item)
-        self.update_tree()
+        try:
+            change = history.Change(node.path(), node.tag, None, core.child_index(node.container, node.key))
+            self.delete_from_nbt(selected_item)
+        except Exception as e:
+            messagebox.showerror("删除节点错误", f"无法删除节点: {str(e)}")
+            return
+        parent_id = self.tree.parent(selected_item)
+        self.record_change(change)
+        self.delete_tree_node(selected_item)
+        self.refresh_stats(parent_id)
         self.update_status("节点已删除")
 
     def delete_from_nbt(self, item_id):
-        path = self.node_paths[item_id]
-        current = self.level
-        parent = None
-        last_key = None
-
-        for key in path[:-1]:
-            parent = current
-            if isinstance(current, Compound):
-                current = current[key]
-            elif isinstance(current, List) and isinstance(key, int):
-                current = current[key]
-
-        last_key = path[-1]
-
-        if parent is not None:
-            if isinstance(parent, Compound):
-                del parent[last_key]
-            elif isinstance(parent, List) and isinstance(last_key, int):
-                del parent[last_key]
+        node = self.nodes[item_id]
+        core.delete_child(node.container, node.key)
+
+    def delete_tree_node(self, item):
+        parent_id = self.tree.parent(item)
+        node = self.nodes[item]
+        if parent_id in self.group_nodes:
+            while parent_id in self.group_nodes:
+                parent_id = self.tree.parent(parent_id)
+            self.reload_node(parent_id)
+            self.invalidate_search()
+            if node.key < len(node.container):
+                self.tree.see(self.reveal_path(node.path()))
+            return
+
+        self.forget_subtree(item)
+        self.tree.delete(item)
+        self.invalidate_search()
+
+        if isinstance(node.key, int):
+            for sibling in self.tree.get_children(parent_id):
+                sibling_node = self.nodes[sibling]
+                if sibling_node.key > node.key:
+                    sibling_node.key -= 1
+                    self.tree.item(sibling, text=f"[{sibling_node.key}]")
+        self.refresh_count(parent_id)
+
+    def record_change(self, change):
+        self.history.record(change)
+        core.mark_dirty(self.level, change.path)
+        self.update_analysis(change)
+        self.mark_modified()
+        self.update_history_controls()
+
+    def undo(self):
+        if self.busy() or self.read_only():
+            return
+        self.apply_change(self.history.undo(), "已撤销")
+
+    def redo(self):
+        if self.busy() or self.read_only():
+            return
+        self.apply_change(self.history.redo(), "已重做")
+
+    def apply_change(self, change, message):
+        if change is None:
+            return
+        try:
+            parent_id = self.reveal_path(change.path[:-1])
+            self.expand_node(parent_id)
+            history.apply(self.level, change)
+            self.update_analysis(change)
+            self.mark_modified()
+        except Exception as e:
+            self.history.clear()
+            self.update_history_controls()
+            messagebox.showerror("撤销错误", f"无法应用修改: {str(e)}")
+            return
+
+        key = change.path[-1]
+        if change.new is None:
+            self.delete_tree_node(self.find_child(parent_id, key))
+            item = parent_id
+        elif change.old is None and isinstance(key, int):
+            self.reload_node(parent_id)
+            item = self.reveal_path(change.path)
+        elif change.old is None:
+            index = "end" if change.index is None else change.index
+            item = self.add_tree_node(parent_id, key, change.new, index) or parent_id
+        else:
+            item = self.replace_tree_node(self.find_child(parent_id, key), change.new)
+        self.refresh_stats(item)
+        self.invalidate_search()
+        self.update_history_controls()
+
+        self.tree.selection_set(item)
+        self.tree.focus(item)
+        self.tree.see(item)
+        self.update_status(f"{message}: {core.format_path(change.path)}")
+
+    def mark_modified(self):
+        self.revision += 1
+        if self.file_path:
+            self.parse_cache.discard(self.file_path)
+        if not self.modified:
+            self.modified = True
+            self.update_tab_title()
+
+    def update_history_controls(self):
+        self.menu_edit.entryconfig("撤销(U)", state=ttk.NORMAL if self.history.undo_stack else ttk.DISABLED)
+        self.menu_edit.entryconfig("重做(R)", state=ttk.NORMAL if self.history.redo_stack else ttk.DISABLED)
 
     def find_next(self):
         self.search_nodes(forward=True)
@@ -617,18 +1364,48 @@ class NBTExplorer:
     def find_prev(self):
         self.search_nodes(forward=False)
 
+    @profiler.timed("search_nodes")
     def search_nodes(self, forward=True):
         search_text = self.search_entry.get().strip()
         if not search_text:
             messagebox.showwarning("查找", "请输入查找内容")
             return
-        if not self.search_results or search_text != self.last_search_text:
+        if self.level is None or self.busy():
+            return
+
+        options = (search_text, self.case_sensitive_var.get(), self.regex_var.get(), self.query_var.get())
+        if options != self.last_search:
+            if options[3]:
+                try:
+                    self.search_iter = query.compile(search_text).paths(self.root_tag())
+                except query.QueryError as e:
+                    messagebox.showerror("查找", str(e))
+                    return
+            else:
+                try:
+                    matcher = search.compile_matcher(*options[:3])
+                except re.error as e:
+                    messagebox.showerror("查找", f"正则表达式错误: {str(e)}")
+                    return
+                if self.search_index is None:
+                    root_tag = self.root_tag()
+                    self.search_index = search.SearchIndex(root_tag, self.get_value_string)
+                self.search_iter = self.search_index.search(matcher)
             self.search_results = []
+            self.search_done = False
             self.current_search_index = -1
-            self.last_search_text = search_text
-            for item in self.tree.get_children():
-                self.search_tree(item, search_text)
+            self.last_search = options
+
+        if self.search_done:
+            self.show_search_result(forward)
+        elif forward and self.current_search_index + 1 >= len(self.search_results):
+            self.fetch_search_results(forward, 1)
+        elif not forward and self.current_search_index <= 0:
+            self.fetch_search_results(forward)
+        else:
+            self.show_search_result(forward)
 
+    def show_search_result(self, forward):
         if not self.search_results:
             self.update_status("未找到匹配项")
             return
@@ -636,76 +1413,1064 @@ class NBTExplorer:
             self.current_search_index = (self.current_search_index + 1) % len(self.search_results)
         else:
             self.current_search_index = (self.current_search_index - 1) % len(self.search_results)
-        item = self.search_results[self.current_search_index]
+        reveal = self.reveal_nearest if self.last_search[3] else self.reveal_path
+        item = reveal(self.search_results[self.current_search_index])
         self.tree.selection_set(item)
         self.tree.focus(item)
         self.tree.see(item)
-        self.update_status(f"找到 {len(self.search_results)} 个匹配项，当前显示第 {self.current_search_index + 1} 个")
-
-    def search_tree(self, item, search_text):
-        item_text = self.tree.item(item, "text")
-        item_values = self.tree.item(item, "values")
-        match = False
-        case_sensitive = self.case_sensitive_var.get()
-        use_regex = self.regex_var.get()
-        if use_regex:
-            try:
-                pattern = re.compile(search_text) if case_sensitive else re.compile(search_text, re.IGNORECASE)
-                if pattern.search(item_text):
-                    match = True
-            except Exception as e:
-                print(e)
+        if self.search_done:
+            self.update_status(f"找到 {len(self.search_results)} 个匹配项，当前显示第 {self.current_search_index + 1} 个")
         else:
-            if case_sensitive:
-                if search_text in item_text:
-                    match = True
-            else:
-                if search_text.lower() in item_text.lower():
-                    match = True
-        if not match and len(item_values) > 1 and item_values[1]:
-            value_str = item_values[1]
-            if use_regex:
-                try:
-                    pattern = re.compile(search_text) if case_sensitive else re.compile(search_text, re.IGNORECASE)
-                    if pattern.search(value_str):
-                        match = True
-                except:
-                    pass
+            self.update_status(f"当前显示第 {self.current_search_index + 1} 个匹配项")
+
+    def fetch_search_results(self, forward, count=None):
+        document = self.document
+        iterator = self.search_iter
+
+        def run(task):
+            paths = []
+            for path in iterator:
+                paths.append(path)
+                if count is not None and len(paths) >= count:
+                    return paths, False
+            return paths, True
+
+        def on_done(result):
+            paths, done = result
+            document.search_results.extend(paths)
+            document.search_done = done
+            profiler.count("search_results", len(paths))
+            if document is self.document:
+                self.show_search_result(forward)
+
+        def on_error(e):
+            self.invalidate_search(document)
+            if isinstance(e, worker.Cancelled):
+                self.update_status("已取消查找")
             else:
-                if case_sensitive:
-                    if search_text in value_str:
-                        match = True
-                else:
-                    if search_text.lower() in value_str.lower():
-                        match = True
-
-        if match:
-            self.search_results.append(item)
-
+                messagebox.showerror("查找", f"查找失败: {str(e)}")
+
+        self.run_task("正在查找...", run, on_done, on_error, interval=20)
+
+    def invalidate_search(self, document=None):
+        document = document or self.document
+        document.search_index = None
+        document.search_results = []
+        document.search_iter = None
+        document.last_search = None
+
+    def reveal_path(self, path):
+        item = self.tree.get_children("")[0]
+        for key in path:
+            self.expand_node(item)
+            self.tree.item(item, open=True)
+            item = self.find_child(item, key)
+        return item
+
+    def reveal_nearest(self, path):
+        item = self.tree.get_children("")[0]
+        for key in path:
+            self.expand_node(item)
+            self.tree.item(item, open=True)
+            child = self.find_child(item, key)
+            if child is None:
+                break
+            item = child
+        return item
+
+    def find_child(self, item, key):
         for child in self.tree.get_children(item):
-            self.search_tree(child, search_text)
+            if child in self.group_nodes:
+                start, stop = self.group_nodes[child][1:]
+                if start <= key < stop:
+                    self.expand_node(child)
+                    self.tree.item(child, open=True)
+                    return self.find_child(child, key)
+            elif self.nodes[child].key == key:
+                return child
 
     def refresh_view(self):
         if self.file_path:
-            self.open_file(self.file_path)
-            self.update_status("视图已刷新")
+            self.open_file(self.file_path, "视图已刷新")
 
     def update_status(self, message):
         self.status_var.set(message)
 
     def enable_edit_controls(self, enabled):
-        state = ttk.NORMAL if enabled else ttk.DISABLED
+        export_state = ttk.NORMAL if enabled else ttk.DISABLED
+        state = ttk.NORMAL if enabled and not self.read_only_document() else ttk.DISABLED
         self.menu_file.entryconfig("保存(S)", state=state)
         self.menu_file.entryconfig("另存为(A)", state=state)
         self.menu_edit.entryconfig("编辑节点(E)", state=state)
         self.menu_edit.entryconfig("添加节点(A)", state=state)
         self.menu_edit.entryconfig("删除节点(D)", state=state)
+        self.menu_edit.entryconfig("导出为SNBT/JSON(X)...", state=export_state)
+        self.menu_edit.entryconfig("从SNBT/JSON导入(I)...", state=state)
+        for label in ("编辑节点", "添加节点", "删除节点", "从SNBT/JSON导入..."):
+            self.tree_menu.entryconfig(label, state=state)
 
         self.btn_save.config(state=state)
         self.btn_edit.config(state=state)
         self.btn_add.config(state=state)
         self.btn_delete.config(state=state)
 
+    def open_bulk_search(self):
+        bulk_win = ttk.Toplevel(self.root)
+        bulk_win.title("在文件中查找/替换")
+        bulk_win.geometry("800x500")
+        bulk_win.transient(self.root)
+
+        form_frame = ttk.Frame(bulk_win)
+        form_frame.pack(fill="x", padx=10, pady=5)
+        form_frame.columnconfigure(1, weight=1)
+
+        ttk.Label(form_frame, text="查找:").grid(row=0, column=0, sticky="w")
+        pattern_var = ttk.StringVar(value=self.search_entry.get().strip())
+        ttk.Entry(form_frame, textvariable=pattern_var).grid(row=0, column=1, sticky="ew", padx=5, pady=2)
+
+        ttk.Label(form_frame, text="替换为:").grid(row=1, column=0, sticky="w")
+        replace_var = ttk.StringVar()
+        ttk.Entry(form_frame, textvariable=replace_var).grid(row=1, column=1, sticky="ew", padx=5, pady=2)
+
+        ttk.Label(form_frame, text="位置:").grid(row=2, column=0, sticky="w")
+        default_path = self.file_path if os.path.isdir(self.file_path) else os.path.dirname(self.file_path)
+        path_var = ttk.StringVar(value=default_path)
+        ttk.Entry(form_frame, textvariable=path_var).grid(row=2, column=1, sticky="ew", padx=5, pady=2)
+
+        def browse():
+            folder_path = filedialog.askdirectory(parent=bulk_win)
+            if folder_path:
+                path_var.set(folder_path)
+
+        ttk.Button(form_frame, text="浏览", command=browse).grid(row=2, column=2, padx=2)
+
+        option_frame = ttk.Frame(bulk_win)
+        option_frame.pack(fill="x", padx=10)
+        ttk.Checkbutton(option_frame, text="区分大小写", variable=self.case_sensitive_var).pack(side="left", padx=2)
+        ttk.Checkbutton(option_frame, text="正则表达式", variable=self.regex_var).pack(side="left", padx=2)
+        dry_run_var = ttk.BooleanVar(value=True)
+        ttk.Checkbutton(option_frame, text="仅预览", variable=dry_run_var).pack(side="left", padx=2)
+
+        button_frame = ttk.Frame(bulk_win)
+        button_frame.pack(fill="x", padx=10, pady=5)
+        status_var = ttk.StringVar()
+        ttk.Label(bulk_win, textvariable=status_var, relief="sunken", anchor="w").pack(side="bottom", fill="x")
+
+        results = ttk.Treeview(bulk_win, columns=("path", "value", "new_value"), selectmode="browse")
+        results_scrollbar = ttk.Scrollbar(bulk_win, command=results.yview)
+        results.config(yscrollcommand=results_scrollbar.set)
+        results.heading("#0", text="文件")
+        results.heading("path", text="路径")
+        results.heading("value", text="值")
+        results.heading("new_value", text="替换后")
+        results_scrollbar.pack(side="right", fill="y")
+        results.pack(fill="both", expand=True, padx=(10, 0), pady=5)
+
+        state = {"task": None}
+
+        def start(replace):
+            pattern = pattern_var.get().strip()
+            if not pattern:
+                messagebox.showwarning("查找", "请输入查找内容", parent=bulk_win)
+                return
+            if state["task"]:
+                return
+            try:
+                bulk.compile_replacer(pattern, "", self.case_sensitive_var.get(), self.regex_var.get())
+            except re.error as e:
+                messagebox.showerror("查找", f"正则表达式错误: {str(e)}", parent=bulk_win)
+                return
+            dry_run = dry_run_var.get()
+            if replace and not dry_run and not messagebox.askyesno(
+                    "替换", "将直接修改所有匹配的文件，确定继续吗？", parent=bulk_win):
+                return
+
+            options = {
+                "pattern": pattern,
+                "case_sensitive": self.case_sensitive_var.get(),
+                "use_regex": self.regex_var.get(),
+                "replacement": replace_var.get() if replace else None,
+                "dry_run": dry_run,
+            }
+            counts = {"files": 0, "hits": 0, "errors": 0, "total": 0}
+            results.delete(*results.get_children())
+
+            def run(task):
+                files = bulk.collect_files([path_var.get()])
+                counts["total"] = len(files)
+                for result in bulk.run(files, task, **options):
+                    task.emit(result)
+
+            def on_item(result):
+                if not bulk_win.winfo_exists():
+                    return
+                file_path, hits, error = result
+                counts["files"] += 1
+                if error:
+                    counts["errors"] += 1
+                    results.insert("", "end", text=file_path, values=("", error, ""))
+                for path, value, new_value in hits:
+                    results.insert("", "end", text=file_path, values=(path, value, new_value or ""))
+                counts["hits"] += len(hits)
+                status_var.set(f"已处理 {counts['files']}/{counts['total']} 个文件，"
+                               f"{counts['hits']} 个匹配项，{counts['errors']} 个错误")
+
+            def finish(message):
+                def callback(result):
+                    state["task"] = None
+                    if bulk_win.winfo_exists():
+                        status_var.set(f"{message}: 已处理 {counts['files']} 个文件，"
+                                       f"{counts['hits']} 个匹配项，{counts['errors']} 个错误")
+                return callback
+
+            state["task"] = worker.BackgroundTask(self.root, run, finish("完成"), finish("已停止"),
+                                                  on_item=on_item).start()
+            status_var.set("正在搜索...")
+
+        def stop():
+            if state["task"]:
+                state["task"].cancel()
+
+        def open_result(event):
+            item = results.focus()
+            if item:
+                self.open_file(results.item(item, "text"))
+
+        def close():
+            stop()
+            bulk_win.destroy()
+
+        ttk.Button(button_frame, text="查找", command=lambda: start(False), width=10).pack(side="left", padx=2)
+        ttk.Button(button_frame, text="替换", command=lambda: start(True), width=10).pack(side="left", padx=2)
+        ttk.Button(button_frame, text="停止", command=stop, width=10).pack(side="left", padx=2)
+        results.bind("<Double-1>", open_result)
+        bulk_win.protocol("WM_DELETE_WINDOW", close)
+
+    def open_catalog(self):
+        catalog_win = ttk.Toplevel(self.root)
+        catalog_win.title("世界索引")
+        catalog_win.geometry("900x550")
+
+        form_frame = ttk.Frame(catalog_win)
+        form_frame.pack(fill="x", padx=10, pady=5)
+        form_frame.columnconfigure(1, weight=1)
+
+        ttk.Label(form_frame, text="位置:").grid(row=0, column=0, sticky="w")
+        default_path = self.file_path if not self.file_path or os.path.isdir(self.file_path) \
+            else os.path.dirname(self.file_path)
+        path_var = ttk.StringVar(value=default_path)
+        ttk.Entry(form_frame, textvariable=path_var).grid(row=0, column=1, sticky="ew", padx=5, pady=2)
+
+        def browse():
+            folder_path = filedialog.askdirectory(parent=catalog_win)
+            if folder_path:
+                path_var.set(folder_path)
+
+        ttk.Button(form_frame, text="浏览", command=browse).grid(row=0, column=2, padx=2)
+        update_btn = ttk.Button(form_frame, text="更新索引", command=lambda: update())
+        update_btn.grid(row=0, column=3, padx=2)
+
+        ttk.Label(form_frame, text="查找:").grid(row=1, column=0, sticky="w")
+        query_frame = ttk.Frame(form_frame)
+        query_frame.grid(row=1, column=1, columnspan=3, sticky="ew")
+        kind_var = ttk.StringVar(value=catalog.KIND_LABELS[catalog.ITEM])
+        ttk.Combobox(query_frame, textvariable=kind_var, values=list(catalog.KIND_LABELS.values()),
+                     state="readonly", width=8).pack(side="left", padx=5, pady=2)
+        value_var = ttk.StringVar(value=self.search_entry.get().strip())
+        value_entry = ttk.Entry(query_frame, textvariable=value_var)
+        value_entry.pack(side="left", fill="x", expand=True, padx=5)
+        ttk.Label(query_frame, text="位于:").pack(side="left")
+        container_var = ttk.StringVar()
+        ttk.Entry(query_frame, textvariable=container_var, width=24).pack(side="left", padx=5)
+        ttk.Button(query_frame, text="查询", command=lambda: query(), width=8).pack(side="left", padx=2)
+
+        status_var = ttk.StringVar()
+        ttk.Label(catalog_win, textvariable=status_var, relief="sunken", anchor="w").pack(side="bottom", fill="x")
+
+        results = ttk.Treeview(catalog_win, columns=("location", "path", "value", "position"), selectmode="browse")
+        results_scrollbar = ttk.Scrollbar(catalog_win, command=results.yview)
+        results.config(yscrollcommand=results_scrollbar.set)
+        results.heading("#0", text="文件")
+        results.heading("location", text="区块")
+        results.heading("path", text="路径")
+        results.heading("value", text="值")
+        results.heading("position", text="坐标")
+        results.column("#0", width=200)
+        results.column("location", width=100)
+        results.column("path", width=260)
+        results.column("value", width=200)
+        results.column("position", width=120)
+        results_scrollbar.pack(side="right", fill="y")
+        results.pack(fill="both", expand=True, padx=(10, 0), pady=5)
+
+        state = {"task": None}
+        locations = {}
+
+        def update():
+            roots = [path_var.get().strip()]
+            if state["task"] or not roots[0]:
+                return
+            counts = {"files": 0, "units": 0, "errors": 0}
+
+            def run(task):
+                with catalog.Catalog() as index:
+                    for result in index.update(roots, task):
+                        task.emit(result)
+                    return index.stats()
+
+            def on_item(result):
+                file_path, count, failed, error = result
+                counts["files"] += 1
+                counts["units"] += count
+                counts["errors"] += failed + (1 if error else 0)
+                if catalog_win.winfo_exists():
+                    status_var.set(f"正在更新索引: 已处理 {counts['files']} 个文件，{counts['units']} 个区块或文件")
+
+            def finish(result):
+                state["task"] = None
+                if not catalog_win.winfo_exists():
+                    return
+                update_btn.config(state="normal")
+                if isinstance(result, Exception) and not isinstance(result, worker.Cancelled):
+                    status_var.set(f"更新索引失败: {str(result)}")
+                    return
+                text = "索引已更新" if isinstance(result, dict) else "已停止"
+                text += f": 更新了 {counts['files']} 个文件，{counts['units']} 个区块或文件"
+                if counts["errors"]:
+                    text += f"，{counts['errors']} 个错误"
+                if isinstance(result, dict):
+                    text += f"；索引中共有 {result['files']} 个文件，{result['records']} 条记录"
+                status_var.set(text)
+
+            update_btn.config(state="disabled")
+            status_var.set("正在检查文件...")
+            state["task"] = worker.BackgroundTask(self.root, run, finish, finish, on_item=on_item).start()
+
+        def query():
+            value = value_var.get().strip()
+            if not value:
+                messagebox.showwarning("世界索引", "请输入要查找的ID或键路径", parent=catalog_win)
+                return
+            kind = next(name for name, label in catalog.KIND_LABELS.items() if label == kind_var.get())
+            roots = [path_var.get().strip()] if path_var.get().strip() else None
+            results.delete(*results.get_children())
+            locations.clear()
+            started = time.perf_counter()
+            try:
+                with catalog.Catalog() as index:
+                    if kind == catalog.KEY_PATH:
+                        rows = [(file_path, chunk, path, f"{type_} × {count}", None, None, None)
+                                for file_path, chunk, path, type_, count in index.find_paths(value, roots)]
+                    else:
+                        rows = [(file_path, chunk, path, record + (f" (位于 {owner})" if owner else ""), x, y, z)
+                                for file_path, chunk, path, kind, record, owner, x, y, z in
+                                index.find(kind, value, container_var.get().strip(), roots)]
+            except Exception as e:
+                messagebox.showerror("世界索引", f"查询失败: {str(e)}", parent=catalog_win)
+                return
+            for file_path, chunk, path, record, x, y, z in rows:
+                item = results.insert("", "end", text=os.path.basename(file_path), values=(
+                    catalog.chunk_label(file_path, chunk), path, record, catalog.format_position(x, y, z)))
+                locations[item] = (file_path, catalog.location_path(chunk, path))
+            message = f"找到 {len(rows)} 条结果，用时 {(time.perf_counter() - started) * 1000:.1f} ms"
+            if len(rows) >= catalog.QUERY_LIMIT:
+                message += f"，只显示前 {catalog.QUERY_LIMIT} 条"
+            status_var.set(message)
+
+        def open_result(event):
+            location = locations.get(results.focus())
+            if location is None:
+                return
+            file_path, path = location
+
+            def reveal():
+                item = self.reveal_nearest(path)
+                self.tree.selection_set(item)
+                self.tree.focus(item)
+                self.tree.see(item)
+
+            self.open_file(file_path, on_open=reveal)
+
+        def close():
+            if state["task"]:
+                state["task"].cancel()
+            catalog_win.destroy()
+
+        value_entry.bind("<Return>", lambda e: query())
+        results.bind("<Double-1>", open_result)
+        catalog_win.protocol("WM_DELETE_WINDOW", close)
+
+    def root_tag(self):
+        return self.level.root if hasattr(self.level, 'root') else self.level
+
+    def analyze_tree(self, on_finish=None):
+        if self.level is None:
+            return
+        if self.task:
+            self.update_status("正在处理其他文件，请稍候")
+            return
+        level = self.root_tag()
+        started = time.perf_counter()
+
+        def on_done(stats):
+            self.enable_edit_controls(True)
+            if level is not self.root_tag():
+                return
+            self.analysis = stats
+            self.stats_sort = None
+            self.tree.config(displaycolumns=("type", "value") + tuple(STATS_COLUMNS))
+            self.fill_stats("")
+            message = f"分析完成: {stats.count} 个标签, {analyzer.format_size(stats.size)}, 最大深度 {stats.depth}"
+            self.update_status(self.timed_message("analyze", message, started))
+            if on_finish:
+                on_finish()
+
+        def on_error(e):
+            self.enable_edit_controls(True)
+            if isinstance(e, worker.Cancelled):
+                self.update_status("已取消分析")
+            else:
+                messagebox.showerror("分析错误", f"无法分析: {str(e)}")
+
+        self.enable_edit_controls(False)
+        self.run_task("正在分析子树...", lambda task: analyzer.measure(level, task), on_done, on_error)
+
+    def update_analysis(self, change):
+        if self.analysis is not None:
+            analyzer.update(self.analysis, change.path, change.old, change.new)
+
+    def node_stats(self, node):
+        stats = analyzer.lookup(self.analysis, node.path())
+        if stats is not None:
+            return stats.size, stats.count, stats.depth
+        if node.tag is not None and analyzer.container_items(node.tag) is None:
+            return analyzer.leaf_size(node.tag), 1, 0
+        return None
+
+    def stats_values(self, node):
+        if self.analysis is None:
+            return ()
+        stats = self.node_stats(node)
+        if stats is None:
+            return "", "", ""
+        size, count, depth = stats
+        return analyzer.format_size(size), count, depth
+
+    def set_stats(self, item):
+        values = self.tree.item(item, "values")[:2]
+        self.tree.item(item, values=tuple(values) + self.stats_values(self.nodes[item]))
+
+    def fill_stats(self, parent_id):
+        pending = list(self.tree.get_children(parent_id))
+        while pending:
+            item = pending.pop()
+            if item in self.nodes and item not in self.group_nodes:
+                self.set_stats(item)
+            pending.extend(self.tree.get_children(item))
+
+    def refresh_stats(self, item):
+        if self.analysis is None:
+            return
+        while item:
+            if item in self.nodes and item not in self.group_nodes:
+                self.set_stats(item)
+            item = self.tree.parent(item)
+
+    def sort_by_stats(self, column):
+        if self.analysis is None:
+            return
+        descending = self.stats_sort != (column, True)
+        self.stats_sort = (column, descending)
+        position = ("size", "count", "depth").index(column)
+        for name, label in STATS_COLUMNS.items():
+            arrow = (" ▼" if descending else " ▲") if name == column else ""
+            self.tree.heading(name, text=label + arrow)
+
+        def sort_key(item):
+            node = self.nodes.get(item)
+            stats = self.node_stats(node) if node is not None and item not in self.group_nodes else None
+            return -1 if stats is None else stats[position]
+
+        pending = [""]
+        while pending:
+            parent_id = pending.pop()
+            children = self.tree.get_children(parent_id)
+            if parent_id in self.lazy_nodes:
+                continue
+            pending.extend(children)
+            if len(children) > 1:
+                for index, item in enumerate(sorted(children, key=sort_key, reverse=descending)):
+                    self.tree.move(item, parent_id, index)
+
+    def open_top_subtrees(self):
+        if self.level is None:
+            return
+        if self.analysis is None:
+            self.analyze_tree(self.open_top_subtrees)
+            return
+
+        top_win = ttk.Toplevel(self.root)
+        top_win.title("最大的子树")
+        top_win.geometry("700x450")
+        top_win.transient(self.root)
+
+        control_frame = ttk.Frame(top_win)
+        control_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Label(control_frame, text="排序:").pack(side="left")
+        order_var = ttk.StringVar(value=STATS_COLUMNS["size"])
+        order_menu = ttk.Combobox(control_frame, textvariable=order_var, values=list(STATS_COLUMNS.values()),
+                                  state="readonly", width=8)
+        order_menu.pack(side="left", padx=5)
+        ttk.Label(control_frame, text="数量:").pack(side="left")
+        limit_var = ttk.IntVar(value=100)
+        ttk.Spinbox(control_frame, textvariable=limit_var, from_=10, to=10000, increment=10,
+                    width=8).pack(side="left", padx=5)
+
+        table = ttk.Treeview(top_win, columns=("path",) + tuple(STATS_COLUMNS), show="headings", selectmode="browse")
+        table_scrollbar = ttk.Scrollbar(top_win, command=table.yview)
+        table.config(yscrollcommand=table_scrollbar.set)
+        table.heading("path", text="路径")
+        table.column("path", width=380)
+        for column, label in STATS_COLUMNS.items():
+            table.heading(column, text=label)
+            table.column(column, width=80, anchor="e")
+        table_scrollbar.pack(side="right", fill="y")
+        table.pack(fill="both", expand=True, padx=(10, 0), pady=5)
+        paths = {}
+
+        def refresh():
+            table.delete(*table.get_children())
+            paths.clear()
+            if self.analysis is None:
+                return
+            try:
+                limit = max(limit_var.get(), 1)
+            except Exception:
+                messagebox.showerror("最大的子树", "数量必须是整数", parent=top_win)
+                return
+            key = next(name for name, label in STATS_COLUMNS.items() if label == order_var.get())
+            for stats, path in analyzer.top(self.analysis, limit, key):
+                row = table.insert("", "end", values=(core.format_path(path) or "(根)",
+                                                      analyzer.format_size(stats.size), stats.count, stats.depth))
+                paths[row] = path
+
+        def open_result(event):
+            path = paths.get(table.focus())
+            if path is None or self.analysis is None:
+                return
+            item = self.reveal_path(path)
+            if item:
+                self.tree.selection_set(item)
+                self.tree.focus(item)
+                self.tree.see(item)
+
+        ttk.Button(control_frame, text="刷新", command=refresh, width=8).pack(side="left", padx=5)
+        order_var.trace("w", lambda *args: refresh())
+        table.bind("<Double-1>", open_result)
+        refresh()
+
+    def open_map(self):
+        if not isinstance(self.level, (region.RegionFile, world.WorldFolder)):
+            messagebox.showwarning("地图预览", "请先打开区域文件或世界文件夹")
+            return
+        dimensions = maps.map_regions(self.level, self.file_path)
+        if not any(dimensions.values()):
+            messagebox.showwarning("地图预览", "没有找到区域文件")
+            return
+
+        document = self.document
+        map_win = ttk.Toplevel(self.root)
+        map_win.title(f"地图预览: {os.path.basename(self.file_path)}")
+        map_win.geometry("900x700")
+
+        control_frame = ttk.Frame(map_win)
+        control_frame.pack(fill="x", padx=10, pady=5)
+        dimension_var = ttk.StringVar(value=next(name for name, paths in dimensions.items() if paths))
+        if isinstance(self.level, world.WorldFolder):
+            ttk.Label(control_frame, text="维度:").pack(side="left")
+            ttk.Combobox(control_frame, textvariable=dimension_var, values=list(dimensions), state="readonly",
+                         width=16).pack(side="left", padx=5)
+        ttk.Label(control_frame, text="缩放:").pack(side="left")
+        count = len(dimensions[dimension_var.get()])
+        scale_var = ttk.StringVar(value=next(label for label, scale in MAP_SCALES.items()
+                                             if count <= 4 * scale * scale or scale == 8))
+        ttk.Combobox(control_frame, textvariable=scale_var, values=list(MAP_SCALES), state="readonly",
+                     width=6).pack(side="left", padx=5)
+        position_var = ttk.StringVar()
+        ttk.Label(control_frame, textvariable=position_var).pack(side="right")
+
+        canvas_frame = ttk.Frame(map_win)
+        canvas_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        canvas = ttk.Canvas(canvas_frame, background="black", highlightthickness=0, cursor="crosshair")
+        x_scrollbar = ttk.Scrollbar(canvas_frame, orient="horizontal", command=canvas.xview)
+        y_scrollbar = ttk.Scrollbar(canvas_frame, command=canvas.yview)
+        canvas.config(xscrollcommand=x_scrollbar.set, yscrollcommand=y_scrollbar.set)
+        x_scrollbar.pack(side="bottom", fill="x")
+        y_scrollbar.pack(side="right", fill="y")
+        canvas.pack(fill="both", expand=True)
+
+        tiles = {}
+        images = {}
+        regions = {}
+        bounds = [0, 0]
+        state = {"task": None, "done": 0, "failed": 0}
+
+        def scale():
+            return MAP_SCALES[scale_var.get()]
+
+        def draw(path):
+            image = ttk.PhotoImage(file=tiles[path])
+            if scale() > 1:
+                image = image.subsample(scale())
+            images[path] = image
+            x, z = maps.tile_origin(path)
+            canvas.create_image((x - bounds[0]) // scale(), (z - bounds[1]) // scale(), image=image, anchor="nw")
+
+        def redraw():
+            canvas.delete("all")
+            images.clear()
+            width = (max(x for x, z in regions) + 1) * maps.TILE_SIZE - bounds[0]
+            height = (max(z for x, z in regions) + 1) * maps.TILE_SIZE - bounds[1]
+            canvas.config(scrollregion=(0, 0, width // scale(), height // scale()))
+            for path in tiles:
+                draw(path)
+
+        def on_item(result):
+            path, tile, error = result
+            if error:
+                state["failed"] += 1
+            else:
+                tiles[path] = tile
+                draw(path)
+            state["done"] += 1
+            self.update_status(f"正在绘制地图: {state['done']}/{len(regions)}")
+
+        def on_done(result):
+            state["task"] = None
+            message = f"地图绘制完成: {len(tiles)} 个区域"
+            if state["failed"]:
+                message += f"，{state['failed']} 个失败"
+            self.update_status(message)
+
+        def on_error(e):
+            state["task"] = None
+            if not isinstance(e, worker.Cancelled):
+                self.update_status(f"绘制地图失败: {str(e)}")
+
+        def load_dimension(*args):
+            if state["task"]:
+                state["task"].cancel()
+            paths = dimensions[dimension_var.get()]
+            tiles.clear()
+            regions.clear()
+            regions.update({region.parse_region_name(path): path for path in paths})
+            if not regions:
+                canvas.delete("all")
+                return
+            bounds[:] = [min(x for x, z in regions) * maps.TILE_SIZE, min(z for x, z in regions) * maps.TILE_SIZE]
+            state.update(done=0, failed=0)
+            redraw()
+
+            def run(task):
+                for result in maps.render_tiles(paths, task=task):
+                    task.emit(result)
+
+            state["task"] = worker.BackgroundTask(self.root, run, on_done, on_error, on_item=on_item).start()
+
+        def block_at(event):
+            x = int(canvas.canvasx(event.x)) * scale() + bounds[0]
+            z = int(canvas.canvasy(event.y)) * scale() + bounds[1]
+            return x, z
+
+        def show_position(event):
+            x, z = block_at(event)
+            position_var.set(f"方块 [{x}, {z}]  区块 [{x // maps.CHUNK_SIZE}, {z // maps.CHUNK_SIZE}]")
+
+        def open_chunk(event):
+            region_x, region_z, index = maps.chunk_at(*block_at(event))
+            path = regions.get((region_x, region_z))
+            if path is None or document not in self.documents.values():
+                return
+            tree_path = [index]
+            if isinstance(document.level, world.WorldFolder):
+                tree_path = os.path.relpath(path, document.file_path).split(os.sep) + tree_path
+            self.show_document(document)
+            item = self.reveal_nearest(tree_path)
+            self.tree.selection_set(item)
+            self.tree.focus(item)
+            self.tree.see(item)
+
+        def close():
+            if state["task"]:
+                state["task"].cancel()
+            map_win.destroy()
+
+        dimension_var.trace("w", load_dimension)
+        scale_var.trace("w", lambda *args: redraw() if regions else None)
+        canvas.bind("<Motion>", show_position)
+        canvas.bind("<Button-1>", open_chunk)
+        map_win.protocol("WM_DELETE_WINDOW", close)
+        load_dimension()
+
+    def open_compare(self):
+        if self.level is None:
+            messagebox.showwarning("比较文件", "请先打开一个文件")
+            return
+        if isinstance(self.level, world.WorldFolder):
+            messagebox.showwarning("比较文件", "世界文件夹不支持比较")
+            return
+        if self.task:
+            self.update_status("正在处理其他文件，请稍候")
+            return
+        file_path = filedialog.askopenfilename(
+            title="选择要比较的文件",
+            filetypes=[("NBT Files", "*.nbt"), ("DAT Files", "*.dat"), ("Region Files", "*.mca *.mcr"),
+                       ("All Files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        document = self.document
+        left = self.root_tag()
+        started = time.perf_counter()
+
+        def run(task):
+            right = self.parse_cache.load(file_path, functools.partial(core.load, task=task))
+            try:
+                differences = []
+                for difference in diff.compare(left, right, task):
+                    differences.append(difference)
+                    if len(differences) >= DIFF_LIMIT:
+                        break
+                return differences
+            finally:
+                if isinstance(right, region.RegionFile):
+                    right.close()
+
+        def on_done(differences):
+            self.enable_edit_controls(True)
+            message = f"发现 {len(differences)} 处差异" if differences else "两个文件没有差异"
+            if len(differences) >= DIFF_LIMIT:
+                message += f"，只显示前 {DIFF_LIMIT} 处"
+            self.update_status(self.timed_message("compare", message, started))
+            if differences:
+                self.show_differences(document, file_path, differences)
+
+        def on_error(e):
+            self.enable_edit_controls(True)
+            if isinstance(e, worker.Cancelled):
+                self.update_status("已取消比较")
+            else:
+                messagebox.showerror("比较错误", f"无法比较文件: {str(e)}")
+
+        self.enable_edit_controls(False)
+        self.run_task(f"正在比较: {file_path}", run, on_done, on_error)
+
+    def show_differences(self, document, file_path, differences):
+        left_name = os.path.basename(document.file_path) if document.file_path else "未命名"
+        right_name = os.path.basename(file_path)
+
+        diff_win = ttk.Toplevel(self.root)
+        diff_win.title(f"比较: {left_name} ↔ {right_name}")
+        diff_win.geometry("900x550")
+
+        table = ttk.Treeview(diff_win, columns=("status", "left", "right"), selectmode="browse")
+        table_scrollbar = ttk.Scrollbar(diff_win, command=table.yview)
+        table.config(yscrollcommand=table_scrollbar.set)
+        table.heading("#0", text="名称")
+        table.heading("status", text="状态")
+        table.heading("left", text=left_name)
+        table.heading("right", text=right_name)
+        table.column("#0", width=220)
+        table.column("status", width=110)
+        table.column("left", width=270)
+        table.column("right", width=270)
+        table.tag_configure(diff.ADDED, foreground="green")
+        table.tag_configure(diff.REMOVED, foreground="red")
+        table.tag_configure(diff.CHANGED, foreground="orange")
+        table_scrollbar.pack(side="right", fill="y")
+        table.pack(fill="both", expand=True, padx=(10, 0), pady=10)
+
+        expand = len(differences) <= DIFF_OPEN_LIMIT
+        rows = {(): ""}
+        paths = {}
+
+        def row_for(path):
+            depth = len(path)
+            while tuple(path[:depth]) not in rows:
+                depth -= 1
+            parent = rows[tuple(path[:depth])]
+            for depth in range(depth + 1, len(path) + 1):
+                key = path[depth - 1]
+                parent = table.insert(parent, "end", text=f"[{key}]" if isinstance(key, int) else key, open=expand)
+                rows[tuple(path[:depth])] = parent
+                paths[parent] = path[:depth]
+            return parent
+
+        for difference in differences:
+            item = row_for(difference.path[:-1]) if difference.path else ""
+            name = difference.path[-1] if difference.path else "(根)"
+            if isinstance(name, int):
+                name = f"[{name}]"
+            status = diff.LABELS[difference.status]
+            if difference.count > 1:
+                status += f" ({difference.count} 处)"
+            values = (status, diff.render(difference.old), diff.render(difference.new))
+            key = tuple(difference.path)
+            if key and key in rows:
+                table.item(rows[key], values=values, tags=(difference.status,))
+                continue
+            row = table.insert(item, "end", text=name, values=values, tags=(difference.status,), open=expand)
+            paths[row] = difference.path
+            if key:
+                rows[key] = row
+
+        def open_difference(event):
+            path = paths.get(table.focus())
+            if path is None or document not in self.documents.values():
+                return
+            self.show_document(document)
+            item = self.reveal_nearest(path)
+            self.tree.selection_set(item)
+            self.tree.focus(item)
+            self.tree.see(item)
+
+        table.bind("<Double-1>", open_difference)
+
+    def find_sections(self, item):
+        self.expand_node(item)
+        node = self.nodes.get(item)
+        selected = None
+        while node is not None:
+            tag = node.tag
+            if isinstance(tag, COMPOUND_TYPES):
+                if selected is None and blocks.section_states(tag)[0] is not None:
+                    selected = tag
+                if blocks.chunk_sections(tag):
+                    decoded = blocks.decode_chunk(tag)
+                    y = int(blocks.get(selected, "Y", 0)) if selected is not None else None
+                    return decoded, y
+            node = node.parent
+        if selected is not None:
+            return blocks.decode_chunk({"sections": [selected]}), None
+        return [], None
+
+    def open_section_inspector(self):
+        item = self.tree.focus()
+        if not item or item in self.group_nodes:
+            messagebox.showwarning("区段检查器", "请先选择一个区块或区段")
+            return
+        try:
+            sections, selected_y = self.find_sections(item)
+        except Exception as e:
+            messagebox.showerror("区段检查器", f"无法解码方块数据: {str(e)}")
+            return
+        if not sections:
+            messagebox.showwarning("区段检查器", "所选节点中没有方块数据")
+            return
+
+        inspector = ttk.Toplevel(self.root)
+        inspector.title("区段检查器")
+        inspector.geometry("820x560")
+        inspector.transient(self.root)
+
+        control_frame = ttk.Frame(inspector)
+        control_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Label(control_frame, text="区段:").pack(side="left")
+        section_labels = [f"Y={s.y} ({s.y * blocks.SECTION_SIZE}..{s.y * blocks.SECTION_SIZE + 15})"
+                          for s in sections]
+        ys = [s.y for s in sections]
+        section_var = ttk.StringVar(value=section_labels[ys.index(selected_y) if selected_y in ys else 0])
+        ttk.Combobox(control_frame, textvariable=section_var, values=section_labels, state="readonly",
+                     width=18).pack(side="left", padx=5)
+        ttk.Label(control_frame, text="层:").pack(side="left", padx=(10, 0))
+        layer_var = ttk.IntVar(value=0)
+        ttk.Spinbox(control_frame, textvariable=layer_var, from_=0, to=blocks.SECTION_SIZE - 1,
+                    width=4, command=lambda: show_layer()).pack(side="left", padx=5)
+
+        lookup_frame = ttk.Frame(inspector)
+        lookup_frame.pack(side="bottom", fill="x", padx=10, pady=5)
+        coord_vars = []
+        for name in ("X", "Y", "Z"):
+            ttk.Label(lookup_frame, text=f"{name}:").pack(side="left")
+            var = ttk.StringVar(value="0")
+            ttk.Entry(lookup_frame, textvariable=var, width=6).pack(side="left", padx=(2, 8))
+            coord_vars.append(var)
+        result_var = ttk.StringVar()
+        ttk.Label(lookup_frame, textvariable=result_var, anchor="w").pack(side="right", fill="x", expand=True)
+
+        panes = ttk.PanedWindow(inspector, orient="horizontal")
+        panes.pack(fill="both", expand=True, padx=10, pady=5)
+
+        counts_frame = ttk.Frame(panes)
+        counts = ttk.Treeview(counts_frame, columns=("count", "percent"), selectmode="browse")
+        counts_scrollbar = ttk.Scrollbar(counts_frame, command=counts.yview)
+        counts.config(yscrollcommand=counts_scrollbar.set)
+        counts.heading("#0", text="方块")
+        counts.heading("count", text="数量")
+        counts.heading("percent", text="占比")
+        counts.column("#0", width=260)
+        counts.column("count", width=70, anchor="e")
+        counts.column("percent", width=70, anchor="e")
+        counts_scrollbar.pack(side="right", fill="y")
+        counts.pack(fill="both", expand=True)
+
+        layer_frame = ttk.Frame(panes)
+        layer_text = ttk.Text(layer_frame, wrap="none", font=("Courier", 10), state="disabled")
+        layer_scrollbar = ttk.Scrollbar(layer_frame, command=layer_text.yview)
+        layer_text.config(yscrollcommand=layer_scrollbar.set)
+        layer_scrollbar.pack(side="right", fill="y")
+        layer_text.pack(fill="both", expand=True)
+
+        panes.add(counts_frame)
+        panes.add(layer_frame)
+
+        def current():
+            return sections[section_labels.index(section_var.get())]
+
+        def show_counts():
+            counts.delete(*counts.get_children())
+            for label, count in current().counts().most_common():
+                counts.insert("", "end", text=label,
+                              values=(count, f"{count * 100 / blocks.SECTION_VOLUME:.1f}%"))
+
+        def show_layer():
+            section = current()
+            try:
+                y = min(max(layer_var.get(), 0), blocks.SECTION_SIZE - 1)
+            except Exception:
+                return
+            layer = section.layer(y)
+            labels = section.labels()
+            lines = [f"Y = {section.y * blocks.SECTION_SIZE + y}，行为Z，列为X", ""]
+            for z in range(blocks.SECTION_SIZE):
+                lines.append(f"{z:>2} " + " ".join(blocks.symbol(int(i)) for i in layer[z]))
+            lines.append("")
+            for index in sorted(set(layer.ravel().tolist())):
+                lines.append(f"{blocks.symbol(index)} = {labels[index] if index < len(labels) else '?'}")
+            layer_text.config(state="normal")
+            layer_text.delete(1.0, ttk.END)
+            layer_text.insert(ttk.END, "\n".join(lines))
+            layer_text.config(state="disabled")
+
+        def lookup():
+            try:
+                x, y, z = (int(var.get()) for var in coord_vars)
+            except ValueError:
+                result_var.set("坐标必须是整数")
+                return
+            section_y = y // blocks.SECTION_SIZE
+            section = next((s for s in sections if s.y == section_y), None)
+            if section is None:
+                result_var.set(f"Y={y} 所在的区段不存在")
+                return
+            try:
+                state = section.block(x % blocks.SECTION_SIZE, y % blocks.SECTION_SIZE, z % blocks.SECTION_SIZE)
+            except blocks.BlockError as e:
+                result_var.set(str(e))
+                return
+            result_var.set(f"({x}, {y}, {z}): {blocks.state_label(state)}")
+
+        def change_section(*args):
+            show_counts()
+            show_layer()
+
+        ttk.Button(lookup_frame, text="查找", command=lookup, width=8).pack(side="left", padx=5)
+        section_var.trace("w", change_section)
+        layer_var.trace("w", lambda *args: show_layer())
+        change_section()
+
+    def toggle_profiling(self):
+        if self.profile_var.get():
+            profiler.enable()
+            self.update_status("性能分析已启用")
+        else:
+            profiler.disable()
+            self.update_status("性能分析已关闭")
+
+    def open_performance_panel(self):
+        panel = ttk.Toplevel(self.root)
+        panel.title("性能")
+        panel.geometry("640x480")
+        panel.transient(self.root)
+
+        button_frame = ttk.Frame(panel)
+        button_frame.pack(fill="x", padx=10, pady=5)
+        rss_var = ttk.StringVar()
+        ttk.Label(panel, textvariable=rss_var, relief="sunken", anchor="w").pack(side="bottom", fill="x")
+
+        table = ttk.Treeview(panel, columns=("count", "total", "average", "max"))
+        table_scrollbar = ttk.Scrollbar(panel, command=table.yview)
+        table.config(yscrollcommand=table_scrollbar.set)
+        table.heading("#0", text="名称")
+        table.heading("count", text="次数")
+        table.heading("total", text="总计(ms)")
+        table.heading("average", text="平均(ms)")
+        table.heading("max", text="最大(ms)")
+        for column in ("count", "total", "average", "max"):
+            table.column(column, width=90, anchor="e")
+        table_scrollbar.pack(side="right", fill="y")
+        table.pack(fill="both", expand=True, padx=(10, 0), pady=5)
+
+        def refresh():
+            data = profiler.snapshot(self.level)
+            table.delete(*table.get_children())
+            timers = table.insert("", "end", text="计时", open=True)
+            for name, timer in sorted(data["timers"].items(), key=lambda item: -item[1]["total"]):
+                table.insert(timers, "end", text=name, values=(
+                    timer["count"], f"{timer['total'] * 1000:.1f}", f"{timer['average'] * 1000:.3f}",
+                    f"{timer['max'] * 1000:.1f}"))
+            counters = table.insert("", "end", text="计数", open=True)
+            for name, value in sorted(data["counters"].items()):
+                table.insert(counters, "end", text=name, values=(value, "", "", ""))
+            tags = data.get("tags", {})
+            tag_root = table.insert("", "end", text="标签", open=True, values=(sum(tags.values()), "", "", ""))
+            for name, value in sorted(tags.items(), key=lambda item: -item[1]):
+                table.insert(tag_root, "end", text=name, values=(value, "", "", ""))
+            rss = data["peak_rss"]
+            state = "已启用" if profiler.enabled else "未启用"
+            rss_var.set(f"性能分析{state}，峰值内存: {rss / 1048576:.1f} MiB" if rss else f"性能分析{state}")
+
+        def reset():
+            profiler.reset()
+            refresh()
+
+        def toggle_profile():
+            if profiler.profile is None:
+                profiler.start_profile()
+                profile_btn.config(text="停止 cProfile")
+            else:
+                profiler.stop_profile()
+                profile_btn.config(text="开始 cProfile")
+
+        def export_json():
+            path = filedialog.asksaveasfilename(parent=panel, defaultextension=".json",
+                                                filetypes=[("JSON Files", "*.json"), ("All Files", "*.*")])
+            if path:
+                try:
+                    profiler.export_json(path, self.level)
+                except Exception as e:
+                    messagebox.showerror("导出错误", str(e), parent=panel)
+
+        def export_profile():
+            path = filedialog.asksaveasfilename(parent=panel, defaultextension=".prof",
+                                                filetypes=[("cProfile", "*.prof"), ("All Files", "*.*")])
+            if path:
+                try:
+                    profiler.export_profile(path)
+                    profile_btn.config(text="开始 cProfile")
+                except Exception as e:
+                    messagebox.showerror("导出错误", str(e), parent=panel)
+
+        ttk.Button(button_frame, text="刷新", command=refresh, width=8).pack(side="left", padx=2)
+        ttk.Button(button_frame, text="重置", command=reset, width=8).pack(side="left", padx=2)
+        profile_btn = ttk.Button(button_frame, text="停止 cProfile" if profiler.profile else "开始 cProfile",
+                                 command=toggle_profile, width=14)
+        profile_btn.pack(side="left", padx=2)
+        ttk.Button(button_frame, text="导出JSON", command=export_json, width=10).pack(side="left", padx=2)
+        ttk.Button(button_frame, text="导出cProfile", command=export_profile, width=12).pack(side="left", padx=2)
+        refresh()
+
     def show_about(self):
         about_text = (
             "PyNBTExplorer\n"
@@ -719,8 +2484,13 @@ class NBTExplorer:
 
     def on_closing(self):
         if messagebox.askokcancel("退出", "确定要退出 PyNBTExplorer 吗？"):
+            self.cancel_task()
+            if self.index_task:
+                self.index_task.cancel()
             self.root.destroy()
 
 
 if __name__ == "__main__":
-    app = NBTExplorer()
+    multiprocessing.freeze_support()
+    app = NBTExplorer(sys.argv[1] if len(sys.argv) > 1 else "")
+    app.mainloop()
@@ -0,0 +1,279 @@
+import concurrent.futures
+import functools
+import glob
+import hashlib
+import os
+import struct
+import zlib
+
+import numpy as np
+
+import blocks
+import cache
+import region
+import stream
+import worker
+
+CHUNK_SIZE = 16
+REGION_CHUNKS = 32
+TILE_SIZE = REGION_CHUNKS * CHUNK_SIZE
+COLUMN_COUNT = CHUNK_SIZE * CHUNK_SIZE
+HEIGHT_BITS = 9
+CACHE_VERSION = 1
+EMPTY_HEIGHT = -(1 << 16)
+SURFACE_KEYS = {"Level", "sections", "Sections", "Y", "block_states", "palette", "data", "Palette", "BlockStates",
+                "Name", "Heightmaps", "WORLD_SURFACE", "HeightMap", "yPos"}
+AIR = {"minecraft:air", "minecraft:cave_air", "minecraft:void_air"}
+COLORS = (
+    ("water", (63, 118, 228)),
+    ("lava", (230, 100, 20)),
+    ("ice", (160, 190, 250)),
+    ("snow", (248, 248, 248)),
+    ("leaves", (60, 128, 40)),
+    ("grass", (110, 165, 70)),
+    ("fern", (90, 150, 60)),
+    ("moss", (90, 120, 45)),
+    ("kelp", (50, 110, 60)),
+    ("seagrass", (50, 110, 60)),
+    ("red_sand", (190, 105, 40)),
+    ("sand", (220, 210, 160)),
+    ("podzol", (120, 85, 40)),
+    ("mycelium", (115, 95, 110)),
+    ("dirt", (135, 95, 65)),
+    ("mud", (60, 55, 60)),
+    ("clay", (160, 165, 180)),
+    ("gravel", (135, 130, 125)),
+    ("log", (105, 80, 50)),
+    ("wood", (105, 80, 50)),
+    ("planks", (160, 130, 80)),
+    ("terracotta", (150, 90, 65)),
+    ("netherrack", (110, 50, 50)),
+    ("nylium", (90, 40, 60)),
+    ("end_stone", (220, 220, 160)),
+    ("obsidian", (20, 18, 30)),
+    ("bedrock", (80, 80, 80)),
+    ("deepslate", (80, 80, 85)),
+    ("stone", (125, 125, 125)),
+    ("ore", (125, 125, 125)),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def block_color(name):
+    for keyword, color in COLORS:
+        if keyword in name:
+            return color
+    digest = hashlib.blake2b(name.encode(), digest_size=3).digest()
+    return tuple(64 + value // 2 for value in digest)
+
+
+def heightmap(chunk):
+    root = blocks.get(chunk, "Level", chunk)
+    maps = blocks.get(root, "Heightmaps")
+    data = blocks.get(maps, "WORLD_SURFACE") if maps is not None else None
+    if data is not None and len(data):
+        try:
+            bits, padded = blocks.layout(len(data), 1 << HEIGHT_BITS, COLUMN_COUNT)
+        except blocks.BlockError:
+            return None
+        return blocks.unpack(data, bits, padded, COLUMN_COUNT)[0].astype(np.int32)
+    legacy = blocks.get(root, "HeightMap")
+    if legacy is not None and len(legacy) == COLUMN_COUNT:
+        return np.asarray(legacy, np.int32)
+    return None
+
+
+def load_chunk(region_file, index):
+    if index in region_file.chunks:
+        return region_file.chunks[index]
+    reader = stream.Reader(region_file.read_chunk_data(index))
+    tag_id, name, pos = reader.read_root()
+    return reader.read_keys(tag_id, pos, SURFACE_KEYS)[0]
+
+
+def chunk_surface(chunk, sections):
+    if not sections:
+        return None
+    names = ["minecraft:air"]
+    offsets = {}
+    for section in sections:
+        offsets[section.y] = len(names)
+        names.extend(str(blocks.get(state, "Name", "?")) for state in section.palette)
+    solid = np.array([name not in AIR for name in names])
+    colors = np.array([block_color(name) for name in names], np.uint8)
+    by_y = {section.y: section for section in sections}
+    z, x = np.indices((CHUNK_SIZE, CHUNK_SIZE))
+    ids = np.zeros((CHUNK_SIZE, CHUNK_SIZE), np.intp)
+    tops = np.full((CHUNK_SIZE, CHUNK_SIZE), EMPTY_HEIGHT, np.int32)
+    found = np.zeros((CHUNK_SIZE, CHUNK_SIZE), bool)
+
+    def global_ids(section, local):
+        return np.where(local < len(section.palette), local.astype(np.intp) + offsets[section.y], 0)
+
+    heights = heightmap(chunk)
+    if heights is not None:
+        min_y = int(blocks.get(blocks.get(chunk, "Level", chunk), "yPos", 0)) * CHUNK_SIZE
+        top = heights.reshape(CHUNK_SIZE, CHUNK_SIZE) + (min_y - 1)
+        for section_y in np.unique(top >> 4).tolist():
+            section = by_y.get(section_y)
+            if section is None:
+                continue
+            mask = (top >> 4) == section_y
+            block = global_ids(section, section.indices.reshape(CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE)[top & 15, z, x])
+            hit = mask & solid[block]
+            ids[hit] = block[hit]
+            tops[hit] = top[hit]
+            found |= hit
+    for section in reversed(sections):
+        if found.all():
+            break
+        block = global_ids(section, section.indices.reshape(CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE))
+        filled = solid[block][::-1] & ~found
+        hit = filled.any(0)
+        row = CHUNK_SIZE - 1 - filled.argmax(0)
+        ids[hit] = block[row, z, x][hit]
+        tops[hit] = section.y * CHUNK_SIZE + row[hit]
+        found |= hit
+    return colors[ids], tops, found
+
+
+def decode_chunks(region_file, chunks):
+    try:
+        return blocks.decode_region(region_file, chunks)
+    except blocks.BlockError:
+        decoded = {}
+        for index, chunk in chunks.items():
+            try:
+                decoded[index] = blocks.decode_chunk(chunk)
+            except blocks.BlockError:
+                decoded[index] = []
+        return decoded
+
+
+def shade(image, heights, found):
+    delta = np.zeros(heights.shape, np.int32)
+    delta[1:] = heights[1:] - heights[:-1]
+    valid = found.copy()
+    valid[1:] &= found[:-1]
+    factor = np.where(valid & (delta > 0), 1.12, np.where(valid & (delta < 0), 0.82, 1.0))
+    return np.clip(image * factor[..., None], 0, 255).astype(np.uint8)
+
+
+def render_region(path, task=None):
+    image = np.zeros((TILE_SIZE, TILE_SIZE, 3), np.uint8)
+    heights = np.full((TILE_SIZE, TILE_SIZE), EMPTY_HEIGHT, np.int32)
+    found = np.zeros((TILE_SIZE, TILE_SIZE), bool)
+    with region.RegionFile(path) as region_file:
+        chunks = {}
+        for index in region_file.chunk_indices():
+            if task is not None:
+                task.check()
+            try:
+                chunks[index] = load_chunk(region_file, index)
+            except Exception:
+                continue
+        for index, sections in decode_chunks(region_file, chunks).items():
+            surface = chunk_surface(chunks[index], sections)
+            if surface is None:
+                continue
+            z = index // REGION_CHUNKS * CHUNK_SIZE
+            x = index % REGION_CHUNKS * CHUNK_SIZE
+            image[z:z + CHUNK_SIZE, x:x + CHUNK_SIZE] = surface[0]
+            heights[z:z + CHUNK_SIZE, x:x + CHUNK_SIZE] = surface[1]
+            found[z:z + CHUNK_SIZE, x:x + CHUNK_SIZE] = surface[2]
+    alpha = np.where(found, 255, 0).astype(np.uint8)
+    return np.dstack([shade(image, heights, found), alpha])
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def write_png(path, image):
+    height, width, channels = image.shape
+    rows = np.hstack([np.zeros((height, 1), np.uint8), image.reshape(height, width * channels)])
+    header = struct.pack(">IIBBBBB", width, height, 8, 6 if channels == 4 else 2, 0, 0, 0)
+    with worker.replace_file(path) as f:
+        f.write(b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", header)
+                + png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)) + png_chunk(b"IEND", b""))
+
+
+def cache_directory():
+    return cache.user_directory("tiles")
+
+
+def tile_prefix(path):
+    return hashlib.blake2b(f"{CACHE_VERSION}|{os.path.abspath(path)}".encode(), digest_size=12).hexdigest()
+
+
+def tile_path(path, directory):
+    info = os.stat(path)
+    return os.path.join(directory, f"{tile_prefix(path)}-{info.st_mtime_ns}-{info.st_size}.png")
+
+
+def cached_tile(path, directory):
+    try:
+        target = tile_path(path, directory)
+    except OSError:
+        return None
+    return target if os.path.exists(target) else None
+
+
+def render_tile(path, directory):
+    try:
+        target = tile_path(path, directory)
+        if not os.path.exists(target):
+            os.makedirs(directory, exist_ok=True)
+            image = render_region(path)
+            for stale in glob.glob(os.path.join(directory, tile_prefix(path) + "-*.png")):
+                os.unlink(stale)
+            write_png(target, image)
+        return path, target, None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+def render_tiles(paths, directory=None, task=None, workers=None):
+    directory = directory or cache_directory()
+    missing = []
+    for path in paths:
+        target = cached_tile(path, directory)
+        if target:
+            yield path, target, None
+        else:
+            missing.append(path)
+    if not missing:
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_tile, path, directory) for path in missing]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                if task is not None:
+                    task.check()
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def map_regions(level, file_path):
+    if isinstance(level, region.RegionFile):
+        return {"": [level.path]}
+    dimensions = {}
+    for path in level.region_paths():
+        directory = os.path.dirname(path)
+        if os.path.basename(directory) == "region":
+            name = os.path.relpath(os.path.dirname(directory), file_path)
+            dimensions.setdefault("主世界" if name == os.curdir else name, []).append(path)
+    return dict(sorted(dimensions.items(), key=lambda item: item[0] != "主世界"))
+
+
+def tile_origin(path):
+    region_x, region_z = region.parse_region_name(path)
+    return region_x * TILE_SIZE, region_z * TILE_SIZE
+
+
+def chunk_at(block_x, block_z):
+    region_x, region_z = block_x // TILE_SIZE, block_z // TILE_SIZE
+    index = (block_z % TILE_SIZE // CHUNK_SIZE) * REGION_CHUNKS + block_x % TILE_SIZE // CHUNK_SIZE
+    return region_x, region_z, index
@@ -0,0 +1,181 @@
+import collections
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+from nbtlib.tag import Compound, List
+
+import compression
+import core
+import region
+import stream
+import world
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+enabled = False
+stats = {}
+counters = collections.Counter()
+targets = []
+patches = []
+profile = None
+last_profile = None
+lock = threading.Lock()
+
+
+def record(name, seconds):
+    if not enabled:
+        return
+    with lock:
+        entry = stats.get(name)
+        if entry is None:
+            stats[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+
+def count(name, amount=1):
+    if enabled:
+        counters[name] += amount
+
+
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def instrument(owner, attr, name):
+    targets.append((owner, attr, name))
+    if enabled:
+        patch(owner, attr, name)
+
+
+def patch(owner, attr, name):
+    own = attr in vars(owner)
+    original = vars(owner)[attr] if own else getattr(owner, attr)
+    setattr(owner, attr, timed(name)(original))
+    patches.append((owner, attr, original, own))
+
+
+def forget(owner):
+    targets[:] = [target for target in targets if target[0] is not owner]
+    patches[:] = [patch for patch in patches if patch[0] is not owner]
+
+
+def enable():
+    global enabled
+    if enabled:
+        return
+    enabled = True
+    for target in targets:
+        patch(*target)
+
+
+def disable():
+    global enabled
+    enabled = False
+    while patches:
+        owner, attr, original, own = patches.pop()
+        if own:
+            setattr(owner, attr, original)
+        else:
+            delattr(owner, attr)
+    stop_profile()
+
+
+def reset():
+    with lock:
+        stats.clear()
+        counters.clear()
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def count_tags(root):
+    counts = collections.Counter()
+    stack = [root]
+    while stack:
+        tag = stack.pop()
+        if isinstance(tag, (Compound, stream.LazyCompound)):
+            counts["Compound"] += 1
+            stack.extend(value for key, value in tag.items())
+        elif isinstance(tag, (List, stream.LazyList)):
+            counts["List"] += 1
+            stack.extend(tag)
+        elif isinstance(tag, region.RegionFile):
+            stack.extend(tag.chunks.values())
+        elif isinstance(tag, world.WorldFolder):
+            stack.extend(value for name, value in tag.loaded_items())
+        else:
+            counts[core.type_name(tag)] += 1
+    return counts
+
+
+def snapshot(root=None):
+    with lock:
+        timers = {name: {"count": n, "total": total, "average": total / n, "max": peak}
+                  for name, (n, total, peak) in stats.items()}
+        result = {"timers": timers, "counters": dict(counters)}
+    result["peak_rss"] = peak_rss()
+    if root is not None:
+        result["tags"] = dict(count_tags(root))
+    return result
+
+
+def export_json(path, root=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(root), f, indent=2, ensure_ascii=False)
+
+
+def start_profile():
+    global profile
+    if profile is None:
+        profile = cProfile.Profile()
+        profile.enable()
+
+
+def stop_profile():
+    global profile, last_profile
+    if profile is not None:
+        profile.disable()
+        last_profile, profile = profile, None
+
+
+def export_profile(path):
+    stop_profile()
+    if last_profile is None:
+        raise ValueError("没有可导出的 cProfile 数据")
+    last_profile.dump_stats(path)
+
+
+instrument(core, "load", "load")
+instrument(core, "save", "save")
+instrument(core, "display_string", "render")
+instrument(compression.DecompressReader, "readinto", "decompress")
+
+if os.environ.get("PYNBT_PROFILE"):
+    enable()
@@ -0,0 +1,478 @@
+import functools
+import operator
+import re
+
+import nbtlib
+from nbtlib.tag import Compound, List, String, ByteArray, IntArray, LongArray
+
+import region
+import stream
+import worker
+import world
+
+CHECK_INTERVAL = 4096
+KEY_TOKEN = re.compile(r'[^.\[\]{}()"\s,&|!=<>~]+')
+QUOTED = re.compile(r'"((?:[^"\\]|\\.)*)"')
+INDEX = re.compile(r'\s*(-?\d*)\s*(?::\s*(-?\d*)\s*(?::\s*(-?\d*)\s*)?)?\]')
+OPERATOR = re.compile(r'\s*(==|=|!=|<=|>=|<|>|~)\s*')
+LITERAL = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|[^\s&|\]]+')
+COMPOUND_TYPES = (Compound, stream.LazyCompound)
+LIST_TYPES = (List, stream.LazyList)
+ARRAY_TYPES = (ByteArray, IntArray, LongArray)
+TYPE_ALIASES = {stream.LazyCompound: "Compound", stream.LazyList: "List", region.RegionFile: "Region",
+                world.WorldFolder: "World"}
+COMPARISONS = {"=": operator.eq, "==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le,
+               ">": operator.gt, ">=": operator.ge}
+MISSING = object()
+
+
+class QueryError(ValueError):
+    pass
+
+
+def type_name(tag):
+    if isinstance(tag, List):
+        return "List"
+    return TYPE_ALIASES.get(type(tag)) or type(tag).__name__
+
+
+def is_container(tag):
+    return isinstance(tag, COMPOUND_TYPES + LIST_TYPES + (region.RegionFile, world.WorldFolder))
+
+
+def child(tag, key):
+    if isinstance(tag, Compound):
+        return dict.get(tag, key, MISSING)
+    if isinstance(tag, (stream.LazyCompound, world.WorldFolder)):
+        return tag[key] if key in tag else MISSING
+    return MISSING
+
+
+def entry(tag, key):
+    worker.check_cancelled()
+    return tag.peek(key) if isinstance(tag, region.RegionFile) else tag[key]
+
+
+def children(tag):
+    if isinstance(tag, COMPOUND_TYPES):
+        return tag.items()
+    if isinstance(tag, LIST_TYPES + ARRAY_TYPES):
+        return enumerate(tag)
+    if isinstance(tag, region.RegionFile):
+        return ((index, entry(tag, index)) for index in tag.chunk_indices())
+    if isinstance(tag, world.WorldFolder):
+        return ((name, entry(tag, name)) for name in tag.names())
+    return ()
+
+
+def element(tag, index):
+    if isinstance(tag, region.RegionFile):
+        return entry(tag, index) if index in tag else MISSING
+    if not isinstance(tag, LIST_TYPES + ARRAY_TYPES):
+        return MISSING
+    if index < 0:
+        index += len(tag)
+    return tag[index] if 0 <= index < len(tag) else MISSING
+
+
+def keys(path):
+    result = []
+    while path is not None:
+        path, key = path
+        result.append(key)
+    result.reverse()
+    return result
+
+
+def matches(tag, pattern):
+    if isinstance(pattern, Compound):
+        if not isinstance(tag, COMPOUND_TYPES):
+            return False
+        for key, value in pattern.items():
+            found = child(tag, key)
+            if found is MISSING or not matches(found, value):
+                return False
+        return True
+    if isinstance(pattern, List):
+        if not isinstance(tag, LIST_TYPES):
+            return False
+        return all(any(matches(item, value) for item in tag) for value in pattern)
+    if isinstance(tag, COMPOUND_TYPES + LIST_TYPES + ARRAY_TYPES):
+        return False
+    return isinstance(tag, str) == isinstance(pattern, str) and tag == pattern
+
+
+def key_step(name):
+    def step(path, tag):
+        value = child(tag, name)
+        if value is not MISSING:
+            yield (path, name), value
+    step.navigates = True
+    return step
+
+
+def any_key_step(path, tag):
+    if isinstance(tag, COMPOUND_TYPES + (world.WorldFolder,)):
+        for key, value in children(tag):
+            yield (path, key), value
+
+
+def index_step(index):
+    def step(path, tag):
+        value = element(tag, index)
+        if value is not MISSING:
+            yield (path, index if index >= 0 or isinstance(tag, region.RegionFile) else index + len(tag)), value
+    step.navigates = True
+    return step
+
+
+def slice_step(start, stop, stride):
+    def step(path, tag):
+        if isinstance(tag, region.RegionFile):
+            indices = [index for index in range(region.CHUNK_COUNT)[start:stop:stride] if index in tag]
+        elif isinstance(tag, LIST_TYPES + ARRAY_TYPES):
+            indices = range(len(tag))[start:stop:stride]
+        else:
+            return
+        for index in indices:
+            yield (path, index), element(tag, index)
+    step.navigates = True
+    return step
+
+
+def all_step(path, tag):
+    if isinstance(tag, LIST_TYPES + ARRAY_TYPES + (region.RegionFile,)):
+        for index, value in children(tag):
+            yield (path, index), value
+
+
+any_key_step.navigates = True
+all_step.navigates = True
+
+
+def match_step(pattern):
+    def step(path, tag):
+        if matches(tag, pattern):
+            yield path, tag
+    return step
+
+
+def filter_step(predicate, elements=True):
+    def step(path, tag):
+        if elements and isinstance(tag, LIST_TYPES + ARRAY_TYPES + (region.RegionFile,)):
+            for index, value in children(tag):
+                if predicate(value):
+                    yield (path, index), value
+        elif predicate(tag):
+            yield path, tag
+    return step
+
+
+def descend_step(containers_only):
+    def step(path, tag):
+        stack = [(path, tag)]
+        while stack:
+            path, tag = stack.pop()
+            yield path, tag
+            if not is_container(tag):
+                continue
+            items = [((path, key), value) for key, value in children(tag)
+                     if not containers_only or is_container(value)]
+            items.reverse()
+            stack.extend(items)
+    return step
+
+
+def evaluate(steps, root, path=None):
+    if not steps:
+        yield path, root
+        return
+    last = len(steps) - 1
+    iterators = [steps[0](path, root)]
+    visited = 0
+    while iterators:
+        visited += 1
+        if visited % CHECK_INTERVAL == 0:
+            worker.check_cancelled()
+        item = next(iterators[-1], None)
+        if item is None:
+            iterators.pop()
+        elif len(iterators) > last:
+            yield item
+        else:
+            iterators.append(steps[len(iterators)](*item))
+
+
+def literal(text):
+    if text[:1] in "\"'":
+        return String(re.sub(r"\\(.)", r"\1", text[1:-1]))
+    try:
+        return nbtlib.parse_nbt(text)
+    except Exception:
+        return String(text)
+
+
+def comparable(a, b):
+    if isinstance(a, str) != isinstance(b, str):
+        return False
+    return not isinstance(a, COMPOUND_TYPES + LIST_TYPES + ARRAY_TYPES)
+
+
+def comparison(target, op, value):
+    if op == "~":
+        pattern = re.compile(str(value))
+        return lambda tag: any(not is_container(found) and pattern.search(str(found)) for found in target(tag))
+    compare = COMPARISONS[op]
+    return lambda tag: any(comparable(found, value) and compare(found, value) for found in target(tag))
+
+
+class Parser:
+    def __init__(self, expr):
+        self.expr = expr
+        self.pos = 0
+
+    def error(self, message):
+        return QueryError(f"查询语法错误: {message} (位置 {self.pos + 1})")
+
+    def peek(self, text=None):
+        while self.pos < len(self.expr) and self.expr[self.pos].isspace():
+            self.pos += 1
+        if text is None:
+            return self.expr[self.pos:self.pos + 1]
+        return self.expr.startswith(text, self.pos)
+
+    def take(self, text):
+        if not self.peek(text):
+            raise self.error(f"缺少 {text}")
+        self.pos += len(text)
+
+    def key(self):
+        self.peek()
+        match = QUOTED.match(self.expr, self.pos)
+        if match:
+            self.pos = match.end()
+            return re.sub(r"\\(.)", r"\1", match.group(1)), True
+        match = KEY_TOKEN.match(self.expr, self.pos)
+        if not match:
+            raise self.error("缺少键名")
+        self.pos = match.end()
+        return match.group(), False
+
+    def path(self, stops=""):
+        steps = []
+        projection = None
+        if self.peek() and self.peek() not in "[{." + stops:
+            steps.append(self.key_step())
+        while self.pos < len(self.expr):
+            char = self.peek()
+            if not char or char in stops:
+                break
+            if self.peek(".."):
+                self.pos += 2
+                steps.append(None)
+                if self.peek() and self.peek() not in "[{" + stops:
+                    steps.append(self.key_step())
+            elif char == ".":
+                self.pos += 1
+                if self.peek("("):
+                    projection = self.projection()
+                    break
+                steps.append(self.key_step())
+            elif char == "[":
+                self.pos += 1
+                steps.extend(self.bracket(bool(steps) and steps[-1] is None))
+            elif char == "{":
+                steps.append(match_step(self.compound()))
+            elif stops:
+                break
+            else:
+                raise self.error(f"无法识别的字符 {char}")
+        for i, step in enumerate(steps):
+            if step is None:
+                following = steps[i + 1] if i + 1 < len(steps) else None
+                steps[i] = descend_step(getattr(following, "navigates", False))
+        return steps, projection
+
+    def key_step(self):
+        name, quoted = self.key()
+        if name == "*" and not quoted:
+            return any_key_step
+        return key_step(name)
+
+    def bracket(self, descended=False):
+        if self.peek("?"):
+            self.pos += 1
+            predicate = self.predicate()
+            self.take("]")
+            return [filter_step(predicate, not descended)]
+        if self.peek("{"):
+            pattern = self.compound()
+            self.take("]")
+            return [match_step(pattern)] if descended else [all_step, match_step(pattern)]
+        if self.peek("*"):
+            self.pos += 1
+            self.take("]")
+            return [all_step]
+        match = INDEX.match(self.expr, self.pos)
+        if not match:
+            raise self.error("无效的下标")
+        self.pos = match.end()
+        start, stop, stride = match.groups()
+        if ":" not in match.group():
+            if not start:
+                return [all_step]
+            return [index_step(int(start))]
+        if stride == "0":
+            raise self.error("切片步长不能为0")
+        return [slice_step(*(int(value) if value else None for value in (start, stop, stride)))]
+
+    def compound(self):
+        start = self.pos
+        depth = 0
+        quote = None
+        while self.pos < len(self.expr):
+            char = self.expr[self.pos]
+            self.pos += 1
+            if quote:
+                if char == "\\":
+                    self.pos += 1
+                elif char == quote:
+                    quote = None
+            elif char in "\"'":
+                quote = char
+            elif char in "{[":
+                depth += 1
+            elif char in "}]":
+                depth -= 1
+                if not depth:
+                    try:
+                        return nbtlib.parse_nbt(self.expr[start:self.pos])
+                    except Exception as e:
+                        self.pos = start
+                        raise self.error(f"无效的SNBT: {e}")
+        self.pos = start
+        raise self.error("缺少 }")
+
+    def predicate(self):
+        alternatives = [self.conjunction()]
+        while self.peek("|"):
+            self.pos += 1
+            alternatives.append(self.conjunction())
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return lambda tag: any(test(tag) for test in alternatives)
+
+    def conjunction(self):
+        terms = [self.term()]
+        while self.peek("&"):
+            self.pos += 1
+            terms.append(self.term())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda tag: all(test(tag) for test in terms)
+
+    def term(self):
+        if self.peek("!") and not self.peek("!="):
+            self.pos += 1
+            test = self.term()
+            return lambda tag: not test(tag)
+        steps = []
+        if not self.peek("is ") and not OPERATOR.match(self.expr, self.pos):
+            steps, projection = self.path(stops="&|]!=<>~")
+            if projection is not None:
+                raise self.error("条件中不能使用投影")
+            if self.peek("is "):
+                pass
+            elif not steps:
+                raise self.error("缺少条件")
+
+        def target(tag):
+            return (value for path, value in evaluate(steps, tag))
+
+        if self.peek("is "):
+            self.pos += 3
+            name, quoted = self.key()
+            return lambda tag: any(type_name(found) == name for found in target(tag))
+        match = OPERATOR.match(self.expr, self.pos)
+        if not match:
+            return lambda tag: next(target(tag), MISSING) is not MISSING
+        self.pos = match.end()
+        token = LITERAL.match(self.expr, self.pos)
+        if not token:
+            raise self.error("缺少比较的值")
+        self.pos = token.end()
+        try:
+            return comparison(target, match.group(1), literal(token.group()))
+        except re.error as e:
+            raise self.error(f"正则表达式错误: {e}")
+
+    def projection(self):
+        self.take("(")
+        fields = []
+        while True:
+            start = self.pos
+            steps, projection = self.path(stops=",)")
+            if projection is not None or not steps:
+                raise self.error("无效的投影字段")
+            fields.append((self.expr[start:self.pos].strip(), steps))
+            if self.peek(","):
+                self.pos += 1
+                continue
+            self.take(")")
+            break
+        if self.peek():
+            raise self.error("投影必须位于查询末尾")
+        return fields
+
+
+class Query:
+    __slots__ = ("expr", "steps", "projection")
+
+    def __init__(self, expr, steps, projection=None):
+        self.expr = expr
+        self.steps = steps
+        self.projection = projection
+
+    def __repr__(self):
+        return f"Query({self.expr!r})"
+
+    def find(self, root):
+        for path, tag in evaluate(self.steps, root):
+            yield keys(path), tag
+
+    def paths(self, root):
+        for path, tag in evaluate(self.steps, root):
+            yield keys(path)
+
+    def project(self, tag):
+        if self.projection is None:
+            return tag
+        result = {}
+        for name, steps in self.projection:
+            found = next(evaluate(steps, tag), None)
+            result[name] = None if found is None else found[1]
+        return result
+
+    def select(self, root):
+        for path, tag in evaluate(self.steps, root):
+            yield keys(path), self.project(tag)
+
+    def values(self, root):
+        for path, tag in evaluate(self.steps, root):
+            yield self.project(tag)
+
+    def first(self, root, default=None):
+        return next(self.values(root), default)
+
+
+@functools.lru_cache(maxsize=256)
+def compile(expr):
+    parser = Parser(expr)
+    steps, projection = parser.path()
+    if parser.peek():
+        raise parser.error(f"无法识别的字符 {parser.peek()}")
+    return Query(expr, tuple(steps), projection)
+
+
+def select(root, expr):
+    return list(compile(expr).select(root))
@@ -0,0 +1,243 @@
+import gzip
+import io
+import mmap
+import os
+import re
+import struct
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+import compression
+import stream
+import worker
+
+SECTOR_SIZE = 4096
+CHUNK_COUNT = 1024
+MAX_CHUNK_SECTORS = 255
+
+GZIP = 1
+ZLIB = 2
+UNCOMPRESSED = 3
+LZ4 = 4
+EXTERNAL = 128
+
+CHUNK_COMPRESSION = {compression.GZIP: GZIP, compression.ZLIB: ZLIB, compression.RAW: UNCOMPRESSED}
+
+
+class RegionError(Exception):
+    pass
+
+
+def parse_region_name(path):
+    match = re.match(r"r\.(-?\d+)\.(-?\d+)\.mc[ar]$", os.path.basename(path))
+    if not match:
+        return 0, 0
+    return int(match.group(1)), int(match.group(2))
+
+
+def decompress(data, kind):
+    if kind == GZIP:
+        return gzip.decompress(data)
+    if kind == ZLIB:
+        return zlib.decompress(data)
+    if kind == UNCOMPRESSED:
+        return bytes(data)
+    if kind == LZ4:
+        return compression.decompress_lz4_blocks(data)
+    raise RegionError(f"未知的区块压缩类型: {kind}")
+
+
+def parse_header(data):
+    if len(data) < 2 * SECTOR_SIZE:
+        header = np.zeros(2 * CHUNK_COUNT, np.int64)
+    else:
+        header = np.frombuffer(data, ">u4", 2 * CHUNK_COUNT).astype(np.int64)
+    return header[:CHUNK_COUNT] >> 8, header[:CHUNK_COUNT] & 0xFF, header[CHUNK_COUNT:]
+
+
+class RegionFile:
+    def __init__(self, path):
+        self.path = path
+        self.region_x, self.region_z = parse_region_name(path)
+        self.chunks = {}
+        self.dirty = set()
+        self.compression = compression.ZLIB
+        self.compresslevel = None
+        self.map = None
+        self.open()
+
+    def open(self):
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                if size < 2 * SECTOR_SIZE:
+                    raise RegionError("区域文件头不完整")
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.offsets, self.sectors, self.timestamps = parse_header(self.map[:2 * SECTOR_SIZE] if self.map else b"")
+        self.present = np.flatnonzero((self.offsets >= 2) & (self.sectors > 0))
+
+    def __len__(self):
+        return len(self.present)
+
+    def __contains__(self, index):
+        return isinstance(index, int) and 0 <= index < CHUNK_COUNT and self.offsets[index] >= 2 \
+            and self.sectors[index] > 0
+
+    def __getitem__(self, index):
+        if index not in self.chunks:
+            self.chunks[index] = self.decode_chunk(index)
+        return self.chunks[index]
+
+    def __setitem__(self, index, value):
+        self.chunks[index] = value
+
+    def chunk_indices(self):
+        return self.present.tolist()
+
+    def chunk_coords(self, index):
+        return self.region_x * 32 + index % 32, self.region_z * 32 + index // 32
+
+    def chunk_label(self, index):
+        x, z = self.chunk_coords(index)
+        return f"区块 [{x}, {z}]"
+
+    def chunk_size(self, index):
+        return int(self.sectors[index]) * SECTOR_SIZE
+
+    def chunk_timestamp(self, index):
+        return int(self.timestamps[index])
+
+    def external_path(self, index, directory=None):
+        x, z = self.chunk_coords(index)
+        return os.path.join(directory or os.path.dirname(self.path), f"c.{x}.{z}.mcc")
+
+    def chunk_compression(self, index):
+        start = int(self.offsets[index]) * SECTOR_SIZE
+        if start + 5 > len(self.map):
+            raise RegionError(f"区块 {index} 超出文件范围")
+        return struct.unpack_from(">iB", self.map, start)
+
+    def read_chunk_data(self, index):
+        if index not in self:
+            raise KeyError(index)
+        start = int(self.offsets[index]) * SECTOR_SIZE
+        length, kind = self.chunk_compression(index)
+        if kind & EXTERNAL:
+            with open(self.external_path(index), "rb") as f:
+                return decompress(f.read(), kind & ~EXTERNAL)
+        with memoryview(self.map) as view:
+            with view[start + 5:start + 4 + length] as data:
+                return decompress(data, kind)
+
+    def decode_chunk(self, index):
+        return stream.parse(self.read_chunk_data(index))
+
+    def peek(self, index):
+        if index in self.chunks:
+            return self.chunks[index]
+        return self.decode_chunk(index)
+
+    def encode_chunk(self, index, kind, compresslevel=None):
+        buffer = io.BytesIO()
+        self[index].write(buffer)
+        return compression.compress(buffer.getbuffer(), kind, compresslevel)
+
+    def mark_dirty(self, path):
+        if path:
+            self.dirty.add(path[0])
+
+    def save(self, path=None, task=None, kind=None, compresslevel=None):
+        path = path or self.path
+        kind = kind or self.compression
+        if compresslevel is None:
+            compresslevel = self.compresslevel
+        if kind not in CHUNK_COMPRESSION:
+            raise RegionError(f"区域文件不支持以 {compression.LABELS[kind]} 格式保存")
+        directory = os.path.dirname(os.path.abspath(path))
+        dirty = set(self.dirty)
+        if directory != os.path.dirname(os.path.abspath(self.path)):
+            dirty.update(i for i in self.chunk_indices() if self.chunk_compression(i)[1] & EXTERNAL)
+        if not dirty and path == self.path:
+            return path
+
+        offsets = self.offsets.copy()
+        sectors = self.sectors.copy()
+        timestamps = self.timestamps.copy()
+        now = int(time.time())
+        externals = {}
+        try:
+            with worker.replace_file(path, self.path if self.map is not None else None) as f:
+                end = max((os.fstat(f.fileno()).st_size + SECTOR_SIZE - 1) // SECTOR_SIZE, 2)
+                for index in sorted(dirty):
+                    if task is not None:
+                        task.check()
+                    data = self.encode_chunk(index, kind, compresslevel)
+                    if len(data) + 5 > MAX_CHUNK_SECTORS * SECTOR_SIZE:
+                        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+                        externals[index] = tmp_path
+                        with os.fdopen(fd, "wb") as external:
+                            external.write(data)
+                        payload = struct.pack(">iB", 1, CHUNK_COMPRESSION[kind] | EXTERNAL)
+                    else:
+                        externals[index] = None
+                        payload = struct.pack(">iB", len(data) + 1, CHUNK_COMPRESSION[kind]) + data
+                    count = (len(payload) + SECTOR_SIZE - 1) // SECTOR_SIZE
+                    if offsets[index] < 2 or count > sectors[index]:
+                        offsets[index] = end
+                        end += count
+                    sectors[index] = count
+                    timestamps[index] = now
+                    f.seek(int(offsets[index]) * SECTOR_SIZE)
+                    f.write(payload.ljust(count * SECTOR_SIZE, b"\0"))
+                f.seek(0)
+                f.write(((offsets << 8) | sectors).astype(">u4").tobytes() + timestamps.astype(">u4").tobytes())
+                self.close()
+        except BaseException:
+            for tmp_path in externals.values():
+                if tmp_path is not None:
+                    os.unlink(tmp_path)
+            if self.map is None:
+                self.open()
+            raise
+
+        for index, tmp_path in externals.items():
+            target = self.external_path(index, directory)
+            if tmp_path is not None:
+                os.replace(tmp_path, target)
+            elif os.path.exists(target):
+                os.remove(target)
+        self.path = path
+        self.compression = kind
+        self.compresslevel = compresslevel
+        self.dirty.clear()
+        self.open()
+        return path
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def scan_header(path):
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        data = f.read(2 * SECTOR_SIZE)
+    offsets, sectors, timestamps = parse_header(data)
+    present = (offsets >= 2) & (sectors > 0)
+    timestamps = timestamps[present]
+    return {
+        "count": int(present.sum()),
+        "timestamp": int(timestamps.max()) if len(timestamps) else 0,
+        "size": size,
+    }
@@ -0,0 +1,96 @@
+import functools
+import re
+
+from nbtlib.tag import Compound, List
+
+import region
+import stream
+import worker
+import world
+
+CHECK_INTERVAL = 4096
+CONTAINERS = (Compound, List, stream.LazyCompound, stream.LazyList, region.RegionFile, world.WorldFolder)
+
+
+def compile_matcher(text, case_sensitive=False, use_regex=False):
+    if use_regex:
+        return re.compile(text, 0 if case_sensitive else re.IGNORECASE).search
+    if case_sensitive:
+        return lambda s: text in s
+    text = text.lower()
+    return lambda s: text in s.lower()
+
+
+class SearchIndex:
+    def __init__(self, root, render):
+        self.root = root
+        self.render = render
+        self.parents = []
+        self.keys = []
+        self.names = []
+        self.values = []
+        self.complete = False
+        self._builder = self._build()
+
+    def _build(self):
+        stack = self._children(-1, self.root)
+        while stack:
+            parent, key, name, tag = stack.pop()
+            if callable(tag):
+                worker.check_cancelled()
+                try:
+                    tag = tag()
+                except worker.Cancelled:
+                    raise
+                except Exception:
+                    continue
+            index = len(self.keys)
+            if index % CHECK_INTERVAL == 0:
+                worker.check_cancelled()
+            self.parents.append(parent)
+            self.keys.append(key)
+            self.names.append(name)
+            self.values.append("" if isinstance(tag, CONTAINERS) else self.render(tag))
+            yield index
+            stack.extend(self._children(index, tag))
+
+    def _children(self, parent, tag):
+        if isinstance(tag, (Compound, stream.LazyCompound)):
+            children = [(parent, key, key, value) for key, value in tag.items()]
+        elif isinstance(tag, (List, stream.LazyList)):
+            children = [(parent, i, f"[{i}]", item) for i, item in enumerate(tag)]
+        elif isinstance(tag, world.WorldFolder):
+            children = [(parent, name, name, value) for name, value in tag.loaded_items()]
+        elif isinstance(tag, region.RegionFile):
+            children = [(parent, i, tag.chunk_label(i), functools.partial(tag.peek, i)) for i in tag.chunk_indices()]
+        else:
+            return []
+        children.reverse()
+        return children
+
+    def __len__(self):
+        return len(self.keys)
+
+    def entries(self):
+        index = 0
+        while True:
+            if index < len(self.keys):
+                yield index
+                index += 1
+            elif self.complete:
+                return
+            elif next(self._builder, None) is None:
+                self.complete = True
+
+    def path(self, index):
+        path = []
+        while index >= 0:
+            path.append(self.keys[index])
+            index = self.parents[index]
+        path.reverse()
+        return path
+
+    def search(self, matcher):
+        for index in self.entries():
+            if matcher(self.names[index]) or (self.values[index] and matcher(self.values[index])):
+                yield self.path(index)
@@ -23,10 +23,16 @@ def change_theme(event):
 theme_cbo.bind('<<ComboboxSelected>>', change_theme)
 theme_cbo['state'] = 'readonly'
 theme_cbo.current(theme_names.index(config.theme))
+cache_selection = ttk.Frame(root, padding=(10, 10, 10, 0))
+cache_selection.pack(fill=X, expand=YES)
+cache_var = ttk.IntVar(value=getattr(config, "cache_budget", 256))
+ttk.Spinbox(cache_selection, textvariable=cache_var, from_=0, to=65536, increment=64, width=8).pack(padx=10, side=RIGHT)
+ttk.Label(cache_selection, text="解析缓存上限(MiB):").pack(side=RIGHT)
 def save():
     try:
         with open("./config.py","w") as f:
-            f.write("theme = \""+theme_cbo.get() + "\"")
+            f.write("theme = \""+theme_cbo.get() + "\"\n")
+            f.write("cache_budget = " + str(max(cache_var.get(), 0)) + "\n")
         messagebox.showinfo("提示","配置重启应用后启用")
     except Exception as e:
         messagebox.showerror("错误",str(e))
@@ -0,0 +1,346 @@
+import io
+import mmap
+import os
+import struct
+
+import numpy as np
+import nbtlib
+from nbtlib.tag import Base, Byte, Short, Int, Long, Float, Double, ByteArray, String, List, Compound, IntArray, LongArray
+
+import compression
+import worker
+
+TAG_END = 0
+TAG_LIST = 9
+TAG_COMPOUND = 10
+TAG_STRING = 8
+
+START_COMPOUND = "start_compound"
+END_COMPOUND = "end_compound"
+START_LIST = "start_list"
+END_LIST = "end_list"
+VALUE = "value"
+
+SCALARS = {1: ("b", Byte), 2: ("h", Short), 3: ("i", Int), 4: ("q", Long), 5: ("f", Float), 6: ("d", Double)}
+ARRAYS = {7: ("b", ByteArray), 11: ("i", IntArray), 12: ("q", LongArray)}
+READ_CHUNK_SIZE = 1 << 20
+
+
+def read_buffer(file_path, task=None):
+    with open(file_path, "rb", buffering=0) as raw:
+        size = os.fstat(raw.fileno()).st_size
+        fileobj = io.BufferedReader(worker.ProgressReader(raw, task, size), 1 << 16)
+        kind = compression.detect(fileobj.peek(8)[:8])
+        if kind == compression.RAW:
+            if size == 0:
+                return b""
+            return mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+        reader = compression.open_reader(fileobj, kind)
+        out = bytearray()
+        while chunk := reader.read(READ_CHUNK_SIZE):
+            out += chunk
+        return out
+
+
+class Reader:
+    def __init__(self, data, byteorder="big"):
+        self.data = memoryview(data).cast("B")
+        self.byteorder = byteorder
+        order = ">" if byteorder == "big" else "<"
+        self.scalars = {tag_id: (struct.Struct(order + fmt), cls) for tag_id, (fmt, cls) in SCALARS.items()}
+        self.arrays = {tag_id: (np.dtype(order + fmt), cls) for tag_id, (fmt, cls) in ARRAYS.items()}
+        self.ushort = struct.Struct(order + "H")
+        self.int = struct.Struct(order + "i")
+
+    def read_string(self, pos):
+        length = self.ushort.unpack_from(self.data, pos)[0]
+        pos += 2
+        return str(self.data[pos:pos + length], "utf-8", "replace"), pos + length
+
+    def read_root(self):
+        tag_id = self.data[0]
+        name, pos = self.read_string(1)
+        return tag_id, name, pos
+
+    def skip(self, tag_id, pos):
+        if tag_id in self.scalars:
+            return pos + self.scalars[tag_id][0].size
+        if tag_id == TAG_STRING:
+            return pos + 2 + self.ushort.unpack_from(self.data, pos)[0]
+        if tag_id in self.arrays:
+            return pos + 4 + self.int.unpack_from(self.data, pos)[0] * self.arrays[tag_id][0].itemsize
+        if tag_id == TAG_LIST:
+            subtype = self.data[pos]
+            length = self.int.unpack_from(self.data, pos + 1)[0]
+            pos += 5
+            if subtype in self.scalars:
+                return pos + length * self.scalars[subtype][0].size
+            for _ in range(length):
+                pos = self.skip(subtype, pos)
+            return pos
+        if tag_id == TAG_COMPOUND:
+            data = self.data
+            while True:
+                child_id = data[pos]
+                if child_id == TAG_END:
+                    return pos + 1
+                pos += 3 + self.ushort.unpack_from(data, pos + 1)[0]
+                pos = self.skip(child_id, pos)
+        raise ValueError(f"未知的标签类型: {tag_id}")
+
+    def read(self, tag_id, pos):
+        if tag_id in self.scalars:
+            fmt, cls = self.scalars[tag_id]
+            return cls(fmt.unpack_from(self.data, pos)[0]), pos + fmt.size
+        if tag_id == TAG_STRING:
+            value, pos = self.read_string(pos)
+            return String(value), pos
+        if tag_id in self.arrays:
+            dtype, cls = self.arrays[tag_id]
+            length = self.int.unpack_from(self.data, pos)[0]
+            array = np.frombuffer(self.data, dtype, length, pos + 4)
+            return cls(array, byteorder=self.byteorder), pos + 4 + length * dtype.itemsize
+        if tag_id == TAG_LIST:
+            subtype = self.data[pos]
+            length = self.int.unpack_from(self.data, pos + 1)[0]
+            pos += 5
+            items = []
+            for _ in range(length):
+                item, pos = self.read(subtype, pos)
+                items.append(item)
+            tag = List[Base.get_tag(subtype)]()
+            list.extend(tag, items)
+            return tag, pos
+        if tag_id == TAG_COMPOUND:
+            tag = Compound()
+            data = self.data
+            while True:
+                child_id = data[pos]
+                if child_id == TAG_END:
+                    return tag, pos + 1
+                name, pos = self.read_string(pos + 1)
+                value, pos = self.read(child_id, pos)
+                dict.__setitem__(tag, name, value)
+        raise ValueError(f"未知的标签类型: {tag_id}")
+
+    def read_keys(self, tag_id, pos, keys):
+        if tag_id == TAG_COMPOUND:
+            tag = {}
+            data = self.data
+            while True:
+                child_id = data[pos]
+                if child_id == TAG_END:
+                    return tag, pos + 1
+                name, pos = self.read_string(pos + 1)
+                if name in keys:
+                    tag[name], pos = self.read_keys(child_id, pos, keys)
+                else:
+                    pos = self.skip(child_id, pos)
+        if tag_id == TAG_LIST and self.data[pos] in (TAG_COMPOUND, TAG_LIST):
+            subtype = self.data[pos]
+            length = self.int.unpack_from(self.data, pos + 1)[0]
+            pos += 5
+            items = []
+            for _ in range(length):
+                item, pos = self.read_keys(subtype, pos, keys)
+                items.append(item)
+            return items, pos
+        return self.read(tag_id, pos)
+
+    def lazy(self, tag_id, pos):
+        if tag_id == TAG_COMPOUND:
+            return LazyCompound(self, pos)
+        if tag_id == TAG_LIST:
+            return LazyList(self, pos)
+        return self.read(tag_id, pos)[0]
+
+
+class LazyCompound:
+    def __init__(self, reader, pos, root_name=None):
+        self.reader = reader
+        self.pos = pos
+        self.root_name = root_name
+        self._entries = None
+
+    def entries(self):
+        if self._entries is None:
+            entries = {}
+            reader = self.reader
+            pos = self.pos
+            while True:
+                tag_id = reader.data[pos]
+                if tag_id == TAG_END:
+                    break
+                name, pos = reader.read_string(pos + 1)
+                entries[name] = (tag_id, pos)
+                pos = reader.skip(tag_id, pos)
+            self._entries = entries
+        return self._entries
+
+    def __len__(self):
+        return len(self.entries())
+
+    def __iter__(self):
+        return iter(self.entries())
+
+    def __contains__(self, key):
+        return key in self.entries()
+
+    def __getitem__(self, key):
+        return self.reader.lazy(*self.entries()[key])
+
+    def keys(self):
+        return self.entries().keys()
+
+    def items(self):
+        for key, (tag_id, pos) in self.entries().items():
+            yield key, self.reader.lazy(tag_id, pos)
+
+    def materialize(self):
+        return self.reader.read(TAG_COMPOUND, self.pos)[0]
+
+
+class LazyList:
+    def __init__(self, reader, pos):
+        self.reader = reader
+        self.subtype_id = reader.data[pos]
+        self.length = reader.int.unpack_from(reader.data, pos + 1)[0]
+        self.start = pos + 5
+        self._offsets = None
+
+    @property
+    def subtype(self):
+        return Base.get_tag(self.subtype_id)
+
+    def __len__(self):
+        return self.length
+
+    def offset(self, index):
+        if self.subtype_id in self.reader.scalars:
+            return self.start + index * self.reader.scalars[self.subtype_id][0].size
+        if self._offsets is None:
+            offsets = np.empty(self.length, np.int64)
+            pos = self.start
+            for i in range(self.length):
+                offsets[i] = pos
+                pos = self.reader.skip(self.subtype_id, pos)
+            self._offsets = offsets
+        return int(self._offsets[index])
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        return self.reader.lazy(self.subtype_id, self.offset(index))
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
+    def materialize(self):
+        return self.reader.read(TAG_LIST, self.start - 5)[0]
+
+
+class EventReader:
+    def __init__(self, data, byteorder="big"):
+        self.reader = Reader(data, byteorder)
+        self.stack = []
+        self.pos = 0
+        self.started = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.reader.data
+        if not self.stack:
+            if self.started or not len(data):
+                raise StopIteration
+            self.started = True
+            tag_id, name, self.pos = self.reader.read_root()
+            return self._enter(tag_id, name)
+
+        frame = self.stack[-1]
+        if frame[0] == TAG_COMPOUND:
+            tag_id = data[self.pos]
+            if tag_id == TAG_END:
+                self.pos += 1
+                self.stack.pop()
+                return END_COMPOUND, None, None
+            key, self.pos = self.reader.read_string(self.pos + 1)
+        else:
+            if frame[2] == 0:
+                self.stack.pop()
+                return END_LIST, None, None
+            tag_id = frame[1]
+            key = frame[3]
+            frame[2] -= 1
+            frame[3] += 1
+        return self._enter(tag_id, key)
+
+    def _enter(self, tag_id, key):
+        if tag_id == TAG_COMPOUND:
+            self.stack.append([TAG_COMPOUND])
+            return START_COMPOUND, key, None
+        if tag_id == TAG_LIST:
+            subtype = self.reader.data[self.pos]
+            length = self.reader.int.unpack_from(self.reader.data, self.pos + 1)[0]
+            self.pos += 5
+            self.stack.append([TAG_LIST, subtype, length, 0])
+            return START_LIST, key, (subtype, length)
+        value, self.pos = self.reader.read(tag_id, self.pos)
+        return VALUE, key, value
+
+    @property
+    def depth(self):
+        return len(self.stack)
+
+    def skip(self):
+        frame = self.stack.pop()
+        if frame[0] == TAG_COMPOUND:
+            self.pos = self.reader.skip(TAG_COMPOUND, self.pos)
+        elif frame[1] in self.reader.scalars:
+            self.pos += frame[2] * self.reader.scalars[frame[1]][0].size
+        else:
+            for _ in range(frame[2]):
+                self.pos = self.reader.skip(frame[1], self.pos)
+
+    def materialize(self):
+        frame = self.stack.pop()
+        if frame[0] == TAG_COMPOUND:
+            tag, self.pos = self.reader.read(TAG_COMPOUND, self.pos)
+            return tag
+        items = []
+        for _ in range(frame[2]):
+            item, self.pos = self.reader.read(frame[1], self.pos)
+            items.append(item)
+        tag = List[Base.get_tag(frame[1])]()
+        list.extend(tag, items)
+        return tag
+
+
+def parse(data, byteorder="big"):
+    reader = Reader(data, byteorder)
+    tag_id, name, pos = reader.read_root()
+    if tag_id != TAG_COMPOUND:
+        raise TypeError(f"Non-Compound root tags is not supported: {Base.get_tag(tag_id)}")
+    return nbtlib.File(reader.read(TAG_COMPOUND, pos)[0], root_name=name, byteorder=byteorder)
+
+
+def parse_lazy(data, byteorder="big"):
+    reader = Reader(data, byteorder)
+    tag_id, name, pos = reader.read_root()
+    if tag_id != TAG_COMPOUND:
+        raise TypeError(f"Non-Compound root tags is not supported: {Base.get_tag(tag_id)}")
+    return LazyCompound(reader, pos, name)
+
+
+def open_lazy(file_path, byteorder="big", task=None):
+    return parse_lazy(read_buffer(file_path, task), byteorder)
+
+
+def materialize(value):
+    if isinstance(value, (LazyCompound, LazyList)):
+        return value.materialize()
+    return value
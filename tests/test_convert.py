@@ -0,0 +1,38 @@
+import math
+
+import pytest
+from nbtlib.tag import Compound, Double, Float, List
+
+import convert
+
+SPECIAL = [float("nan"), float("inf"), float("-inf")]
+
+
+def same(a, b):
+    return type(a) is type(b) and (a == b or (math.isnan(a) and math.isnan(b)))
+
+
+@pytest.mark.parametrize("fmt", convert.FORMATS)
+@pytest.mark.parametrize("indent", [None, 2])
+def test_non_finite_floats_round_trip(tmp_path, fmt, indent):
+    tag = Compound({
+        "floats": List[Float]([Float(value) for value in SPECIAL]),
+        "doubles": List[Double]([Double(value) for value in SPECIAL]),
+        "f": Float(float("nan")),
+        "d": Double(float("-inf")),
+    })
+    path = str(tmp_path / f"special.{fmt}")
+    convert.export_tag(tag, path, fmt, indent)
+    result = convert.import_tag(path)
+    assert list(result) == list(tag)
+    for key in ("floats", "doubles"):
+        assert result[key].subtype is tag[key].subtype
+        assert all(same(a, b) for a, b in zip(result[key], tag[key]))
+    assert same(result["f"], tag["f"])
+    assert same(result["d"], tag["d"])
+
+
+def test_special_snbt_words():
+    assert isinstance(convert.snbt_scalar("NaNf"), Float)
+    assert convert.snbt_scalar("-Infinityd") == Double(float("-inf"))
+    assert convert.snbt_scalar("Infinity") == "Infinity"
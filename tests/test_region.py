@@ -0,0 +1,65 @@
+import io
+import struct
+
+import nbtlib
+import pytest
+from nbtlib.tag import Compound, Int, IntArray, List, String
+
+import compression
+import region
+
+lz4_block = pytest.importorskip("lz4.block")
+
+
+def lz4_blocks(data, block_size=1 << 16):
+    out = []
+    for start in range(0, len(data), block_size):
+        block = data[start:start + block_size]
+        packed = lz4_block.compress(block, store_size=False)
+        out.append(compression.LZ4_BLOCK_MAGIC + compression.LZ4_BLOCK_HEADER.pack(0x20, len(packed), len(block), 0))
+        out.append(packed)
+    out.append(compression.LZ4_BLOCK_MAGIC + compression.LZ4_BLOCK_HEADER.pack(0x10, 0, 0, 0))
+    return b"".join(out)
+
+
+def make_chunk(x, z):
+    return nbtlib.File({
+        "xPos": Int(x),
+        "zPos": Int(z),
+        "Status": String("minecraft:full"),
+        "sections": List[Compound]([Compound({"data": IntArray(range(y, y + 4096))}) for y in range(4)]),
+    })
+
+
+def encode(tag):
+    buffer = io.BytesIO()
+    tag.write(buffer)
+    return buffer.getvalue()
+
+
+def test_decompress_lz4():
+    data = encode(make_chunk(0, 0))
+    assert region.decompress(lz4_blocks(data), region.LZ4) == data
+    assert region.decompress(memoryview(lz4_blocks(data)), region.LZ4) == data
+
+
+def test_region_file_with_lz4_chunks(tmp_path):
+    path = tmp_path / "r.0.0.mca"
+    chunks = {index: make_chunk(index % 32, index // 32) for index in (0, 1, 33)}
+    header = [0] * region.CHUNK_COUNT
+    body = []
+    offset = 2
+    for index, chunk in chunks.items():
+        data = lz4_blocks(encode(chunk))
+        payload = struct.pack(">iB", len(data) + 1, region.LZ4) + data
+        count = (len(payload) + region.SECTOR_SIZE - 1) // region.SECTOR_SIZE
+        body.append(payload.ljust(count * region.SECTOR_SIZE, b"\0"))
+        header[index] = (offset << 8) | count
+        offset += count
+    path.write_bytes(struct.pack(f">{region.CHUNK_COUNT}I", *header) + bytes(region.SECTOR_SIZE) + b"".join(body))
+
+    with region.RegionFile(str(path)) as region_file:
+        assert region_file.chunk_indices() == sorted(chunks)
+        for index, chunk in chunks.items():
+            assert region_file.chunk_compression(index)[1] == region.LZ4
+            assert region_file[index] == chunk
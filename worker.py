@@ -0,0 +1,176 @@
+import contextlib
+import io
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+import nbtlib
+
+import compression
+
+
+class Cancelled(Exception):
+    pass
+
+
+current = threading.local()
+
+
+def check_cancelled():
+    task = getattr(current, "task", None)
+    if task is not None:
+        task.check()
+
+
+class BackgroundTask:
+    def __init__(self, root, func, on_done, on_error, on_progress=None, on_item=None, interval=100):
+        self.root = root
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_item = on_item
+        self.items = queue.Queue()
+        self.interval = interval
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def start(self):
+        self.thread.start()
+        self.root.after(self.interval, self._poll)
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def emit(self, item):
+        self.items.put(item)
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise Cancelled()
+
+    def _run(self):
+        current.task = self
+        try:
+            self.result = self.func(self)
+        except BaseException as e:
+            self.error = e
+
+    def _drain(self):
+        while self.on_item:
+            try:
+                item = self.items.get_nowait()
+            except queue.Empty:
+                break
+            self.on_item(item)
+
+    def _poll(self):
+        alive = self.thread.is_alive()
+        self._drain()
+        if alive:
+            if self.on_progress:
+                self.on_progress(self.progress)
+            self.root.after(self.interval, self._poll)
+        elif self.error is not None:
+            self.on_error(self.error)
+        else:
+            self.on_done(self.result)
+
+
+class ProgressReader(io.RawIOBase):
+    def __init__(self, raw, task, total):
+        self.raw = raw
+        self.task = task
+        self.total = total or 1
+        self.position = 0
+
+    @property
+    def name(self):
+        return self.raw.name
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.raw.readinto(buffer)
+        if self.task is not None:
+            self.task.check()
+            self.position += n
+            self.task.progress = min(self.position / self.total, 1.0)
+        return n
+
+
+class ProgressWriter(io.RawIOBase):
+    def __init__(self, raw, task):
+        self.raw = raw
+        self.task = task
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.task is not None:
+            self.task.check()
+        return self.raw.write(data)
+
+
+def load_nbt(file_path, task=None, byteorder="big"):
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb", buffering=0) as raw:
+        fileobj = io.BufferedReader(ProgressReader(raw, task, size), 1 << 16)
+        kind = compression.detect(fileobj.peek(8)[:8])
+        reader = compression.open_reader(fileobj, kind)
+        level = nbtlib.File.from_fileobj(reader, byteorder)
+        level.data_size = size if kind == compression.RAW else reader.tell()
+    level.filename = file_path
+    level.gzipped = kind == compression.GZIP
+    level.compression = kind
+    return level
+
+
+@contextlib.contextmanager
+def replace_file(file_path, source=None):
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    os.close(fd)
+    try:
+        original = source or file_path
+        if source is not None:
+            shutil.copyfile(source, tmp_path)
+        os.chmod(tmp_path, os.stat(original).st_mode & 0o777 if os.path.exists(original) else 0o644)
+        with open(tmp_path, "r+b", buffering=0) as raw:
+            yield raw
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def file_compression(level):
+    default = compression.GZIP if getattr(level, "gzipped", False) else compression.RAW
+    return getattr(level, "compression", default)
+
+
+def save_nbt(level, file_path, task=None, kind=None, compresslevel=None):
+    kind = kind or file_compression(level)
+    with replace_file(file_path) as raw:
+        fileobj = io.BufferedWriter(ProgressWriter(raw, task), 1 << 16)
+        writer = compression.open_writer(fileobj, kind, compresslevel)
+        level.write(writer, getattr(level, "byteorder", "big"))
+        level.data_size = writer.tell()
+        writer.close()
+        fileobj.flush()
+    level.gzipped = kind == compression.GZIP
+    level.compression = kind
+    return file_path
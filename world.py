@@ -0,0 +1,137 @@
+import concurrent.futures
+import os
+
+import region
+import worker
+
+NBT_EXTENSIONS = (".dat", ".dat_old", ".nbt", ".schematic")
+REGION_EXTENSIONS = (".mca", ".mcr")
+WORLD_DIRS = ("region", "DIM-1", "DIM1", "playerdata", "entities", "poi")
+INDEX_BATCH_SIZE = 32
+
+
+def is_world(path):
+    return os.path.isdir(path) and (
+        os.path.exists(os.path.join(path, "level.dat"))
+        or any(os.path.isdir(os.path.join(path, name)) for name in WORLD_DIRS)
+    )
+
+
+class WorldFolder:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = set()
+        self._names = None
+
+    def names(self):
+        if self._names is None:
+            folders = []
+            files = []
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        folders.append(entry.name)
+                    elif entry.name.lower().endswith(NBT_EXTENSIONS + REGION_EXTENSIONS):
+                        files.append(entry.name)
+            folders.sort(key=lambda name: (name not in WORLD_DIRS, name))
+            files.sort(key=lambda name: (name != "level.dat", name))
+            self._names = folders + files
+        return self._names
+
+    def __len__(self):
+        return len(self.names())
+
+    def __contains__(self, name):
+        return name in self.names()
+
+    def __getitem__(self, name):
+        if name not in self.entries:
+            if name not in self.names():
+                raise KeyError(name)
+            self.entries[name] = self.open_entry(name)
+        return self.entries[name]
+
+    def __setitem__(self, name, value):
+        self.entries[name] = value
+
+    def open_entry(self, name):
+        path = os.path.join(self.path, name)
+        kind = self.kind(name)
+        if kind == "Folder":
+            return WorldFolder(path)
+        if kind == "Region":
+            return region.RegionFile(path)
+        return worker.load_nbt(path)
+
+    def kind(self, name):
+        if name.lower().endswith(REGION_EXTENSIONS):
+            return "Region"
+        if name.lower().endswith(NBT_EXTENSIONS):
+            return "File"
+        return "Folder"
+
+    def entry_path(self, name):
+        return os.path.join(self.path, name)
+
+    def loaded_items(self):
+        return list(self.entries.items())
+
+    def region_paths(self):
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(REGION_EXTENSIONS):
+                    paths.append(os.path.join(dirpath, name))
+        return paths
+
+    def mark_dirty(self, path):
+        if not path:
+            return
+        value = self.entries.get(path[0])
+        if isinstance(value, (WorldFolder, region.RegionFile)):
+            value.mark_dirty(path[1:])
+        else:
+            self.dirty.add(path[0])
+
+    def save(self, task=None, kind=None, compresslevel=None):
+        for name, value in self.entries.items():
+            if isinstance(value, WorldFolder):
+                value.save(task, kind, compresslevel)
+            elif isinstance(value, region.RegionFile):
+                value.save(task=task, kind=kind if kind in region.CHUNK_COMPRESSION else None,
+                           compresslevel=compresslevel)
+            elif name in self.dirty:
+                worker.save_nbt(value, self.entry_path(name), task, kind, compresslevel)
+        self.dirty.clear()
+        return self.path
+
+    def close(self):
+        for value in self.entries.values():
+            if isinstance(value, (WorldFolder, region.RegionFile)):
+                value.close()
+
+
+def scan_headers(paths):
+    results = []
+    for path in paths:
+        try:
+            results.append((path, region.scan_header(path)))
+        except OSError:
+            results.append((path, None))
+    return results
+
+
+def index_regions(paths, task=None, workers=None):
+    batches = [paths[i:i + INDEX_BATCH_SIZE] for i in range(0, len(paths), INDEX_BATCH_SIZE)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(scan_headers, batch) for batch in batches]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                if task is not None:
+                    task.check()
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()